@@ -6,6 +6,7 @@ Versão com estrutura modular e organizada para PostgreSQL
 import streamlit as st
 from database import init_database
 from config import APP_CONFIG
+from models import Cart
 from views import mostrar_pdv, mostrar_produtos, mostrar_categorias, mostrar_relatorios
 
 # Configurações de página
@@ -25,7 +26,7 @@ def main():
     if 'current_page' not in st.session_state:
         st.session_state.current_page = 'home'
     if 'cart' not in st.session_state:
-        st.session_state.cart = []
+        st.session_state.cart = Cart()
     if 'last_barcode' not in st.session_state:
         st.session_state.last_barcode = None
     if 'barcode_detected' not in st.session_state:
@@ -3,7 +3,7 @@ import sqlite3
 import pandas as pd
 import json
 import datetime
-import base64
+from receipt import Receipt, render_html
 import os
 from urllib.parse import quote
 
@@ -132,7 +132,9 @@ def run_query(query, params=(), fetch=True):
         return None
 
 # API para buscar produto pelo código de barras
-@st.cache_data(ttl=5)
+# O banco SQLite é local e só este app grava nele: o cache vale até
+# `create_sale` limpá-lo, sem consultas periódicas
+@st.cache_data
 def get_product_by_barcode(barcode):
     if not barcode:
         return None
@@ -154,7 +156,7 @@ def get_product_by_barcode(barcode):
     return None
 
 # Obter todos os produtos
-@st.cache_data(ttl=5)
+@st.cache_data
 def get_all_products():
     query = """
         SELECT p.*, c.nome as categoria_nome 
@@ -205,85 +207,24 @@ def create_sale(items, customer_name, payment_method):
     
     # Limpar cache para refletir as alterações
     get_all_products.clear()
+    get_product_by_barcode.clear()
     
     return True, sale_id
 
 # Gerar recibo HTML
 def generate_receipt_html(sale_id, items, customer_name, payment_method, total):
-    html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <title>Recibo #{sale_id}</title>
-        <style>
-            body {{ font-family: Arial; margin: 0; padding: 20px; }}
-            .receipt {{ max-width: 800px; margin: 0 auto; border: 1px solid #ddd; padding: 20px; }}
-            .header {{ text-align: center; margin-bottom: 20px; border-bottom: 2px solid #333; }}
-            table {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}
-            th, td {{ border: 1px solid #ddd; padding: 10px; text-align: left; }}
-            .total {{ text-align: right; font-weight: bold; margin-top: 20px; }}
-            .footer {{ text-align: center; margin-top: 30px; font-size: 12px; color: #777; }}
-        </style>
-    </head>
-    <body>
-        <div class="receipt">
-            <div class="header">
-                <h1>BarcodeScan PDV</h1>
-                <h2>Recibo de Venda #{sale_id}</h2>
-                <p>Data: {datetime.datetime.now().strftime('%d/%m/%Y %H:%M:%S')}</p>
-                <p>Cliente: {customer_name or 'Cliente não identificado'}</p>
-                <p>Forma de Pagamento: {payment_method}</p>
-            </div>
-            
-            <table>
-                <thead>
-                    <tr>
-                        <th>Produto</th>
-                        <th>Código</th>
-                        <th>Qtde</th>
-                        <th>Preço Unit.</th>
-                        <th>Subtotal</th>
-                    </tr>
-                </thead>
-                <tbody>
-    """
-    
-    for item in items:
-        html += f"""
-                    <tr>
-                        <td>{item['nome']}</td>
-                        <td>{item.get('codigo_barras', 'N/A')}</td>
-                        <td>{item['quantidade']}</td>
-                        <td>R$ {item['preco_venda']:.2f}</td>
-                        <td>R$ {item['preco_venda'] * item['quantidade']:.2f}</td>
-                    </tr>
-        """
-    
-    html += f"""
-                </tbody>
-            </table>
-            
-            <div class="total">
-                <p>Total: R$ {total:.2f}</p>
-            </div>
-            
-            <div class="footer">
-                <p>Obrigado por sua compra!</p>
-                <p>BarcodeScan PDV - Sistema de Gestão com Leitura de Código de Barras</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
-    
-    return html
+    recibo = Receipt(
+        sale_id,
+        ((item['nome'], item.get('codigo_barras', 'N/A'), item['quantidade'], item['preco_venda']) for item in items),
+        payment_method,
+        cliente=customer_name,
+        total=total
+    )
+    return render_html(recibo, loja="BarcodeScan PDV", rodape="Obrigado por sua compra!")
 
-# Link para download de recibo
-def get_receipt_download_link(html, filename="recibo.html"):
-    b64 = base64.b64encode(html.encode()).decode()
-    href = f'<a href="data:text/html;base64,{b64}" download="{filename}">Baixar Recibo</a>'
-    return href
+# Botão para download de recibo
+def receipt_download_button(html, filename="recibo.html"):
+    st.download_button("Baixar Recibo", html, file_name=filename, mime="text/html")
 
 # Interface principal
 def main():
@@ -550,13 +491,7 @@ def main():
                         total
                     )
                     
-                    st.markdown(
-                        get_receipt_download_link(
-                            receipt_html, 
-                            f"recibo_{result}.html"
-                        ),
-                        unsafe_allow_html=True
-                    )
+                    receipt_download_button(receipt_html, f"recibo_{result}.html")
                     
                     # Limpar carrinho
                     st.session_state.cart = []
@@ -0,0 +1,648 @@
+"""
+Índice em memória do catálogo de produtos, compartilhado pelas sessões
+"""
+
+import time
+import threading
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from database import connection, get_listener, query_to_dataframe
+from config import CATALOG_CONFIG
+
+# Colunas mantidas em memória para cada produto (preço em centavos inteiros)
+CATALOG_COLUMNS = (
+    "id", "codigo", "barcode", "nome", "preco_centavos", "estoque",
+    "categoria_id", "categoria_nome", "imagem_url", "updated_at", "versao"
+)
+
+# Marca d'água da sincronização: menor transação ainda em andamento no snapshot
+WATERMARK_QUERY = "SELECT txid_snapshot_xmin(txid_current_snapshot())"
+
+CATALOG_QUERY = """
+SELECT p.id, p.codigo, p.barcode, p.nome, round(p.preco * 100)::bigint as preco_centavos, p.estoque,
+       p.categoria_id, c.nome as categoria_nome, p.imagem_url, p.updated_at, p.versao
+FROM produtos p
+LEFT JOIN categorias c ON p.categoria_id = c.id
+"""
+
+
+def fetch_changes(cur, watermark=None, query=CATALOG_QUERY):
+    """
+    Lê os produtos alterados desde uma marca d'água
+    
+    A marca d'água é o menor ID de transação ainda em andamento no momento
+    da leitura; o delta traz tudo o que foi gravado por transações a partir
+    dela, inclusive as que confirmaram depois de outras mais novas.
+    
+    Args:
+        cur: Cursor do banco de dados
+        watermark (int, optional): Marca d'água da última leitura;
+            None lê o catálogo completo. Defaults to None.
+        query (str, optional): Consulta de produtos (alias `p`). Defaults to CATALOG_QUERY.
+        
+    Returns:
+        tuple: (nomes das colunas, linhas inseridas/alteradas, IDs excluídos,
+            nova marca d'água). Os IDs são None quando as linhas trazem o
+            catálogo completo: sem marca d'água ou quando exclusões
+            posteriores a ela já foram podadas.
+    """
+    # Marca d'água lida antes dos produtos: transações abaixo dela já terminaram
+    cur.execute(WATERMARK_QUERY)
+    novo_watermark = cur.fetchone()[0]
+    if watermark is not None:
+        cur.execute("SELECT ate_xid FROM produtos_removidos_poda")
+        podado = cur.fetchone()
+        if podado is not None and podado[0] >= watermark:
+            watermark = None
+    
+    if watermark is None:
+        cur.execute(query)
+    else:
+        cur.execute(query + " WHERE p.alterado_xid >= %s", (watermark,))
+    colunas = [coluna[0] for coluna in cur.description]
+    linhas = cur.fetchall()
+    
+    removidos = None
+    if watermark is not None:
+        cur.execute("SELECT produto_id FROM produtos_removidos WHERE removido_xid >= %s", (watermark,))
+        removidos = [row[0] for row in cur.fetchall()]
+    return colunas, linhas, removidos, novo_watermark
+
+
+class ProductRecord:
+    """Registro compacto de um produto do catálogo"""
+    
+    __slots__ = CATALOG_COLUMNS
+    
+    def __init__(self, *values):
+        for campo, valor in zip(CATALOG_COLUMNS, values):
+            setattr(self, campo, valor)
+    
+    @property
+    def preco(self):
+        """Preço em reais, sem perda de precisão"""
+        return Decimal(self.preco_centavos).scaleb(-2)
+    
+    def __getitem__(self, campo):
+        # Mesmo acesso por chave usado com as linhas de DataFrame nas views
+        try:
+            return getattr(self, campo)
+        except AttributeError:
+            raise KeyError(campo)
+    
+    def __contains__(self, campo):
+        return campo == "preco" or campo in CATALOG_COLUMNS
+    
+    def get(self, campo, default=None):
+        return getattr(self, campo, default)
+    
+    def to_dict(self):
+        dados = {campo: getattr(self, campo) for campo in CATALOG_COLUMNS}
+        dados["preco"] = self.preco
+        return dados
+    
+    def __repr__(self):
+        return f"ProductRecord(id={self.id!r}, codigo={self.codigo!r}, nome={self.nome!r})"
+
+
+class TypedCatalog:
+    """
+    Catálogo em arrays NumPy tipados, para relatórios vetorizados
+    
+    Preços ficam em centavos (int64), estoque em int32 e categorias como
+    pd.Categorical, em vez de objetos Decimal em colunas de dtype object.
+    """
+    
+    def __init__(self, ids, codigos, nomes, preco_centavos, estoque, categorias):
+        """
+        Args:
+            ids (np.ndarray): IDs dos produtos (int32)
+            codigos (np.ndarray): Códigos dos produtos
+            nomes (np.ndarray): Nomes dos produtos
+            preco_centavos (np.ndarray): Preços em centavos (int64)
+            estoque (np.ndarray): Quantidades em estoque (int32)
+            categorias (pd.Categorical): Nome da categoria de cada produto
+        """
+        self.ids = ids
+        self.codigos = codigos
+        self.nomes = nomes
+        self.preco_centavos = preco_centavos
+        self.estoque = estoque
+        self.categorias = categorias
+    
+    @classmethod
+    def from_chunks(cls, chunks):
+        """
+        Monta o catálogo a partir de blocos de tuplas
+        (id, codigo, nome, preco_centavos, estoque, categoria_nome)
+        
+        Args:
+            chunks (iterable): Blocos de registros, como os de `stream_query`
+            
+        Returns:
+            TypedCatalog: Catálogo tipado
+        """
+        partes = {"ids": [], "codigos": [], "nomes": [], "preco": [], "estoque": [], "categorias": []}
+        
+        # Cada bloco é convertido para arrays tipados antes de ler o próximo
+        for rows in chunks:
+            ids, codigos, nomes, precos, estoques, categorias = zip(*rows)
+            partes["ids"].append(np.fromiter(ids, dtype=np.int32, count=len(rows)))
+            partes["codigos"].append(np.array(codigos, dtype=object))
+            partes["nomes"].append(np.array(nomes, dtype=object))
+            partes["preco"].append(np.fromiter(precos, dtype=np.int64, count=len(rows)))
+            partes["estoque"].append(np.fromiter((e or 0 for e in estoques), dtype=np.int32, count=len(rows)))
+            partes["categorias"].append(np.array(["Sem categoria" if c is None else c for c in categorias], dtype=object))
+        
+        def juntar(lista, dtype):
+            return np.concatenate(lista) if lista else np.empty(0, dtype=dtype)
+        
+        return cls(
+            ids=juntar(partes["ids"], np.int32),
+            codigos=juntar(partes["codigos"], object),
+            nomes=juntar(partes["nomes"], object),
+            preco_centavos=juntar(partes["preco"], np.int64),
+            estoque=juntar(partes["estoque"], np.int32),
+            categorias=pd.Categorical(juntar(partes["categorias"], object)),
+        )
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    @property
+    def empty(self):
+        return len(self.ids) == 0
+    
+    def valor_estoque_centavos(self):
+        """
+        Returns:
+            np.ndarray: Valor em estoque (preço x quantidade) de cada produto, em centavos
+        """
+        return self.preco_centavos * self.estoque.astype(np.int64)
+    
+    def total_estoque(self):
+        """
+        Returns:
+            int: Soma das quantidades em estoque
+        """
+        return int(self.estoque.sum(dtype=np.int64))
+    
+    def por_categoria(self):
+        """
+        Agrega quantidade de produtos e valor em estoque por categoria
+        
+        Returns:
+            pd.DataFrame: Colunas categoria_nome, count e valor_estoque (em reais)
+        """
+        codigos = self.categorias.codes
+        n = len(self.categorias.categories)
+        contagem = np.bincount(codigos, minlength=n)
+        valor = np.bincount(codigos, weights=self.valor_estoque_centavos(), minlength=n)
+        return pd.DataFrame({
+            "categoria_nome": self.categorias.categories.astype(str),
+            "count": contagem,
+            "valor_estoque": valor / 100,
+        })
+    
+    def to_dataframe(self, indices=None):
+        """
+        Converte (parte d)o catálogo em DataFrame para exibição
+        
+        Args:
+            indices (np.ndarray, optional): Posições dos produtos, na ordem desejada. Defaults to todos.
+            
+        Returns:
+            pd.DataFrame: Colunas id, codigo, nome, preco (reais), estoque e categoria_nome
+        """
+        if indices is None:
+            indices = np.arange(len(self.ids))
+        return pd.DataFrame({
+            "id": self.ids[indices],
+            "codigo": self.codigos[indices],
+            "nome": self.nomes[indices],
+            "preco": self.preco_centavos[indices] / 100,
+            "estoque": self.estoque[indices],
+            "categoria_nome": self.categorias[indices],
+        })
+    
+    def maiores(self, campo, n=10):
+        """
+        Retorna as posições dos `n` produtos com maior valor em `campo`
+        
+        Args:
+            campo (str): "preco_centavos" ou "estoque"
+            n (int, optional): Quantidade de produtos. Defaults to 10.
+            
+        Returns:
+            np.ndarray: Posições em ordem decrescente do campo
+        """
+        valores = getattr(self, campo)
+        n = min(n, len(valores))
+        if n == 0:
+            return np.empty(0, dtype=np.intp)
+        topo = np.argpartition(valores, len(valores) - n)[len(valores) - n:]
+        return topo[np.argsort(valores[topo], kind="stable")[::-1]]
+    
+    def abaixo_de(self, limite):
+        """
+        Retorna as posições dos produtos com estoque menor que `limite`
+        
+        Args:
+            limite (int): Limite de estoque
+            
+        Returns:
+            np.ndarray: Posições em ordem crescente de estoque
+        """
+        posicoes = np.flatnonzero(self.estoque < limite)
+        return posicoes[np.argsort(self.estoque[posicoes], kind="stable")]
+
+
+class CatalogIndex:
+    """
+    Índice do catálogo por ID, código de barras e código do produto
+    
+    O catálogo é carregado uma única vez. Com o listener de notificações
+    conectado, cada alteração em produtos ou categorias atualiza apenas os
+    registros afetados; sem ele, o índice aplica periodicamente o delta
+    desde a última leitura (alterações por `alterado_xid` e exclusões pelos
+    tombstones). Consultas que não encontram o produto em memória recorrem
+    ao banco de dados.
+    """
+    
+    def __init__(self, refresh_interval=30.0, tombstone_retention=7 * 86400.0):
+        """
+        Args:
+            refresh_interval (float, optional): Intervalo entre atualizações incrementais em segundos. Defaults to 30.0.
+            tombstone_retention (float, optional): Tempo em segundos que exclusões ficam registradas
+                em `produtos_removidos`. Defaults to 7 dias.
+        """
+        self.refresh_interval = refresh_interval
+        self.tombstone_retention = tombstone_retention
+        
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._by_barcode = {}
+        self._by_codigo = {}
+        self._loaded = False
+        self._watermark = None
+        self._last_refresh = 0.0
+        self._listener = None
+        self._categorias = None
+        
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "db_hits": 0,
+            "loads": 0,
+            "refreshes": 0,
+            "notifications": 0,
+        }
+    
+    def _put_locked(self, record):
+        anterior = self._by_id.get(record.id)
+        if anterior is not None:
+            # Leitura mais antiga que o registro em memória (ex.: venda já aplicada)
+            if anterior.versao > record.versao:
+                return
+            # Mesma versão da linha: preservar as baixas locais ainda não enviadas pelo diário
+            if anterior.versao == record.versao:
+                record.estoque = anterior.estoque
+            self._unindex_locked(anterior)
+        
+        self._by_id[record.id] = record
+        if record.barcode:
+            self._by_barcode[record.barcode] = record
+        if record.codigo:
+            self._by_codigo[record.codigo] = record
+    
+    def _unindex_locked(self, record):
+        self._by_id.pop(record.id, None)
+        if record.barcode and self._by_barcode.get(record.barcode) is record:
+            del self._by_barcode[record.barcode]
+        if record.codigo and self._by_codigo.get(record.codigo) is record:
+            del self._by_codigo[record.codigo]
+    
+    def _fetch(self, where="", params=None):
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(CATALOG_QUERY + where, params)
+                rows = cur.fetchall()
+        return [ProductRecord(*row) for row in rows]
+    
+    def load(self):
+        """Carrega o catálogo completo, substituindo o conteúdo atual"""
+        with connection() as conn:
+            with conn.cursor() as cur:
+                _, linhas, _, watermark = fetch_changes(cur)
+        self._replace([ProductRecord(*row) for row in linhas], watermark)
+    
+    def _replace(self, records, watermark):
+        with self._lock:
+            self._by_id = {}
+            self._by_barcode = {}
+            self._by_codigo = {}
+            for record in records:
+                self._put_locked(record)
+            self._watermark = watermark
+            self._loaded = True
+            self._last_refresh = time.monotonic()
+            self._stats["loads"] += 1
+    
+    def refresh(self):
+        """
+        Aplica ao índice apenas as alterações desde a última leitura
+        
+        Produtos gravados por transações a partir da marca d'água são
+        regravados e os registrados em `produtos_removidos` (tombstones) são
+        retirados. Se tombstones posteriores à marca d'água já foram apagados,
+        o catálogo é substituído pela leitura completa.
+        """
+        if not self._loaded:
+            self.load()
+            return
+        
+        with self._lock:
+            watermark = self._watermark
+            self._last_refresh = time.monotonic()
+        
+        # Transações ainda abertas na leitura anterior têm ID >= marca d'água:
+        # o que confirmaram depois (mesmo transações longas) é lido agora
+        with connection() as conn:
+            with conn.cursor() as cur:
+                _, linhas, removidos, novo_watermark = fetch_changes(cur, watermark)
+        records = [ProductRecord(*row) for row in linhas]
+        
+        if removidos is None:
+            self._replace(records, novo_watermark)
+            return
+        
+        with self._lock:
+            for record in records:
+                self._put_locked(record)
+            for produto_id in removidos:
+                record = self._by_id.get(produto_id)
+                if record is not None:
+                    self._unindex_locked(record)
+            self._watermark = max(self._watermark, novo_watermark)
+            self._stats["refreshes"] += 1
+    
+    def prune_tombstones(self):
+        """
+        Apaga os tombstones mais antigos que `tombstone_retention`
+        
+        O maior ID de transação apagado fica em `produtos_removidos_poda`;
+        quem sincroniza a partir de uma marca d'água anterior a ele recarrega
+        o catálogo em vez de aplicar um delta sem essas exclusões.
+        
+        Returns:
+            int: Quantidade de tombstones apagados
+        """
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                WITH podados AS (
+                    DELETE FROM produtos_removidos
+                    WHERE removed_at < clock_timestamp() - make_interval(secs => %s)
+                    RETURNING removido_xid
+                ), atualizado AS (
+                    UPDATE produtos_removidos_poda
+                    SET ate_xid = GREATEST(ate_xid, (SELECT max(removido_xid) FROM podados))
+                    WHERE EXISTS (SELECT 1 FROM podados)
+                )
+                SELECT count(*) FROM podados
+                """, (self.tombstone_retention,))
+                podados = cur.fetchone()[0]
+            conn.commit()
+        return podados
+    
+    def _ensure_fresh(self):
+        if not self._loaded:
+            self.load()
+            return
+        
+        # Com o listener conectado as notificações mantêm o índice em dia
+        if self._listener is not None and self._listener.connected:
+            return
+        
+        # Apenas uma sessão faz a atualização; as demais seguem com o índice atual
+        with self._lock:
+            if time.monotonic() - self._last_refresh < self.refresh_interval:
+                return
+            self._last_refresh = time.monotonic()
+        self.refresh()
+    
+    def _lookup(self, coluna, valor):
+        self._ensure_fresh()
+        
+        index = self._by_barcode if coluna == "barcode" else self._by_codigo
+        record = index.get(valor)
+        if record is not None:
+            self._stats["hits"] += 1
+            return record
+        
+        # Não está em memória: consultar o banco e guardar o resultado
+        self._stats["misses"] += 1
+        records = self._fetch(f" WHERE p.{coluna} = %s", (valor,))
+        if not records:
+            return None
+        
+        self._stats["db_hits"] += 1
+        with self._lock:
+            for record in records:
+                self._put_locked(record)
+        return records[-1]
+    
+    def get_by_barcode(self, barcode):
+        """
+        Retorna um produto pelo código de barras
+        
+        Args:
+            barcode (str): Código de barras
+        
+        Returns:
+            ProductRecord: Produto encontrado ou None
+        """
+        return self._lookup("barcode", barcode)
+    
+    def get_by_codigo(self, codigo):
+        """
+        Retorna um produto pelo código
+        
+        Args:
+            codigo (str): Código do produto
+        
+        Returns:
+            ProductRecord: Produto encontrado ou None
+        """
+        return self._lookup("codigo", codigo)
+    
+    def peek(self, produto_id):
+        """
+        Retorna o produto em memória pelo ID, sem consultar o banco de dados
+        
+        Args:
+            produto_id (int): ID do produto
+        
+        Returns:
+            ProductRecord: Produto em memória ou None
+        """
+        return self._by_id.get(produto_id)
+    
+    def invalidate(self, produto_id):
+        """
+        Remove um produto do índice; a próxima consulta lê o banco de dados
+        
+        Args:
+            produto_id (int): ID do produto
+        """
+        with self._lock:
+            record = self._by_id.get(produto_id)
+            if record is not None:
+                self._unindex_locked(record)
+    
+    def attach_listener(self, listener):
+        """
+        Passa a manter o índice pelas notificações de produtos e categorias
+        
+        Args:
+            listener (NotificationListener): Listener de notificações do banco
+        """
+        self._listener = listener
+        listener.subscribe("produtos_alterados", self._on_produtos_alterados)
+        listener.subscribe("categorias_alteradas", self._on_categorias_alteradas)
+        listener.on_reconnect(self._on_reconnect)
+    
+    def _on_reconnect(self):
+        # Notificações podem ter sido perdidas enquanto estava desconectado:
+        # aplicar o delta desde a última leitura
+        self._categorias = None
+        if self._loaded:
+            self.refresh()
+    
+    def _on_produtos_alterados(self, payloads):
+        removidos = set()
+        alterados = set()
+        for payload in payloads:
+            op, _, produto_id = payload.partition(":")
+            produto_id = int(produto_id)
+            if op == "D":
+                removidos.add(produto_id)
+                alterados.discard(produto_id)
+            else:
+                alterados.add(produto_id)
+                removidos.discard(produto_id)
+        
+        records = self._fetch(" WHERE p.id = ANY(%s)", (list(alterados),)) if alterados else []
+        encontrados = {record.id for record in records}
+        
+        with self._lock:
+            self._stats["notifications"] += len(payloads)
+            # Produtos que já não existem quando a releitura aconteceu
+            for produto_id in removidos | (alterados - encontrados):
+                record = self._by_id.get(produto_id)
+                if record is not None:
+                    self._unindex_locked(record)
+            for record in records:
+                self._put_locked(record)
+    
+    def _on_categorias_alteradas(self, payloads):
+        categoria_ids = list({int(payload.partition(":")[2]) for payload in payloads})
+        self._categorias = None
+        
+        # Atualizar o nome da categoria nos produtos em memória
+        records = self._fetch(" WHERE p.categoria_id = ANY(%s)", (categoria_ids,))
+        with self._lock:
+            self._stats["notifications"] += len(payloads)
+            for record in records:
+                self._put_locked(record)
+    
+    def get_categorias(self):
+        """
+        Retorna as categorias, mantidas em memória enquanto o listener estiver conectado
+        
+        Returns:
+            pd.DataFrame: DataFrame com todas as categorias
+        """
+        categorias = self._categorias
+        if categorias is None:
+            categorias = query_to_dataframe("SELECT * FROM categorias ORDER BY nome")
+            if self._listener is not None and self._listener.connected:
+                self._categorias = categorias
+        return categorias.copy()
+    
+    def invalidate_categorias(self):
+        """Descarta as categorias em memória; a próxima leitura consulta o banco"""
+        self._categorias = None
+    
+    def apply_stock_changes(self, baixas):
+        """
+        Desconta do estoque em memória vendas ainda não gravadas no banco
+        
+        Usado pelo diário local: a baixa é provisória e vale até a linha do
+        produto mudar de versão no banco. Para vendas já confirmadas no
+        banco use `apply_stock_levels`.
+        
+        Args:
+            baixas (dict): Quantidade vendida por ID do produto
+        """
+        with self._lock:
+            for produto_id, quantidade in baixas.items():
+                record = self._by_id.get(produto_id)
+                if record is not None:
+                    record.estoque -= quantidade
+    
+    def apply_stock_levels(self, niveis):
+        """
+        Grava no índice o estoque confirmado no banco de dados
+        
+        Só substitui registros com versão anterior: se uma notificação ou
+        atualização incremental já trouxe a mesma linha (ou uma mais nova),
+        a venda não é descontada de novo.
+        
+        Args:
+            niveis (dict): (estoque, versão da linha) por ID do produto
+        """
+        with self._lock:
+            for produto_id, (estoque, versao) in niveis.items():
+                record = self._by_id.get(produto_id)
+                if record is not None and record.versao < versao:
+                    record.estoque = estoque
+                    record.versao = versao
+    
+    def stats(self):
+        """
+        Retorna as estatísticas de uso do índice
+        
+        Returns:
+            dict: Acertos, faltas, consultas ao banco, cargas e tamanho do índice
+        """
+        with self._lock:
+            result = dict(self._stats)
+            result["size"] = len(self._by_id)
+        consultas = result["hits"] + result["misses"]
+        result["hit_rate"] = result["hits"] / consultas if consultas else 0.0
+        return result
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_catalog():
+    """
+    Retorna o índice do catálogo do processo, criando-o na primeira chamada
+    
+    Returns:
+        CatalogIndex: Índice compartilhado por todas as sessões do Streamlit
+    """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = CatalogIndex(**CATALOG_CONFIG)
+                listener = get_listener()
+                if listener is not None:
+                    _catalog.attach_listener(listener)
+    return _catalog
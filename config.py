@@ -12,6 +12,17 @@ DB_CONFIG = {
     "sslmode": "require"
 }
 
+# Configurações do pool de conexões
+POOL_CONFIG = {
+    "min_size": 2,                 # Conexões mantidas abertas mesmo ociosas
+    "max_size": 20,                # Limite de conexões simultâneas por processo
+    "acquire_timeout": 10.0,       # Tempo máximo de espera por uma conexão (segundos)
+    "max_lifetime": 1800.0,        # Tempo de vida máximo de uma conexão (segundos)
+    "max_idle": 300.0,             # Conexões ociosas acima do mínimo são fechadas após este tempo
+    "health_check_after": 30.0,    # Testar a conexão se ficou ociosa por mais que este tempo
+    "reap_interval": 60.0          # Intervalo entre varreduras de conexões ociosas/expiradas
+}
+
 # Configurações da aplicação
 APP_CONFIG = {
     "title": "ORION PDV",
@@ -23,6 +34,66 @@ APP_CONFIG = {
     "year": "2025"
 }
 
+# Configurações do listener de notificações (LISTEN/NOTIFY)
+LISTENER_CONFIG = {
+    "enabled": True,               # Manter caches atualizados pelas notificações do banco
+    "reconnect_delay": 1.0,        # Espera inicial antes de reconectar (segundos)
+    "max_reconnect_delay": 30.0    # Espera máxima entre tentativas de reconexão (segundos)
+}
+
+# Agrupamento de commits de vendas concorrentes (gravação direta, sem o diário local)
+# Só é usado com JOURNAL_CONFIG["enabled"] = False: com o diário habilitado
+# as vendas vão ao banco em lotes pelo diário e este caminho não é usado
+GROUP_COMMIT_CONFIG = {
+    "enabled": False,              # Opcional: agrupar vendas que chegam quase juntas
+    "window_ms": 5.0,              # Tempo de espera por outras vendas após a primeira (milissegundos)
+    "max_batch": 50,               # Vendas por transação
+    "max_retries": 3               # Novas tentativas de um lote desfeito por deadlock
+}
+
+# Configurações do índice em memória do catálogo
+CATALOG_CONFIG = {
+    "refresh_interval": 30.0,          # Intervalo entre atualizações incrementais (segundos)
+    "tombstone_retention": 7 * 86400.0 # Tempo que exclusões de produtos ficam registradas para sincronização (segundos)
+}
+
+# Configurações da busca de produtos
+SEARCH_CONFIG = {
+    "page_size": 20                # Produtos por página nas listagens
+}
+
+# Configurações da tela do PDV
+PDV_CONFIG = {
+    "grid_page_size": 10           # Produtos renderizados por página na grade do PDV
+}
+
+# Configurações dos relatórios
+REPORT_CONFIG = {
+    "history_page_size": 50,       # Vendas por página no histórico de vendas
+    "abc_limits": (0.80, 0.95),    # Receita acumulada que fecha as classes A e B da curva ABC
+    "cache_entries": 64,           # Resultados de relatórios mantidos em cache (LRU)
+    "cache_max_age": 300.0         # Tempo máximo de uso de um resultado em cache (segundos)
+}
+
+# Configurações do cache de miniaturas das imagens de produtos
+THUMBNAIL_CONFIG = {
+    "directory": ".cache/thumbnails",  # Diretório local do cache
+    "size": (100, 100),                # Tamanho máximo da miniatura (2x a largura exibida)
+    "max_bytes": 50 * 1024 * 1024,     # Orçamento em disco; as menos usadas são removidas
+    "fetch_timeout": 5.0,              # Tempo limite de cada download (segundos)
+    "retry_after": 300.0,              # Espera antes de tentar de novo uma imagem que falhou (segundos)
+    "workers": 2                       # Threads de download em segundo plano
+}
+
+# Diário local de vendas (gravação imediata em SQLite, envio ao PostgreSQL em segundo plano)
+JOURNAL_CONFIG = {
+    "enabled": True,                     # True desativa o GROUP_COMMIT_CONFIG (vendas não gravam direto no banco)
+    "path": ".cache/vendas_journal.db",  # Arquivo SQLite em modo WAL
+    "batch_size": 50,                    # Vendas enviadas por transação
+    "flush_interval": 0.5,               # Intervalo entre envios quando não há erro (segundos)
+    "max_backoff": 30.0                  # Espera máxima entre tentativas com o banco indisponível (segundos)
+}
+
 # Configurações de estoque
 STOCK_CONFIG = {
     "low_stock_threshold": 10  # Limite para considerar estoque baixo
@@ -36,4 +107,19 @@ PAYMENT_CONFIG = {
 # Configurações do scanner de código de barras
 BARCODE_CONFIG = {
     "detection_interval": 1.0  # Intervalo entre detecções em segundos
-}
\ No newline at end of file
+}
+
+# Configurações do recibo
+RECEIPT_CONFIG = {
+    "store_name": "ORION PDV",     # Nome exibido no cabeçalho do recibo
+    "footer": "Obrigado por sua compra!",
+    "printer": None,               # Impressora térmica: dispositivo (ex.: /dev/usb/lp0) ou diretório de spool
+    "columns": 48,                 # Caracteres por linha da impressora (48 para 80 mm, 32 para 58 mm)
+    "encoding": "cp860"            # Página de código da impressora (PC860 - português)
+}
+
+# Configurações das cópias Parquet das vendas para análises
+SNAPSHOT_CONFIG = {
+    "directory": ".cache/snapshots",  # Diretório das cópias, particionadas por dia
+    "chunk_size": 50000               # Registros lidos do banco por bloco na exportação
+}
@@ -2,13 +2,28 @@
 Módulo de conexão e operações com o banco de dados PostgreSQL
 """
 
+import time
+import uuid
+import select
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+
 import psycopg2
+import psycopg2.extensions
 import pandas as pd
-from config import DB_CONFIG
+from config import DB_CONFIG, POOL_CONFIG, LISTENER_CONFIG, GROUP_COMMIT_CONFIG
+
+logger = logging.getLogger(__name__)
 
 def get_db_connection():
     """
-    Estabelece conexão com o banco de dados PostgreSQL
+    Estabelece uma nova conexão com o banco de dados PostgreSQL
+    
+    Cada chamada abre uma conexão própria (TCP + TLS). Para as operações
+    do sistema use `connection()`, que reaproveita conexões do pool.
     
     Returns:
         conn: Objeto de conexão com o banco de dados
@@ -23,6 +38,366 @@ def get_db_connection():
     )
     return conn
 
+
+class PoolTimeoutError(Exception):
+    """Nenhuma conexão ficou disponível dentro do tempo de espera"""
+
+
+class ConnectionPool:
+    """
+    Pool de conexões thread-safe compartilhado pelo processo
+    
+    Mantém entre `min_size` e `max_size` conexões abertas, testa conexões
+    que ficaram muito tempo ociosas antes de entregá-las, descarta conexões
+    que ultrapassaram `max_lifetime` e fecha as ociosas acima do mínimo
+    após `max_idle` segundos. As `min_size` conexões são abertas em segundo
+    plano ao criar o pool e repostas quando conexões são descartadas. Abrir
+    e fechar conexões (E/S de rede) nunca acontece com o lock do pool.
+    """
+    
+    def __init__(self, connect, min_size=2, max_size=20, acquire_timeout=10.0,
+                 max_lifetime=1800.0, max_idle=300.0, health_check_after=30.0,
+                 reap_interval=60.0):
+        """
+        Args:
+            connect (callable): Função que abre uma nova conexão
+            min_size (int, optional): Conexões mantidas abertas. Defaults to 2.
+            max_size (int, optional): Máximo de conexões abertas. Defaults to 20.
+            acquire_timeout (float, optional): Espera máxima por conexão em segundos. Defaults to 10.0.
+            max_lifetime (float, optional): Vida máxima de uma conexão em segundos. Defaults to 1800.0.
+            max_idle (float, optional): Ociosidade máxima acima do mínimo em segundos. Defaults to 300.0.
+            health_check_after (float, optional): Ociosidade que exige teste antes do uso. Defaults to 30.0.
+            reap_interval (float, optional): Intervalo entre varreduras em segundos. Defaults to 60.0.
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Tamanhos de pool inválidos")
+        
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        self.reap_interval = reap_interval
+        
+        self._cond = threading.Condition()
+        self._idle = []          # Pilha de (conn, criada_em, devolvida_em)
+        self._in_use = {}        # id(conn) -> criada_em
+        self._opening = 0        # Conexões sendo abertas fora do lock
+        self._closed = False
+        self._filling = False    # Thread de reposição do mínimo em andamento
+        self._last_reap = time.monotonic()
+        
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "acquire_time_total": 0.0,
+            "acquire_time_max": 0.0,
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "health_check_failures": 0,
+        }
+        
+        with self._cond:
+            self._schedule_fill_locked()
+    
+    def _size(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+    
+    def _discard_locked(self, conn, pendentes):
+        """Conta o descarte e adia o fechamento para depois de liberar o lock"""
+        self._stats["connections_closed"] += 1
+        pendentes.append(conn)
+    
+    @staticmethod
+    def _close_all(conns):
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+    
+    def _schedule_fill_locked(self):
+        """Inicia a reposição do mínimo de conexões, se faltarem (chamado com o lock)"""
+        if self._filling or self._closed or self._size() >= self.min_size:
+            return
+        self._filling = True
+        threading.Thread(target=self._fill, name="pdv-pool-fill", daemon=True).start()
+    
+    def _fill(self):
+        """Abre conexões até o mínimo; falhas são registradas e a reposição é retomada depois"""
+        try:
+            while True:
+                with self._cond:
+                    if self._closed or self._size() >= self.min_size:
+                        return
+                    self._opening += 1
+                try:
+                    conn = self._connect()
+                except Exception:
+                    logger.warning("Falha ao abrir conexão mínima do pool", exc_info=True)
+                    with self._cond:
+                        self._opening -= 1
+                        self._cond.notify()
+                    return
+                with self._cond:
+                    self._opening -= 1
+                    self._stats["connections_opened"] += 1
+                    if self._closed:
+                        self._stats["connections_closed"] += 1
+                        fechar = [conn]
+                    else:
+                        now = time.monotonic()
+                        self._idle.insert(0, (conn, now, now))
+                        fechar = []
+                        self._cond.notify()
+                self._close_all(fechar)
+        finally:
+            with self._cond:
+                self._filling = False
+    
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self.health_check_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            with self._cond:
+                self._stats["health_check_failures"] += 1
+            return False
+    
+    def _reap_locked(self, now, pendentes):
+        """Separa conexões expiradas ou ociosas demais para fechar (chamado com o lock)"""
+        self._last_reap = now
+        keep = []
+        excess = len(self._idle) + len(self._in_use) - self.min_size
+        # Percorrer das mais antigas (base da pilha) para as mais recentes
+        for conn, created_at, returned_at in self._idle:
+            expired = now - created_at >= self.max_lifetime
+            idle_too_long = now - returned_at >= self.max_idle and excess > 0
+            if conn.closed or expired or idle_too_long:
+                self._discard_locked(conn, pendentes)
+                excess -= 1
+            else:
+                keep.append((conn, created_at, returned_at))
+        self._idle = keep
+        self._schedule_fill_locked()
+    
+    def getconn(self, timeout=None):
+        """
+        Retira uma conexão do pool, abrindo uma nova se necessário
+        
+        Args:
+            timeout (float, optional): Espera máxima em segundos. Defaults to acquire_timeout.
+            
+        Returns:
+            conn: Conexão pronta para uso
+            
+        Raises:
+            PoolTimeoutError: Se nenhuma conexão ficar disponível a tempo
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+        
+        while True:
+            fechar = []
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.InterfaceError("Pool de conexões encerrado")
+                
+                now = time.monotonic()
+                if now - self._last_reap >= self.reap_interval:
+                    self._reap_locked(now, fechar)
+                
+                candidate = None
+                if self._idle:
+                    candidate = self._idle.pop()
+                    self._in_use[id(candidate[0])] = candidate[1]
+                elif self._size() < self.max_size:
+                    self._opening += 1
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"Nenhuma conexão disponível após {timeout:.1f}s "
+                            f"(máximo de {self.max_size} conexões)"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+                    continue
+            
+            # Fechamento, teste de saúde e abertura de conexões acontecem fora do lock
+            self._close_all(fechar)
+            if candidate is not None:
+                conn, created_at, returned_at = candidate
+                now = time.monotonic()
+                if now - created_at < self.max_lifetime and self._is_healthy(conn, now - returned_at):
+                    return self._checked_out(conn, start, waited)
+                fechar = []
+                with self._cond:
+                    self._in_use.pop(id(conn), None)
+                    self._discard_locked(conn, fechar)
+                    self._schedule_fill_locked()
+                    self._cond.notify()
+                self._close_all(fechar)
+                continue
+            
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._opening -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._opening -= 1
+                self._in_use[id(conn)] = time.monotonic()
+                self._stats["connections_opened"] += 1
+            return self._checked_out(conn, start, waited)
+    
+    def _checked_out(self, conn, start, waited):
+        elapsed = time.monotonic() - start
+        with self._cond:
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+            self._stats["acquire_time_total"] += elapsed
+            self._stats["acquire_time_max"] = max(self._stats["acquire_time_max"], elapsed)
+        return conn
+    
+    def putconn(self, conn, discard=False):
+        """
+        Devolve uma conexão ao pool
+        
+        Transações abertas são desfeitas; conexões quebradas, expiradas ou
+        devolvidas com `discard=True` são fechadas.
+        
+        Args:
+            conn: Conexão obtida com `getconn`
+            discard (bool, optional): Fechar em vez de reaproveitar. Defaults to False.
+        """
+        if not discard and not conn.closed:
+            try:
+                if conn.autocommit:
+                    conn.autocommit = False
+                status = conn.info.transaction_status
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        
+        fechar = []
+        with self._cond:
+            created_at = self._in_use.pop(id(conn), None)
+            now = time.monotonic()
+            if (discard or conn.closed or self._closed or created_at is None
+                    or now - created_at >= self.max_lifetime):
+                self._discard_locked(conn, fechar)
+                self._schedule_fill_locked()
+            else:
+                self._idle.append((conn, created_at, now))
+            if now - self._last_reap >= self.reap_interval:
+                self._reap_locked(now, fechar)
+            self._cond.notify()
+        self._close_all(fechar)
+    
+    def stats(self):
+        """
+        Retorna as estatísticas de uso do pool
+        
+        Returns:
+            dict: Contadores de checkouts, esperas, tempo de aquisição e tamanho atual
+        """
+        with self._cond:
+            result = dict(self._stats)
+            result["size"] = self._size()
+            result["in_use"] = len(self._in_use)
+            result["idle"] = len(self._idle)
+            result["min_size"] = self.min_size
+            result["max_size"] = self.max_size
+        checkouts = result["checkouts"]
+        result["acquire_time_avg"] = result["acquire_time_total"] / checkouts if checkouts else 0.0
+        return result
+    
+    def closeall(self):
+        """Fecha todas as conexões ociosas e impede novos checkouts"""
+        fechar = []
+        with self._cond:
+            self._closed = True
+            for conn, _, _ in self._idle:
+                self._discard_locked(conn, fechar)
+            self._idle = []
+            self._cond.notify_all()
+        self._close_all(fechar)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """
+    Retorna o pool de conexões do processo, criando-o na primeira chamada
+    
+    Returns:
+        ConnectionPool: Pool compartilhado por todas as sessões do Streamlit
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(get_db_connection, **POOL_CONFIG)
+    return _pool
+
+def pool_stats():
+    """
+    Retorna as estatísticas do pool de conexões do processo
+    
+    Returns:
+        dict: Estatísticas de uso do pool
+    """
+    return get_pool().stats()
+
+@contextmanager
+def connection():
+    """
+    Empresta uma conexão do pool durante o bloco `with`
+    
+    Em caso de exceção a transação é desfeita; ao final a conexão volta
+    para o pool (transações não confirmadas são descartadas).
+    
+    Yields:
+        conn: Conexão com o banco de dados
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            broken = True
+        raise
+    finally:
+        pool.putconn(conn, discard=broken)
+
 def execute_query(query, params=None, fetch=False, fetch_all=True):
     """
     Executa uma query no banco de dados
@@ -36,30 +411,23 @@ def execute_query(query, params=None, fetch=False, fetch_all=True):
     Returns:
         result: Resultado da query (registros, id ou None)
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
     result = None
     
-    try:
-        cur.execute(query, params)
-        
-        if fetch:
-            if fetch_all:
-                result = cur.fetchall()
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            
+            if fetch:
+                if fetch_all:
+                    result = cur.fetchall()
+                else:
+                    result = cur.fetchone()
             else:
-                result = cur.fetchone()
-        else:
-            # Se a query contém RETURNING, pegar o resultado
-            if "RETURNING" in query.upper():
-                result = cur.fetchone()[0]
+                # Se a query contém RETURNING, pegar o resultado
+                if "RETURNING" in query.upper():
+                    result = cur.fetchone()[0]
         
         conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cur.close()
-        conn.close()
     
     return result
 
@@ -74,83 +442,420 @@ def query_to_dataframe(query, params=None):
     Returns:
         pd.DataFrame: DataFrame com o resultado da query
     """
-    conn = get_db_connection()
-    df = pd.read_sql(query, conn, params=params)
-    conn.close()
+    with connection() as conn:
+        df = pd.read_sql(query, conn, params=params)
     return df
 
+def stream_query(query, params=None, chunk_size=5000, as_dataframe=True):
+    """
+    Executa uma query com cursor no servidor e devolve o resultado em blocos
+    
+    Apenas `chunk_size` registros ficam em memória por vez, o que permite
+    percorrer relatórios e exportações grandes com memória limitada. A
+    conexão fica emprestada do pool até o gerador terminar ou ser fechado.
+    
+    Args:
+        query (str): Query SQL a ser executada
+        params (tuple, optional): Parâmetros para a query. Defaults to None.
+        chunk_size (int, optional): Registros por bloco. Defaults to 5000.
+        as_dataframe (bool, optional): Devolver DataFrames em vez de listas de tuplas. Defaults to True.
+    
+    Yields:
+        pd.DataFrame | list: Próximo bloco de registros
+    """
+    with connection() as conn:
+        # Nome único por chamada: cursores do servidor com o mesmo nome
+        # conflitam na mesma transação
+        with conn.cursor(name=f"pdv_stream_{uuid.uuid4().hex}") as cur:
+            cur.itersize = chunk_size
+            cur.execute(query, params)
+            columns = None
+            
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                
+                if not as_dataframe:
+                    yield rows
+                    continue
+                
+                if columns is None:
+                    columns = [desc[0] for desc in cur.description]
+                yield pd.DataFrame.from_records(rows, columns=columns)
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
 def init_database():
     """
-    Inicializa o banco de dados criando as tabelas necessárias
+    Inicializa o banco de dados aplicando as migrações pendentes
+    
+    As migrações rodam apenas uma vez por processo: as execuções seguintes
+    do script pelo Streamlit retornam imediatamente, sem DDL no banco.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
+    global _schema_ready
+    if _schema_ready:
+        return
     
-    # Criar tabela de categorias
-    cur.execute('''
-    CREATE TABLE IF NOT EXISTS categorias (
-        id SERIAL PRIMARY KEY,
-        nome VARCHAR(100) NOT NULL,
-        descricao TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Criar tabela de produtos
-    cur.execute('''
-    CREATE TABLE IF NOT EXISTS produtos (
-        id SERIAL PRIMARY KEY,
-        codigo VARCHAR(50) UNIQUE,
-        barcode VARCHAR(100),
-        nome VARCHAR(200) NOT NULL,
-        descricao TEXT,
-        preco DECIMAL(10, 2) NOT NULL,
-        estoque INT DEFAULT 0,
-        categoria_id INT REFERENCES categorias(id),
-        imagem_url TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Criar tabela de vendas
-    cur.execute('''
-    CREATE TABLE IF NOT EXISTS vendas (
-        id SERIAL PRIMARY KEY,
-        venda_id VARCHAR(50) UNIQUE,
-        data_venda TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        total DECIMAL(10, 2) NOT NULL,
-        forma_pagamento VARCHAR(50),
-        status VARCHAR(20) DEFAULT 'concluida',
-        observacoes TEXT
-    )
-    ''')
-    
-    # Criar tabela de itens de venda
-    cur.execute('''
-    CREATE TABLE IF NOT EXISTS venda_itens (
-        id SERIAL PRIMARY KEY,
-        venda_id VARCHAR(50) REFERENCES vendas(venda_id),
-        produto_id INT REFERENCES produtos(id),
-        quantidade INT NOT NULL,
-        preco_unitario DECIMAL(10, 2) NOT NULL,
-        subtotal DECIMAL(10, 2) NOT NULL
-    )
-    ''')
-    
-    # Verificar se já existem categorias, se não, inserir algumas categorias padrão
-    cur.execute("SELECT COUNT(*) FROM categorias")
-    if cur.fetchone()[0] == 0:
-        categorias = [
-            ("Alimentos", "Produtos alimentícios"),
-            ("Bebidas", "Bebidas diversas"),
-            ("Limpeza", "Produtos de limpeza"),
-            ("Higiene", "Produtos de higiene pessoal"),
-            ("Outros", "Produtos diversos")
-        ]
-        for cat in categorias:
-            cur.execute("INSERT INTO categorias (nome, descricao) VALUES (%s, %s)", cat)
-    
-    conn.commit()
-    cur.close()
-    conn.close()
\ No newline at end of file
+    with _schema_lock:
+        if _schema_ready:
+            return
+        
+        from migrations import run_migrations
+        with connection() as conn:
+            run_migrations(conn)
+        _schema_ready = True
+
+
+class NotificationListener:
+    """
+    Thread que escuta notificações do PostgreSQL (LISTEN/NOTIFY)
+    
+    Usa uma conexão dedicada, fora do pool, e entrega aos callbacks de cada
+    canal a lista de payloads recebidos de uma vez. Se a conexão cair, ela
+    é refeita com espera crescente e os callbacks de reconexão são chamados,
+    pois notificações enviadas nesse intervalo foram perdidas.
+    """
+    
+    def __init__(self, connect, reconnect_delay=1.0, max_reconnect_delay=30.0, poll_timeout=1.0):
+        """
+        Args:
+            connect (callable): Função que abre uma nova conexão
+            reconnect_delay (float, optional): Espera inicial antes de reconectar em segundos. Defaults to 1.0.
+            max_reconnect_delay (float, optional): Espera máxima entre reconexões em segundos. Defaults to 30.0.
+            poll_timeout (float, optional): Intervalo máximo entre verificações de parada em segundos. Defaults to 1.0.
+        """
+        self._connect = connect
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.poll_timeout = poll_timeout
+        
+        self._lock = threading.Lock()
+        self._callbacks = {}            # canal -> [callback]
+        self._reconnect_callbacks = []
+        self._listening = set()
+        self._stop = threading.Event()
+        self._thread = None
+        self.connected = False
+    
+    def subscribe(self, channel, callback):
+        """
+        Registra um callback para um canal de notificação
+        
+        Args:
+            channel (str): Nome do canal (LISTEN)
+            callback (callable): Recebe a lista de payloads notificados
+        """
+        with self._lock:
+            self._callbacks.setdefault(channel, []).append(callback)
+    
+    def on_reconnect(self, callback):
+        """
+        Registra um callback chamado a cada (re)conexão do listener
+        
+        Args:
+            callback (callable): Função sem argumentos
+        """
+        with self._lock:
+            self._reconnect_callbacks.append(callback)
+    
+    def start(self):
+        """Inicia a thread do listener, se ainda não estiver rodando"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="pdv-notify-listener", daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        """Sinaliza a parada da thread do listener"""
+        self._stop.set()
+    
+    def _dispatch(self, callbacks, *args):
+        for callback in callbacks:
+            try:
+                callback(*args)
+            except Exception:
+                logger.exception("Erro ao processar notificação do banco de dados")
+    
+    def _listen_pending(self, conn):
+        with self._lock:
+            pendentes = [c for c in self._callbacks if c not in self._listening]
+        if not pendentes:
+            return
+        with conn.cursor() as cur:
+            for channel in pendentes:
+                cur.execute(f'LISTEN "{channel}"')
+                self._listening.add(channel)
+    
+    def _run(self):
+        delay = self.reconnect_delay
+        
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                conn.autocommit = True
+                self._listening = set()
+                self._listen_pending(conn)
+                self.connected = True
+                delay = self.reconnect_delay
+                
+                with self._lock:
+                    reconnect_callbacks = list(self._reconnect_callbacks)
+                self._dispatch(reconnect_callbacks)
+                
+                while not self._stop.is_set():
+                    self._listen_pending(conn)
+                    if select.select([conn], [], [], self.poll_timeout) == ([], [], []):
+                        continue
+                    
+                    conn.poll()
+                    recebidas = {}
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        recebidas.setdefault(notify.channel, []).append(notify.payload)
+                    
+                    for channel, payloads in recebidas.items():
+                        with self._lock:
+                            callbacks = list(self._callbacks.get(channel, []))
+                        self._dispatch(callbacks, payloads)
+            except Exception:
+                logger.exception("Listener de notificações desconectado; reconectando em %.1fs", delay)
+                self.connected = False
+                self._close(conn)
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+            finally:
+                self.connected = False
+                self._close(conn)
+    
+    @staticmethod
+    def _close(conn):
+        if conn is not None and not conn.closed:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+def get_listener():
+    """
+    Retorna o listener de notificações do processo, iniciando-o na primeira chamada
+    
+    Returns:
+        NotificationListener: Listener compartilhado pelo processo ou None se desabilitado
+    """
+    global _listener
+    if not LISTENER_CONFIG["enabled"]:
+        return None
+    if _listener is None:
+        with _listener_lock:
+            if _listener is None:
+                _listener = NotificationListener(
+                    get_db_connection,
+                    reconnect_delay=LISTENER_CONFIG["reconnect_delay"],
+                    max_reconnect_delay=LISTENER_CONFIG["max_reconnect_delay"]
+                )
+                _listener.start()
+    return _listener
+
+
+class GroupCommitCoordinator:
+    """
+    Agrupa em uma única transação as gravações que chegam quase ao mesmo tempo
+    
+    Cada chamador entrega uma função que recebe o cursor; uma thread reúne
+    as funções que chegam em até `window_ms` (ou `max_batch` delas), executa
+    cada uma em um savepoint próprio e faz um único commit. Cada chamador
+    recebe o próprio resultado ou a própria exceção: uma gravação que falha
+    é desfeita sem afetar as demais do lote.
+    
+    Os bloqueios de todas as gravações ficam retidos até o commit, na ordem
+    de chegada; um deadlock com outra transação (outro processo, ajustes em
+    lote) desfaz a transação inteira, e o lote é então refeito do início.
+    """
+    
+    def __init__(self, window_ms=5.0, max_batch=50, latency_samples=10000, max_retries=3):
+        """
+        Args:
+            window_ms (float, optional): Espera por outras gravações após a primeira. Defaults to 5.0.
+            max_batch (int, optional): Gravações por transação. Defaults to 50.
+            latency_samples (int, optional): Latências guardadas para os percentis. Defaults to 10000.
+            max_retries (int, optional): Novas tentativas do lote após deadlock ou falha de
+                serialização. Defaults to 3.
+        """
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._thread = None
+        self._latencies = deque(maxlen=latency_samples)
+        self._stats = {
+            "submitted": 0,
+            "failed": 0,
+            "batches": 0,
+            "retries": 0,
+            "commit_errors": 0,
+        }
+    
+    def submit(self, work):
+        """
+        Executa uma gravação no próximo lote e espera o commit
+        
+        Args:
+            work (callable): Recebe o cursor e grava; não deve chamar commit
+        
+        Returns:
+            result: Valor retornado por `work`, após o commit do lote
+        
+        Raises:
+            Exception: A exceção de `work` ou a falha no commit do lote
+        """
+        inicio = time.perf_counter()
+        future = Future()
+        with self._cond:
+            self._ensure_started()
+            self._queue.append((work, future))
+            self._stats["submitted"] += 1
+            self._cond.notify()
+        try:
+            return future.result()
+        finally:
+            with self._cond:
+                self._latencies.append(time.perf_counter() - inicio)
+    
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="pdv-group-commit", daemon=True)
+            self._thread.start()
+    
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            
+            # Após a primeira gravação, esperar a janela por outras
+            prazo = time.monotonic() + self.window
+            while len(self._queue) < self.max_batch:
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    break
+                self._cond.wait(restante)
+            
+            return [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch))]
+    
+    def _executar(self, lote):
+        """
+        Grava o lote em uma transação
+        
+        Returns:
+            list: Pares (future, resultado) ou (future, exceção) por gravação;
+                os chamadores só são avisados depois do commit
+        """
+        desfechos = []
+        with connection() as conn:
+            with conn.cursor() as cur:
+                for work, future in lote:
+                    cur.execute("SAVEPOINT gravacao")
+                    try:
+                        resultado = work(cur)
+                    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                        raise
+                    except Exception as e:
+                        cur.execute("ROLLBACK TO SAVEPOINT gravacao")
+                        desfechos.append((future, e))
+                    else:
+                        desfechos.append((future, resultado))
+                    cur.execute("RELEASE SAVEPOINT gravacao")
+            conn.commit()
+        return desfechos
+    
+    def _run(self):
+        while True:
+            lote = self._next_batch()
+            tentativa = 0
+            try:
+                while True:
+                    try:
+                        desfechos = self._executar(lote)
+                        break
+                    except psycopg2.extensions.TransactionRollbackError:
+                        # Deadlock ou falha de serialização: nada foi gravado, refaz o lote
+                        if tentativa >= self.max_retries:
+                            raise
+                        tentativa += 1
+                        with self._cond:
+                            self._stats["retries"] += 1
+                        logger.warning("Lote de %d operações desfeito por deadlock; tentativa %d",
+                                       len(lote), tentativa + 1)
+            except Exception as e:
+                logger.exception("Falha ao gravar lote de %d operações", len(lote))
+                with self._cond:
+                    self._stats["commit_errors"] += 1
+                for _, future in lote:
+                    future.set_exception(e)
+                continue
+            finally:
+                with self._cond:
+                    self._stats["batches"] += 1
+            
+            for future, desfecho in desfechos:
+                if isinstance(desfecho, Exception):
+                    with self._cond:
+                        self._stats["failed"] += 1
+                    future.set_exception(desfecho)
+                else:
+                    future.set_result(desfecho)
+    
+    def stats(self):
+        """
+        Retorna as estatísticas do agrupamento
+        
+        Returns:
+            dict: Gravações, lotes, novas tentativas, tamanho médio do lote e latências p50/p99 em ms
+        """
+        with self._cond:
+            result = dict(self._stats)
+            latencias = sorted(self._latencies)
+            pendentes = len(self._queue)
+        
+        result["pending"] = pendentes
+        result["avg_batch"] = result["submitted"] / result["batches"] if result["batches"] else 0.0
+        if latencias:
+            result["p50_ms"] = latencias[len(latencias) // 2] * 1000
+            result["p99_ms"] = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))] * 1000
+        else:
+            result["p50_ms"] = result["p99_ms"] = 0.0
+        return result
+
+
+_group_commit = None
+_group_commit_lock = threading.Lock()
+
+def get_group_commit():
+    """
+    Retorna o coordenador de commits agrupados do processo
+    
+    Returns:
+        GroupCommitCoordinator: Coordenador compartilhado ou None se desabilitado
+    """
+    global _group_commit
+    if not GROUP_COMMIT_CONFIG["enabled"]:
+        return None
+    if _group_commit is None:
+        with _group_commit_lock:
+            if _group_commit is None:
+                _group_commit = GroupCommitCoordinator(
+                    window_ms=GROUP_COMMIT_CONFIG["window_ms"],
+                    max_batch=GROUP_COMMIT_CONFIG["max_batch"],
+                    max_retries=GROUP_COMMIT_CONFIG["max_retries"]
+                )
+    return _group_commit
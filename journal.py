@@ -0,0 +1,290 @@
+"""
+Diário local de vendas, enviado ao banco de dados em segundo plano
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+from config import JOURNAL_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class SaleJournal:
+    """
+    Diário durável de vendas em SQLite (modo WAL)
+    
+    A venda é gravada localmente e confirmada ao caixa na hora; uma thread
+    envia as vendas pendentes ao PostgreSQL em lotes, na ordem em que foram
+    registradas. Enquanto o banco estiver indisponível o envio é repetido
+    com espera exponencial, sem perder vendas. Vendas recusadas pelo banco
+    (ex.: estoque insuficiente) ficam com status `falhou` para revisão.
+    """
+    
+    def __init__(self, path, batch_size=50, flush_interval=0.5, max_backoff=30.0, retention=86400.0):
+        """
+        Args:
+            path (str): Arquivo SQLite do diário
+            batch_size (int, optional): Vendas enviadas por transação. Defaults to 50.
+            flush_interval (float, optional): Intervalo entre envios em segundos. Defaults to 0.5.
+            max_backoff (float, optional): Espera máxima entre tentativas em segundos. Defaults to 30.0.
+            retention (float, optional): Tempo em segundos que vendas enviadas são mantidas. Defaults to 1 dia.
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.retention = retention
+        
+        diretorio = os.path.dirname(path)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS journal_vendas (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            venda_id TEXT NOT NULL UNIQUE,
+            dados TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pendente',
+            tentativas INTEGER NOT NULL DEFAULT 0,
+            erro TEXT,
+            criado_em REAL NOT NULL,
+            enviado_em REAL
+        )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_journal_vendas_status ON journal_vendas (status, seq)")
+        
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._enviar = None
+        self.ultimo_erro = None
+        self.ultimo_envio = None
+    
+    def append(self, venda_id, dados):
+        """
+        Grava uma venda no diário; ao retornar, a venda já está em disco
+        
+        Args:
+            venda_id (str): ID da venda
+            dados (dict): Dados da venda, serializáveis em JSON
+        
+        Returns:
+            bool: False se a venda já estava no diário (nada é gravado)
+        """
+        payload = json.dumps(dados, default=str)
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO journal_vendas (venda_id, dados, criado_em) VALUES (?, ?, ?)",
+                (venda_id, payload, time.time())
+            )
+        self._wake.set()
+        return cur.rowcount == 1
+    
+    def contains(self, venda_id):
+        """
+        Verifica se uma venda já foi gravada no diário
+        
+        Args:
+            venda_id (str): ID da venda
+        
+        Returns:
+            bool: True se a venda está no diário, em qualquer status
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM journal_vendas WHERE venda_id = ?", (venda_id,)
+            ).fetchone() is not None
+    
+    def flush(self):
+        """
+        Envia um lote de vendas pendentes
+        
+        Returns:
+            int: Quantidade de vendas processadas (enviadas ou recusadas)
+        
+        Raises:
+            Exception: Falha ao enviar o lote; as vendas continuam pendentes
+        """
+        with self._flush_lock:
+            with self._lock:
+                linhas = self._conn.execute(
+                    "SELECT venda_id, dados FROM journal_vendas WHERE status = 'pendente' ORDER BY seq LIMIT ?",
+                    (self.batch_size,)
+                ).fetchall()
+            if not linhas:
+                return 0
+            
+            entradas = [(venda_id, json.loads(dados)) for venda_id, dados in linhas]
+            try:
+                recusadas = self._enviar(entradas)
+            except Exception as e:
+                with self._lock:
+                    self._conn.executemany(
+                        "UPDATE journal_vendas SET tentativas = tentativas + 1, erro = ? WHERE venda_id = ?",
+                        [(str(e), venda_id) for venda_id, _ in entradas]
+                    )
+                raise
+            
+            agora = time.time()
+            with self._lock:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "UPDATE journal_vendas SET status = ?, tentativas = tentativas + 1, erro = ?, enviado_em = ? "
+                    "WHERE venda_id = ?",
+                    [
+                        ("falhou", recusadas[venda_id], None, venda_id) if venda_id in recusadas
+                        else ("enviada", None, agora, venda_id)
+                        for venda_id, _ in entradas
+                    ]
+                )
+                self._conn.execute(
+                    "DELETE FROM journal_vendas WHERE status = 'enviada' AND enviado_em < ?",
+                    (agora - self.retention,)
+                )
+                self._conn.execute("COMMIT")
+            self.ultimo_envio = agora
+            return len(entradas)
+    
+    def start(self, enviar):
+        """
+        Inicia a thread de envio, se ainda não estiver rodando
+        
+        Args:
+            enviar (callable): Recebe uma lista de (venda_id, dados), grava as vendas
+                em uma transação e retorna um dict venda_id -> motivo das recusadas;
+                qualquer exceção faz o lote inteiro ser tentado de novo
+        """
+        with self._lock:
+            self._enviar = enviar
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="pdv-sale-journal", daemon=True)
+            self._thread.start()
+    
+    def stop(self, timeout=5.0):
+        """Para a thread de envio após o lote em andamento"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+    
+    def _run(self):
+        backoff = self.flush_interval
+        
+        while not self._stop.is_set():
+            try:
+                processadas = self.flush()
+                self.ultimo_erro = None
+                backoff = self.flush_interval
+            except Exception as e:
+                logger.warning("Falha ao enviar vendas do diário; nova tentativa em %.1fs", backoff, exc_info=True)
+                self.ultimo_erro = str(e)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            
+            # Com o lote cheio pode haver mais vendas esperando: enviar em seguida
+            if processadas < self.batch_size:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+    
+    def retry(self, venda_id):
+        """
+        Devolve uma venda recusada à fila de envio
+        
+        Args:
+            venda_id (str): ID da venda
+        
+        Returns:
+            bool: True se a venda estava recusada e voltou à fila
+        """
+        with self._lock:
+            devolvida = self._conn.execute(
+                "UPDATE journal_vendas SET status = 'pendente', erro = NULL WHERE venda_id = ? AND status = 'falhou'",
+                (venda_id,)
+            ).rowcount > 0
+        self._wake.set()
+        return devolvida
+    
+    def discard(self, venda_id):
+        """
+        Remove do diário uma venda recusada
+        
+        Args:
+            venda_id (str): ID da venda
+        """
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM journal_vendas WHERE venda_id = ? AND status = 'falhou'",
+                (venda_id,)
+            )
+    
+    def failed(self):
+        """
+        Retorna as vendas recusadas pelo banco de dados
+        
+        Returns:
+            list: Um dict por venda com `venda_id`, `dados`, `erro` e `criado_em`
+        """
+        with self._lock:
+            linhas = self._conn.execute(
+                "SELECT venda_id, dados, erro, criado_em FROM journal_vendas WHERE status = 'falhou' ORDER BY seq"
+            ).fetchall()
+        return [
+            {"venda_id": venda_id, "dados": json.loads(dados), "erro": erro, "criado_em": criado_em}
+            for venda_id, dados, erro, criado_em in linhas
+        ]
+    
+    def stats(self):
+        """
+        Retorna a situação do diário
+        
+        Returns:
+            dict: Vendas por status, último erro de envio e instante do último envio
+        """
+        with self._lock:
+            contagem = dict(self._conn.execute(
+                "SELECT status, count(*) FROM journal_vendas GROUP BY status"
+            ).fetchall())
+        return {
+            "pendentes": contagem.get("pendente", 0),
+            "falhas": contagem.get("falhou", 0),
+            "enviadas": contagem.get("enviada", 0),
+            "ultimo_erro": self.ultimo_erro,
+            "ultimo_envio": self.ultimo_envio,
+        }
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+def get_journal():
+    """
+    Retorna o diário de vendas do processo, criando-o na primeira chamada
+    
+    Returns:
+        SaleJournal: Diário compartilhado pelo processo ou None se desabilitado
+    """
+    global _journal
+    if not JOURNAL_CONFIG["enabled"]:
+        return None
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                _journal = SaleJournal(
+                    JOURNAL_CONFIG["path"],
+                    batch_size=JOURNAL_CONFIG["batch_size"],
+                    flush_interval=JOURNAL_CONFIG["flush_interval"],
+                    max_backoff=JOURNAL_CONFIG["max_backoff"]
+                )
+    return _journal
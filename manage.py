@@ -0,0 +1,134 @@
+"""
+Comandos de manutenção do sistema ORION PDV
+
+Uso:
+    python manage.py migrar
+    python manage.py verificar-planos
+    python manage.py importar-produtos produtos.csv
+    python manage.py reconstruir-totais
+    python manage.py exportar-parquet
+"""
+
+import sys
+import argparse
+import datetime
+
+from database import connection
+from migrations import run_migrations, check_query_plans
+from models import Produto, Venda
+from snapshots import get_snapshots
+
+def cmd_migrar(args):
+    """Aplica as migrações pendentes do esquema"""
+    with connection() as conn:
+        aplicadas = run_migrations(conn)
+    
+    if aplicadas:
+        print(f"Migrações aplicadas: {', '.join(str(v) for v in aplicadas)}")
+    else:
+        print("Esquema já está atualizado.")
+    return 0
+
+def cmd_verificar_planos(args):
+    """Falha se alguma consulta crítica depender de varredura sequencial"""
+    with connection() as conn:
+        resultado = check_query_plans(conn)
+    
+    falhas = 0
+    for nome, seq_scans, plano in resultado:
+        if seq_scans:
+            falhas += 1
+            print(f"FALHA  {nome}: Seq Scan em {', '.join(seq_scans)}")
+        else:
+            print(f"OK     {nome}")
+    return 1 if falhas else 0
+
+def cmd_importar_produtos(args):
+    """Importa ou atualiza produtos em massa a partir de um CSV ou Parquet"""
+    resultado = Produto.bulk_upsert(
+        args.arquivo,
+        formato=args.formato,
+        chunk_size=args.bloco,
+        sep=args.separador,
+        encoding=args.encoding
+    )
+    
+    print(f"Linhas lidas:  {resultado['linhas']}")
+    print(f"Inseridos:     {resultado['inseridos']}")
+    print(f"Atualizados:   {resultado['atualizados']}")
+    print(f"Inalterados:   {resultado['inalterados']}")
+    print(f"Rejeitados:    {len(resultado['rejeitados'])}")
+    print(f"Tempo:         {resultado['segundos']:.2f} s ({resultado['linhas_por_segundo']:.0f} linhas/s)")
+    
+    for linha in resultado["rejeitados"].itertuples(index=False):
+        print(f"  linha {linha.linha}: {linha.codigo or '(sem código)'} - {linha.motivo}")
+    return 1 if len(resultado["rejeitados"]) else 0
+
+def cmd_reconstruir_totais(args):
+    """Recalcula os totais diários de vendas a partir do histórico"""
+    resultado = Venda.reconstruir_totais_diarios(args.inicio, args.fim)
+    
+    print(f"vendas_diarias:          {resultado['vendas_diarias']} linhas")
+    print(f"produto_vendas_diarias:  {resultado['produto_vendas_diarias']} linhas")
+    return 0
+
+def cmd_exportar_parquet(args):
+    """Acrescenta às cópias Parquet os dias completos ainda não exportados"""
+    snapshots = get_snapshots()
+    resultado = snapshots.export(args.desde, args.ate)
+    
+    if resultado["refeitos"]:
+        print(f"Dias refeitos (vendas gravadas após a exportação): {', '.join(d.isoformat() for d in resultado['refeitos'])}")
+    if resultado["desde"] and resultado["desde"] > resultado["ate"]:
+        if not resultado["refeitos"]:
+            print("Nenhum dia completo novo para exportar.")
+            return 0
+    else:
+        print(f"Dias {resultado['desde'] or 'desde o início'} a {resultado['ate']} em {snapshots.directory}")
+    print(f"vendas:       {resultado['vendas']} registros")
+    print(f"venda_itens:  {resultado['venda_itens']} registros")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manutenção do ORION PDV")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    
+    sub.add_parser("migrar", help="Aplica as migrações pendentes").set_defaults(func=cmd_migrar)
+    sub.add_parser(
+        "verificar-planos",
+        help="Verifica com EXPLAIN se as consultas críticas usam índices"
+    ).set_defaults(func=cmd_verificar_planos)
+    
+    importar = sub.add_parser(
+        "importar-produtos",
+        help="Insere ou atualiza produtos pelo código a partir de um CSV ou Parquet"
+    )
+    importar.add_argument("arquivo", help="Caminho do arquivo .csv ou .parquet")
+    importar.add_argument("--formato", choices=["csv", "parquet"], help="Padrão: deduzido pela extensão")
+    importar.add_argument("--separador", default=",", help="Separador do CSV (padrão: ',')")
+    importar.add_argument("--encoding", default="utf-8", help="Codificação do CSV (padrão: utf-8)")
+    importar.add_argument("--bloco", type=int, default=10000, help="Linhas copiadas por bloco (padrão: 10000)")
+    importar.set_defaults(func=cmd_importar_produtos)
+    
+    totais = sub.add_parser(
+        "reconstruir-totais",
+        help="Recalcula os totais diários de vendas (vendas_diarias e produto_vendas_diarias)"
+    )
+    totais.add_argument("--inicio", type=datetime.date.fromisoformat, help="Primeiro dia (AAAA-MM-DD)")
+    totais.add_argument("--fim", type=datetime.date.fromisoformat, help="Último dia (AAAA-MM-DD)")
+    totais.set_defaults(func=cmd_reconstruir_totais)
+    
+    parquet = sub.add_parser(
+        "exportar-parquet",
+        help="Exporta vendas e itens para Parquet particionado por dia, acrescentando só os dias novos"
+    )
+    parquet.add_argument("--desde", type=datetime.date.fromisoformat,
+                         help="Refaz a partir deste dia (AAAA-MM-DD); padrão: após o último exportado")
+    parquet.add_argument("--ate", type=datetime.date.fromisoformat, help="Último dia (AAAA-MM-DD); padrão: ontem")
+    parquet.set_defaults(func=cmd_exportar_parquet)
+    
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
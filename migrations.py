@@ -0,0 +1,464 @@
+"""
+Migrações versionadas do esquema do banco de dados PostgreSQL
+"""
+
+import json
+
+# Chave do advisory lock que serializa migrações entre processos
+MIGRATION_LOCK_KEY = 7261001
+
+# Cada migração é (versão, descrição, lista de comandos SQL). Novas
+# migrações devem ser acrescentadas ao final com a próxima versão;
+# migrações já aplicadas nunca devem ser alteradas.
+MIGRATIONS = [
+    (1, "Esquema inicial", [
+        '''
+        CREATE TABLE IF NOT EXISTS categorias (
+            id SERIAL PRIMARY KEY,
+            nome VARCHAR(100) NOT NULL,
+            descricao TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS produtos (
+            id SERIAL PRIMARY KEY,
+            codigo VARCHAR(50) UNIQUE,
+            barcode VARCHAR(100),
+            nome VARCHAR(200) NOT NULL,
+            descricao TEXT,
+            preco DECIMAL(10, 2) NOT NULL,
+            estoque INT DEFAULT 0,
+            categoria_id INT REFERENCES categorias(id),
+            imagem_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS vendas (
+            id SERIAL PRIMARY KEY,
+            venda_id VARCHAR(50) UNIQUE,
+            data_venda TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            total DECIMAL(10, 2) NOT NULL,
+            forma_pagamento VARCHAR(50),
+            status VARCHAR(20) DEFAULT 'concluida',
+            observacoes TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS venda_itens (
+            id SERIAL PRIMARY KEY,
+            venda_id VARCHAR(50) REFERENCES vendas(venda_id),
+            produto_id INT REFERENCES produtos(id),
+            quantidade INT NOT NULL,
+            preco_unitario DECIMAL(10, 2) NOT NULL,
+            subtotal DECIMAL(10, 2) NOT NULL
+        )
+        ''',
+        # Categorias padrão apenas se a tabela estiver vazia
+        '''
+        INSERT INTO categorias (nome, descricao)
+        SELECT v.nome, v.descricao
+        FROM (VALUES
+            ('Alimentos', 'Produtos alimentícios'),
+            ('Bebidas', 'Bebidas diversas'),
+            ('Limpeza', 'Produtos de limpeza'),
+            ('Higiene', 'Produtos de higiene pessoal'),
+            ('Outros', 'Produtos diversos')
+        ) AS v(nome, descricao)
+        WHERE NOT EXISTS (SELECT 1 FROM categorias)
+        ''',
+    ]),
+    (2, "Índices das consultas do caixa e dos relatórios", [
+        # Leitura de código de barras no PDV
+        "CREATE INDEX IF NOT EXISTS idx_produtos_barcode ON produtos (barcode)",
+        # Filtro por período dos relatórios (cobre total e forma de pagamento)
+        '''
+        CREATE INDEX IF NOT EXISTS idx_vendas_data_venda
+        ON vendas (data_venda) INCLUDE (total, forma_pagamento)
+        ''',
+        # Itens de uma venda (detalhes e recibos)
+        '''
+        CREATE INDEX IF NOT EXISTS idx_venda_itens_venda_id
+        ON venda_itens (venda_id) INCLUDE (produto_id, quantidade, preco_unitario, subtotal)
+        ''',
+        # Verificação de chave estrangeira ao excluir produtos
+        "CREATE INDEX IF NOT EXISTS idx_venda_itens_produto_id ON venda_itens (produto_id)",
+    ]),
+    (3, "Notificações de alteração do catálogo", [
+        # Payload "<operação>:<id>", ex.: "U:42"; o canal vem do argumento do trigger
+        '''
+        CREATE OR REPLACE FUNCTION notificar_alteracao_catalogo() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                PERFORM pg_notify(TG_ARGV[0], 'D:' || OLD.id);
+                RETURN OLD;
+            END IF;
+            PERFORM pg_notify(TG_ARGV[0], left(TG_OP, 1) || ':' || NEW.id);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        "DROP TRIGGER IF EXISTS trg_produtos_notificar ON produtos",
+        '''
+        CREATE TRIGGER trg_produtos_notificar
+        AFTER INSERT OR UPDATE OR DELETE ON produtos
+        FOR EACH ROW EXECUTE FUNCTION notificar_alteracao_catalogo('produtos_alterados')
+        ''',
+        "DROP TRIGGER IF EXISTS trg_categorias_notificar ON categorias",
+        '''
+        CREATE TRIGGER trg_categorias_notificar
+        AFTER INSERT OR UPDATE OR DELETE ON categorias
+        FOR EACH ROW EXECUTE FUNCTION notificar_alteracao_catalogo('categorias_alteradas')
+        ''',
+    ]),
+    (4, "Busca de produtos por trigramas sem acentuação", [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE EXTENSION IF NOT EXISTS unaccent",
+        # unaccent() não é IMMUTABLE; o dicionário explícito permite usá-la em índices
+        '''
+        CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS $$
+            SELECT public.unaccent('public.unaccent'::regdictionary, $1)
+        $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+        ''',
+        '''
+        CREATE OR REPLACE FUNCTION produto_texto_busca(nome text, codigo text, barcode text) RETURNS text AS $$
+            SELECT lower(f_unaccent(coalesce(nome, '') || ' ' || coalesce(codigo, '') || ' ' || coalesce(barcode, '')))
+        $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_produtos_busca_trgm
+        ON produtos USING gin (produto_texto_busca(nome, codigo, barcode) gin_trgm_ops)
+        ''',
+        # Paginação da listagem sem termo de busca
+        "CREATE INDEX IF NOT EXISTS idx_produtos_nome ON produtos (nome)",
+    ]),
+    (5, "Sincronização incremental do catálogo", [
+        # Toda alteração de produto (inclusive baixa de estoque) avança updated_at
+        '''
+        CREATE OR REPLACE FUNCTION produtos_atualizar_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := CURRENT_TIMESTAMP;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        "DROP TRIGGER IF EXISTS trg_produtos_updated_at ON produtos",
+        '''
+        CREATE TRIGGER trg_produtos_updated_at
+        BEFORE UPDATE ON produtos
+        FOR EACH ROW EXECUTE FUNCTION produtos_atualizar_updated_at()
+        ''',
+        # Tombstones de produtos excluídos para quem sincroniza por delta
+        '''
+        CREATE TABLE IF NOT EXISTS produtos_removidos (
+            produto_id INT PRIMARY KEY,
+            removed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE OR REPLACE FUNCTION produtos_registrar_remocao() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO produtos_removidos (produto_id) VALUES (OLD.id)
+            ON CONFLICT (produto_id) DO UPDATE SET removed_at = CURRENT_TIMESTAMP;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        "DROP TRIGGER IF EXISTS trg_produtos_removidos ON produtos",
+        '''
+        CREATE TRIGGER trg_produtos_removidos
+        AFTER DELETE ON produtos
+        FOR EACH ROW EXECUTE FUNCTION produtos_registrar_remocao()
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_produtos_updated_at ON produtos (updated_at)",
+        "CREATE INDEX IF NOT EXISTS idx_produtos_removidos_removed_at ON produtos_removidos (removed_at)",
+    ]),
+    (6, "venda_id como uuid nativo (chaves ordenadas no tempo, UUIDv7)", [
+        # IDs antigos já são UUIDs em texto; qualquer outro valor recebe um
+        # UUID derivado dele, o mesmo em vendas e venda_itens
+        '''
+        CREATE OR REPLACE FUNCTION pg_temp.venda_id_uuid(valor TEXT) RETURNS uuid AS $$
+            SELECT CASE
+                WHEN valor ~* '^[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}$' THEN valor::uuid
+                ELSE md5(valor)::uuid
+            END
+        $$ LANGUAGE sql IMMUTABLE
+        ''',
+        "ALTER TABLE venda_itens DROP CONSTRAINT IF EXISTS venda_itens_venda_id_fkey",
+        "ALTER TABLE vendas ALTER COLUMN venda_id TYPE uuid USING pg_temp.venda_id_uuid(venda_id)",
+        "ALTER TABLE venda_itens ALTER COLUMN venda_id TYPE uuid USING pg_temp.venda_id_uuid(venda_id)",
+        '''
+        ALTER TABLE venda_itens ADD CONSTRAINT venda_itens_venda_id_fkey
+        FOREIGN KEY (venda_id) REFERENCES vendas(venda_id)
+        ''',
+        "DROP FUNCTION pg_temp.venda_id_uuid(TEXT)",
+    ]),
+    (7, "Totais diários de vendas mantidos a cada venda", [
+        '''
+        CREATE TABLE IF NOT EXISTS vendas_diarias (
+            dia DATE NOT NULL,
+            forma_pagamento VARCHAR(50) NOT NULL DEFAULT '',
+            vendas INT NOT NULL DEFAULT 0,
+            itens INT NOT NULL DEFAULT 0,
+            receita DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, forma_pagamento)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS produto_vendas_diarias (
+            dia DATE NOT NULL,
+            produto_id INT NOT NULL,
+            vendas INT NOT NULL DEFAULT 0,
+            quantidade INT NOT NULL DEFAULT 0,
+            receita DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, produto_id)
+        )
+        ''',
+        # Produtos mais vendidos de um período
+        "CREATE INDEX IF NOT EXISTS idx_produto_vendas_diarias_produto ON produto_vendas_diarias (produto_id, dia)",
+        # Carga inicial a partir do histórico existente
+        '''
+        INSERT INTO vendas_diarias (dia, forma_pagamento, vendas, itens, receita)
+        SELECT v.data_venda::date, COALESCE(v.forma_pagamento, ''), count(*),
+               COALESCE(sum(i.itens), 0), sum(v.total)
+        FROM vendas v
+        LEFT JOIN (
+            SELECT venda_id, sum(quantidade) AS itens FROM venda_itens GROUP BY venda_id
+        ) i ON i.venda_id = v.venda_id
+        GROUP BY 1, 2
+        ON CONFLICT (dia, forma_pagamento) DO NOTHING
+        ''',
+        '''
+        INSERT INTO produto_vendas_diarias (dia, produto_id, vendas, quantidade, receita)
+        SELECT v.data_venda::date, vi.produto_id, count(DISTINCT v.venda_id),
+               sum(vi.quantidade), sum(vi.subtotal)
+        FROM venda_itens vi
+        JOIN vendas v ON v.venda_id = vi.venda_id
+        GROUP BY 1, 2
+        ON CONFLICT (dia, produto_id) DO NOTHING
+        ''',
+    ]),
+    (8, "Sincronização do catálogo por ID de transação", [
+        # ID da transação que gravou o produto: quem sincroniza guarda como marca
+        # d'água o xmin do seu snapshot (transações abaixo dele já terminaram), o
+        # que não depende da duração das transações nem do relógio
+        "ALTER TABLE produtos ADD COLUMN IF NOT EXISTS alterado_xid BIGINT NOT NULL DEFAULT 0",
+        "ALTER TABLE produtos_removidos ADD COLUMN IF NOT EXISTS removido_xid BIGINT NOT NULL DEFAULT 0",
+        '''
+        CREATE OR REPLACE FUNCTION produtos_atualizar_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := clock_timestamp();
+            NEW.alterado_xid := txid_current();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        "DROP TRIGGER IF EXISTS trg_produtos_updated_at ON produtos",
+        '''
+        CREATE TRIGGER trg_produtos_updated_at
+        BEFORE INSERT OR UPDATE ON produtos
+        FOR EACH ROW EXECUTE FUNCTION produtos_atualizar_updated_at()
+        ''',
+        '''
+        CREATE OR REPLACE FUNCTION produtos_registrar_remocao() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO produtos_removidos (produto_id, removed_at, removido_xid)
+            VALUES (OLD.id, clock_timestamp(), txid_current())
+            ON CONFLICT (produto_id) DO UPDATE
+            SET removed_at = EXCLUDED.removed_at, removido_xid = EXCLUDED.removido_xid;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_produtos_alterado_xid ON produtos (alterado_xid)",
+        "CREATE INDEX IF NOT EXISTS idx_produtos_removidos_xid ON produtos_removidos (removido_xid)",
+        # Maior ID de transação entre os tombstones já apagados: marcas d'água
+        # até ele podem ter perdido exclusões e exigem recarga completa
+        '''
+        CREATE TABLE IF NOT EXISTS produtos_removidos_poda (
+            id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+            ate_xid BIGINT NOT NULL DEFAULT 0
+        )
+        ''',
+        "INSERT INTO produtos_removidos_poda (id) VALUES (true) ON CONFLICT (id) DO NOTHING",
+    ]),
+    (9, "ID de transação das vendas (reexportação das cópias Parquet)", [
+        # Vendas antigas ficam com 0; o gatilho marca as novas e as alteradas,
+        # inclusive as enviadas com atraso pelo diário local com data de dias já exportados
+        "ALTER TABLE vendas ADD COLUMN IF NOT EXISTS alterado_xid BIGINT NOT NULL DEFAULT 0",
+        '''
+        CREATE OR REPLACE FUNCTION vendas_registrar_xid() RETURNS trigger AS $$
+        BEGIN
+            NEW.alterado_xid := txid_current();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        "DROP TRIGGER IF EXISTS trg_vendas_alterado_xid ON vendas",
+        '''
+        CREATE TRIGGER trg_vendas_alterado_xid
+        BEFORE INSERT OR UPDATE ON vendas
+        FOR EACH ROW EXECUTE FUNCTION vendas_registrar_xid()
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_vendas_alterado_xid ON vendas (alterado_xid)",
+    ]),
+    (10, "Notificações de alteração de imagem de produtos", [
+        # Canal próprio para as miniaturas: baixas de estoque não notificam
+        "DROP TRIGGER IF EXISTS trg_produtos_imagem_inserida ON produtos",
+        '''
+        CREATE TRIGGER trg_produtos_imagem_inserida
+        AFTER INSERT ON produtos
+        FOR EACH ROW WHEN (NEW.imagem_url IS NOT NULL)
+        EXECUTE FUNCTION notificar_alteracao_catalogo('produtos_imagem_alterada')
+        ''',
+        "DROP TRIGGER IF EXISTS trg_produtos_imagem_alterada ON produtos",
+        '''
+        CREATE TRIGGER trg_produtos_imagem_alterada
+        AFTER UPDATE OF imagem_url ON produtos
+        FOR EACH ROW WHEN (NEW.imagem_url IS NOT NULL AND OLD.imagem_url IS DISTINCT FROM NEW.imagem_url)
+        EXECUTE FUNCTION notificar_alteracao_catalogo('produtos_imagem_alterada')
+        ''',
+    ]),
+    (11, "Versão das linhas de produtos", [
+        # Contador por linha: gravações na mesma linha são serializadas pelo
+        # bloqueio, então a versão só cresce (o ID de transação não garante isso)
+        "ALTER TABLE produtos ADD COLUMN IF NOT EXISTS versao BIGINT NOT NULL DEFAULT 0",
+        '''
+        CREATE OR REPLACE FUNCTION produtos_atualizar_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := clock_timestamp();
+            NEW.alterado_xid := txid_current();
+            IF TG_OP = 'UPDATE' THEN
+                NEW.versao := OLD.versao + 1;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+    ]),
+]
+
+# Consultas críticas que não podem recorrer a varredura sequencial:
+# nome -> (query, parâmetros de exemplo, tabelas que devem usar índice)
+HOT_QUERIES = {
+    "leitura_codigo_barras": (
+        """
+        SELECT p.*, c.nome as categoria_nome
+        FROM produtos p
+        LEFT JOIN categorias c ON p.categoria_id = c.id
+        WHERE p.barcode = %s
+        """,
+        ("7890000000000",),
+        ["produtos"],
+    ),
+    "vendas_por_periodo": (
+        """
+        SELECT * FROM vendas
+        WHERE data_venda >= %s AND data_venda <= %s
+        ORDER BY data_venda DESC
+        """,
+        ("2025-01-01", "2025-01-31 23:59:59"),
+        ["vendas"],
+    ),
+    "detalhes_venda": (
+        """
+        SELECT vi.*, p.nome as produto_nome, p.codigo as produto_codigo
+        FROM venda_itens vi
+        JOIN produtos p ON vi.produto_id = p.id
+        WHERE vi.venda_id = %s
+        """,
+        ("00000000-0000-0000-0000-000000000000",),
+        ["venda_itens"],
+    ),
+    "busca_produtos": (
+        """
+        SELECT p.id FROM produtos p
+        WHERE produto_texto_busca(p.nome, p.codigo, p.barcode) LIKE %s
+        """,
+        ("%arroz%",),
+        ["produtos"],
+    ),
+}
+
+def run_migrations(conn):
+    """
+    Aplica as migrações pendentes registrando-as na tabela schema_version
+    
+    Todas as migrações pendentes rodam em uma única transação, protegida
+    por um advisory lock para que processos iniciando ao mesmo tempo não
+    apliquem a mesma migração duas vezes.
+    
+    Args:
+        conn: Conexão com o banco de dados
+    
+    Returns:
+        list: Versões aplicadas nesta chamada
+    """
+    aplicadas = []
+    
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+        cur.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            descricao TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        versao_atual = cur.fetchone()[0]
+        
+        for version, descricao, comandos in MIGRATIONS:
+            if version <= versao_atual:
+                continue
+            for comando in comandos:
+                cur.execute(comando)
+            cur.execute(
+                "INSERT INTO schema_version (version, descricao) VALUES (%s, %s)",
+                (version, descricao)
+            )
+            aplicadas.append(version)
+    
+    conn.commit()
+    return aplicadas
+
+def _seq_scans(plan, tabelas):
+    """Retorna as tabelas de `tabelas` lidas com Seq Scan no plano"""
+    encontradas = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in tabelas:
+        encontradas.append(plan["Relation Name"])
+    for sub in plan.get("Plans", []):
+        encontradas.extend(_seq_scans(sub, tabelas))
+    return encontradas
+
+def check_query_plans(conn):
+    """
+    Verifica com EXPLAIN se as consultas críticas conseguem usar índices
+    
+    A varredura sequencial é desabilitada na transação de verificação, de
+    forma que o planejador só escolhe Seq Scan quando não existe índice
+    utilizável, independentemente do tamanho atual das tabelas.
+    
+    Args:
+        conn: Conexão com o banco de dados
+    
+    Returns:
+        list: Tuplas (nome da consulta, tabelas com Seq Scan, plano JSON)
+    """
+    resultado = []
+    
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL enable_seqscan = off")
+            for nome, (query, params, tabelas) in HOT_QUERIES.items():
+                cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+                plano = cur.fetchone()[0]
+                if isinstance(plano, str):
+                    plano = json.loads(plano)
+                resultado.append((nome, _seq_scans(plano[0]["Plan"], tabelas), plano))
+    finally:
+        conn.rollback()
+    
+    return resultado
@@ -2,9 +2,292 @@
 Módulo contendo as classes de modelo do sistema PDV
 """
 
+import io
+import time
 import uuid
+import secrets
+import threading
+import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-from database import execute_query, query_to_dataframe
+import psycopg2
+from psycopg2.extras import execute_values
+from database import connection, execute_query, query_to_dataframe, stream_query, get_group_commit, get_listener
+from catalog import TypedCatalog, fetch_changes, get_catalog
+from journal import get_journal
+from config import REPORT_CONFIG
+
+class EstoqueInsuficienteError(Exception):
+    """
+    Estoque insuficiente para atender uma ou mais linhas de uma venda
+    
+    Attributes:
+        faltas (list): Um dict por produto com `produto_id`, `nome`,
+            `solicitado` e `disponivel`
+    """
+    
+    def __init__(self, faltas):
+        self.faltas = faltas
+        detalhes = "; ".join(
+            f"{f['nome'] or f['produto_id']}: solicitado {f['solicitado']}, disponível {f['disponivel']}"
+            for f in faltas
+        )
+        super().__init__(f"Estoque insuficiente - {detalhes}")
+
+
+def _reservar_estoque(cur, baixas):
+    """
+    Desconta o estoque de vários produtos, apenas se houver saldo para todos
+    
+    Os produtos são bloqueados em ordem crescente de ID, de modo que caixas
+    vendendo os mesmos produtos esperam uns pelos outros em vez de entrar
+    em deadlock; o desconto é condicional (`estoque >= quantidade`).
+    
+    Args:
+        cur: Cursor da transação da venda
+        baixas (dict): Quantidade a descontar por ID do produto
+        
+    Returns:
+        dict: (estoque, versão da linha) resultantes por ID do produto
+        
+    Raises:
+        EstoqueInsuficienteError: Algum produto não tem saldo; nada é descontado
+            desde que o chamador desfaça a transação
+    """
+    cur.execute(
+        "SELECT id, nome, estoque FROM produtos WHERE id = ANY(%s) ORDER BY id FOR UPDATE",
+        (list(baixas),)
+    )
+    bloqueados = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+    
+    descontados = execute_values(cur, """
+    UPDATE produtos AS p
+    SET estoque = p.estoque - v.quantidade, updated_at = CURRENT_TIMESTAMP
+    FROM (VALUES %s) AS v(produto_id, quantidade)
+    WHERE p.id = v.produto_id AND (v.quantidade <= 0 OR p.estoque >= v.quantidade)
+    RETURNING p.id, p.estoque, p.versao
+    """, list(baixas.items()), template="(%s::int, %s::int)", page_size=len(baixas) or 1, fetch=True)
+    descontados = {row[0]: (row[1], row[2]) for row in descontados}
+    
+    faltas = [
+        {
+            "produto_id": produto_id,
+            "nome": bloqueados.get(produto_id, (None, 0))[0],
+            "solicitado": quantidade,
+            "disponivel": bloqueados.get(produto_id, (None, 0))[1],
+        }
+        for produto_id, quantidade in sorted(baixas.items())
+        if produto_id not in descontados
+    ]
+    if faltas:
+        raise EstoqueInsuficienteError(faltas)
+    return descontados
+
+
+_uuid7_lock = threading.Lock()
+_uuid7_last = (0, 0)
+
+def uuid7():
+    """
+    Gera um UUID versão 7: 48 bits de milissegundos Unix seguidos de bits aleatórios
+    
+    IDs gerados em sequência ficam em ordem crescente (um contador de 12 bits
+    desempata no mesmo milissegundo), de forma que novas vendas entram no fim
+    do índice em vez de em posições aleatórias.
+    
+    Returns:
+        uuid.UUID: UUID ordenado no tempo
+    """
+    global _uuid7_last
+    ms = time.time_ns() // 1_000_000
+    with _uuid7_lock:
+        ultimo_ms, contador = _uuid7_last
+        if ms <= ultimo_ms:
+            ms, contador = ultimo_ms, contador + 1
+            if contador > 0xFFF:
+                ms, contador = ms + 1, 0
+        else:
+            contador = secrets.randbits(11)
+        _uuid7_last = (ms, contador)
+    
+    valor = (ms & 0xFFFFFFFFFFFF) << 80 | 0x7 << 76 | contador << 64 | 0b10 << 62 | secrets.randbits(62)
+    return uuid.UUID(int=valor)
+
+
+def _acumular_totais_diarios(cur, dia, forma_pagamento, total, itens):
+    """
+    Soma uma venda aos totais diários, na mesma transação que a grava
+    
+    Args:
+        cur: Cursor da transação
+        dia (date): Dia da venda
+        forma_pagamento (str): Forma de pagamento
+        total (float): Valor total da venda
+        itens (list): Tuplas (venda_id, produto_id, quantidade, preço unitário, subtotal)
+    """
+    por_produto = {}
+    for _, produto_id, quantidade, _, subtotal in itens:
+        acumulado = por_produto.get(produto_id, (0, 0))
+        por_produto[produto_id] = (acumulado[0] + quantidade, acumulado[1] + subtotal)
+    
+    cur.execute("""
+    INSERT INTO vendas_diarias AS d (dia, forma_pagamento, vendas, itens, receita)
+    VALUES (%s, %s, 1, %s, %s)
+    ON CONFLICT (dia, forma_pagamento) DO UPDATE
+    SET vendas = d.vendas + 1, itens = d.itens + EXCLUDED.itens, receita = d.receita + EXCLUDED.receita
+    """, (dia, forma_pagamento or "", sum(q for q, _ in por_produto.values()), total))
+    
+    if por_produto:
+        # Ordem fixa de produto para que vendas simultâneas travem as linhas na mesma sequência
+        execute_values(cur, """
+        INSERT INTO produto_vendas_diarias AS d (dia, produto_id, vendas, quantidade, receita)
+        VALUES %s
+        ON CONFLICT (dia, produto_id) DO UPDATE
+        SET vendas = d.vendas + 1, quantidade = d.quantidade + EXCLUDED.quantidade,
+            receita = d.receita + EXCLUDED.receita
+        """, [
+            (dia, produto_id, 1, quantidade, receita)
+            for produto_id, (quantidade, receita) in sorted(por_produto.items())
+        ], page_size=len(por_produto))
+
+
+def _get_sale_journal():
+    """Retorna o diário local de vendas com o envio ao banco iniciado, ou None"""
+    journal = get_journal()
+    if journal is not None:
+        journal.start(Venda._enviar_lote)
+    return journal
+
+
+class ReportCache:
+    """
+    Cache LRU de resultados de relatórios, invalidado por versão dos dados
+    
+    A chave de cada resultado é o nome da consulta, seus parâmetros e a
+    versão dos dados no momento do cálculo. Toda gravação em produtos,
+    categorias ou vendas incrementa a versão: resultados antigos deixam de
+    ser encontrados e saem pelo LRU. Alterações feitas por outros processos
+    chegam pelas notificações do banco; `max_age` limita quanto tempo um
+    resultado é usado caso alguma alteração não seja notificada.
+    
+    Os resultados são compartilhados entre sessões e não devem ser alterados.
+    """
+    
+    def __init__(self, max_entries=64, max_age=300.0):
+        """
+        Args:
+            max_entries (int, optional): Resultados mantidos em cache. Defaults to 64.
+            max_age (float, optional): Tempo máximo de uso de um resultado em segundos. Defaults to 300.0.
+        """
+        self.max_entries = max_entries
+        self.max_age = max_age
+        
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()    # (nome, parâmetros, versão) -> (instante do cálculo, resultado)
+        self._versao = 0
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+    
+    @property
+    def versao(self):
+        """Versão atual dos dados"""
+        return self._versao
+    
+    def invalidate(self, *args):
+        """Marca os dados como alterados; aceita e ignora argumentos para servir de callback"""
+        with self._lock:
+            self._versao += 1
+            self._stats["invalidations"] += 1
+    
+    def get(self, nome, calcular, *params):
+        """
+        Retorna o resultado de uma consulta, calculando-o se não estiver em cache
+        
+        Args:
+            nome (str): Nome da consulta
+            calcular (callable): Função que executa a consulta, chamada com `params`
+            *params: Parâmetros da consulta (devem ser hashable)
+        
+        Returns:
+            Resultado de `calcular(*params)`
+        """
+        agora = time.monotonic()
+        with self._lock:
+            chave = (nome, params, self._versao)
+            entrada = self._entries.get(chave)
+            if entrada is not None and agora - entrada[0] <= self.max_age:
+                self._entries.move_to_end(chave)
+                self._stats["hits"] += 1
+                return entrada[1]
+            self._stats["misses"] += 1
+        
+        # Calculado fora do lock; se os dados mudarem no meio, o resultado
+        # fica sob a versão antiga e nunca é encontrado
+        resultado = calcular(*params)
+        
+        with self._lock:
+            self._entries[chave] = (agora, resultado)
+            self._entries.move_to_end(chave)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        return resultado
+    
+    def stats(self):
+        """
+        Retorna as estatísticas do cache
+        
+        Returns:
+            dict: Acertos, faltas, taxa de acerto, remoções, invalidações, entradas e versão
+        """
+        with self._lock:
+            result = dict(self._stats)
+            result["entries"] = len(self._entries)
+            result["versao"] = self._versao
+        consultas = result["hits"] + result["misses"]
+        result["hit_rate"] = result["hits"] / consultas if consultas else 0.0
+        return result
+
+
+_report_cache = None
+_report_cache_lock = threading.Lock()
+
+def get_report_cache():
+    """
+    Retorna o cache de relatórios do processo, criando-o na primeira chamada
+    
+    Returns:
+        ReportCache: Cache compartilhado por todas as sessões do Streamlit
+    """
+    global _report_cache
+    if _report_cache is None:
+        with _report_cache_lock:
+            if _report_cache is None:
+                _report_cache = ReportCache(
+                    max_entries=REPORT_CONFIG["cache_entries"],
+                    max_age=REPORT_CONFIG["cache_max_age"]
+                )
+                listener = get_listener()
+                if listener is not None:
+                    # Vendas de outros caixas alteram o estoque e também notificam produtos_alterados
+                    listener.subscribe("produtos_alterados", _report_cache.invalidate)
+                    listener.subscribe("categorias_alteradas", _report_cache.invalidate)
+                    listener.on_reconnect(_report_cache.invalidate)
+    return _report_cache
+
+
+# Agrupamentos no tempo aceitos por Venda.resumo (valores de date_trunc)
+GRANULARIDADES_RESUMO = ("hour", "day", "week", "month")
+
+# Colunas aceitas na importação em massa de produtos
+IMPORT_COLUMNS = ("codigo", "barcode", "nome", "descricao", "preco", "estoque",
+                  "categoria_id", "categoria", "imagem_url")
 
 class Categoria:
     """Classe para operações com categorias de produtos"""
@@ -17,7 +300,7 @@ class Categoria:
         Returns:
             pd.DataFrame: DataFrame com todas as categorias
         """
-        return query_to_dataframe("SELECT * FROM categorias ORDER BY nome")
+        return get_catalog().get_categorias()
     
     @staticmethod
     def add(nome, descricao=""):
@@ -33,7 +316,10 @@ class Categoria:
         """
         query = "INSERT INTO categorias (nome, descricao) VALUES (%s, %s) RETURNING id"
         params = (nome, descricao)
-        return execute_query(query, params)
+        cat_id = execute_query(query, params)
+        get_catalog().invalidate_categorias()
+        get_report_cache().invalidate()
+        return cat_id
     
     @staticmethod
     def update(cat_id, nome, descricao):
@@ -48,6 +334,8 @@ class Categoria:
         query = "UPDATE categorias SET nome = %s, descricao = %s WHERE id = %s"
         params = (nome, descricao, cat_id)
         execute_query(query, params)
+        get_catalog().invalidate_categorias()
+        get_report_cache().invalidate()
     
     @staticmethod
     def delete(cat_id):
@@ -63,6 +351,8 @@ class Categoria:
         try:
             query = "DELETE FROM categorias WHERE id = %s"
             execute_query(query, (cat_id,))
+            get_catalog().invalidate_categorias()
+            get_report_cache().invalidate()
             return True
         except Exception:
             return False
@@ -87,6 +377,123 @@ class Produto:
         """
         return query_to_dataframe(query)
     
+    @staticmethod
+    def iter_all(chunk_size=5000):
+        """
+        Percorre todos os produtos em blocos, sem carregar a tabela inteira
+        
+        Args:
+            chunk_size (int, optional): Produtos por bloco. Defaults to 5000.
+            
+        Yields:
+            pd.DataFrame: Bloco de produtos com suas categorias
+        """
+        query = """
+        SELECT p.*, c.nome as categoria_nome 
+        FROM produtos p
+        LEFT JOIN categorias c ON p.categoria_id = c.id
+        ORDER BY p.nome
+        """
+        return stream_query(query, chunk_size=chunk_size)
+    
+    @staticmethod
+    def get_changed_since(watermark=None):
+        """
+        Retorna o delta do catálogo desde uma marca d'água
+        
+        A marca d'água é o menor ID de transação ainda em andamento no momento
+        da leitura; o delta traz tudo o que foi gravado por transações a partir
+        dela, inclusive as que confirmaram depois de outras mais novas.
+        
+        Args:
+            watermark (int, optional): Marca d'água da última sincronização;
+                None retorna o catálogo completo. Defaults to None.
+            
+        Returns:
+            tuple: (DataFrame de produtos inseridos/alterados, lista de IDs excluídos,
+                nova marca d'água a ser usada na próxima chamada). A lista é None
+                quando o DataFrame traz o catálogo completo: sem marca d'água ou
+                quando exclusões posteriores a ela já foram podadas.
+        """
+        query = """
+        SELECT p.*, c.nome as categoria_nome 
+        FROM produtos p
+        LEFT JOIN categorias c ON p.categoria_id = c.id
+        """
+        
+        with connection() as conn:
+            with conn.cursor() as cur:
+                colunas, linhas, removidos, novo_watermark = fetch_changes(cur, watermark, query)
+        
+        df = pd.DataFrame.from_records(linhas, columns=colunas, coerce_float=True)
+        return df, removidos, novo_watermark
+    
+    @staticmethod
+    def search(term="", limit=20, offset=0):
+        """
+        Busca produtos no servidor, uma página por vez
+        
+        A busca ignora acentos e maiúsculas, usa o índice de trigramas sobre
+        nome, código e código de barras e ordena por relevância: primeiro
+        código ou código de barras idênticos ao termo, depois a similaridade
+        com o texto do produto. Sem termo, lista os produtos por nome.
+        
+        Args:
+            term (str, optional): Termo de busca. Defaults to "".
+            limit (int, optional): Quantidade máxima de produtos. Defaults to 20.
+            offset (int, optional): Quantidade de produtos a pular. Defaults to 0.
+            
+        Returns:
+            pd.DataFrame: Página de produtos com suas categorias
+        """
+        term = (term or "").strip()
+        
+        if not term:
+            query = """
+            SELECT p.*, c.nome as categoria_nome 
+            FROM produtos p
+            LEFT JOIN categorias c ON p.categoria_id = c.id
+            ORDER BY p.nome, p.id
+            LIMIT %(limit)s OFFSET %(offset)s
+            """
+            return query_to_dataframe(query, {"limit": limit, "offset": offset})
+        
+        # Escapar curingas do LIKE digitados pelo usuário
+        padrao = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        
+        query = """
+        SELECT p.*, c.nome as categoria_nome
+        FROM produtos p
+        LEFT JOIN categorias c ON p.categoria_id = c.id
+        WHERE produto_texto_busca(p.nome, p.codigo, p.barcode) LIKE '%%' || lower(f_unaccent(%(padrao)s)) || '%%'
+           OR lower(f_unaccent(%(term)s)) <%% produto_texto_busca(p.nome, p.codigo, p.barcode)
+        ORDER BY COALESCE(p.codigo = %(term)s OR p.barcode = %(term)s, false) DESC,
+                 word_similarity(lower(f_unaccent(%(term)s)), produto_texto_busca(p.nome, p.codigo, p.barcode)) DESC,
+                 p.nome, p.id
+        LIMIT %(limit)s OFFSET %(offset)s
+        """
+        params = {"term": term, "padrao": padrao, "limit": limit, "offset": offset}
+        return query_to_dataframe(query, params)
+    
+    @staticmethod
+    def get_typed(chunk_size=5000):
+        """
+        Retorna o catálogo em arrays tipados para relatórios vetorizados
+        
+        Args:
+            chunk_size (int, optional): Produtos lidos por bloco. Defaults to 5000.
+            
+        Returns:
+            TypedCatalog: Preços em centavos, estoque int32 e categorias categóricas
+        """
+        query = """
+        SELECT p.id, p.codigo, p.nome, round(p.preco * 100)::bigint, p.estoque, c.nome
+        FROM produtos p
+        LEFT JOIN categorias c ON p.categoria_id = c.id
+        ORDER BY p.nome
+        """
+        return TypedCatalog.from_chunks(stream_query(query, chunk_size=chunk_size, as_dataframe=False))
+    
     @staticmethod
     def get_by_id(produto_id):
         """
@@ -112,20 +519,16 @@ class Produto:
         """
         Retorna um produto pelo código de barras
         
+        A consulta é resolvida pelo índice do catálogo em memória; o banco
+        de dados só é consultado quando o código não está no índice.
+        
         Args:
             barcode (str): Código de barras
             
         Returns:
-            pd.Series: Produto encontrado ou None
-        """
-        query = """
-        SELECT p.*, c.nome as categoria_nome 
-        FROM produtos p
-        LEFT JOIN categorias c ON p.categoria_id = c.id
-        WHERE p.barcode = %s
+            ProductRecord: Produto encontrado ou None
         """
-        df = query_to_dataframe(query, [barcode])
-        return df.iloc[0] if not df.empty else None
+        return get_catalog().get_by_barcode(barcode)
     
     @staticmethod
     def add(codigo, nome, descricao, preco, estoque, categoria_id, barcode=None, imagem_url=None):
@@ -150,7 +553,9 @@ class Produto:
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id
         """
         params = (codigo, nome, descricao, preco, estoque, categoria_id, barcode, imagem_url)
-        return execute_query(query, params)
+        produto_id = execute_query(query, params)
+        get_report_cache().invalidate()
+        return produto_id
     
     @staticmethod
     def update(produto_id, codigo, nome, descricao, preco, estoque, categoria_id, barcode=None, imagem_url=None):
@@ -176,6 +581,8 @@ class Produto:
         """
         params = (codigo, nome, descricao, preco, estoque, categoria_id, barcode, imagem_url, produto_id)
         execute_query(query, params)
+        get_catalog().invalidate(produto_id)
+        get_report_cache().invalidate()
     
     @staticmethod
     def delete(produto_id):
@@ -191,9 +598,17 @@ class Produto:
         try:
             query = "DELETE FROM produtos WHERE id = %s"
             execute_query(query, (produto_id,))
-            return True
+            get_catalog().invalidate(produto_id)
+            get_report_cache().invalidate()
         except Exception:
             return False
+        
+        # A exclusão gera um tombstone; aproveita para apagar os que já expiraram
+        try:
+            get_catalog().prune_tombstones()
+        except Exception:
+            pass
+        return True
     
     @staticmethod
     def update_stock(produto_id, quantidade):
@@ -202,106 +617,968 @@ class Produto:
         
         Args:
             produto_id (int): ID do produto
-            quantidade (int): Quantidade a ser reduzida do estoque
+            quantidade (int): Quantidade a ser reduzida do estoque (negativa para entrada)
+            
+        Raises:
+            EstoqueInsuficienteError: O estoque atual é menor que a quantidade
+        """
+        with connection() as conn:
+            with conn.cursor() as cur:
+                niveis = _reservar_estoque(cur, {int(produto_id): int(quantidade)})
+            conn.commit()
+        get_catalog().apply_stock_levels(niveis)
+        get_report_cache().invalidate()
+    
+    
+    @staticmethod
+    def _ler_importacao(arquivo, formato, chunk_size, sep, encoding):
+        """Lê o arquivo de importação em blocos de texto, com nomes de coluna normalizados"""
+        if formato == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            
+            parquet = pq.ParquetFile(arquivo)
+            nomes = {nome.strip().lower(): nome for nome in parquet.schema_arrow.names}
+            colunas = [nomes[c] for c in IMPORT_COLUMNS if c in nomes]
+            for batch in parquet.iter_batches(batch_size=chunk_size, columns=colunas):
+                chunk = batch.to_pandas()
+                chunk.columns = [c.strip().lower() for c in chunk.columns]
+                for campo in batch.schema:
+                    nome = campo.name.strip().lower()
+                    valores = chunk[nome]
+                    if pa.types.is_integer(campo.type):
+                        # Inteiros com nulos chegam como float ("5.0"); Int64 mantém "5"
+                        chunk[nome] = pd.to_numeric(valores).astype("Int64")
+                    elif nome in ("estoque", "categoria_id") and pa.types.is_floating(campo.type):
+                        numeros = pd.to_numeric(valores)
+                        if (numeros.dropna() % 1 == 0).all():
+                            chunk[nome] = numeros.astype("Int64")
+                    elif nome == "preco" and (pa.types.is_floating(campo.type) or pa.types.is_decimal(campo.type)):
+                        # Float binário (ex.: 12.300000000000001) não passaria na validação de 2 casas
+                        chunk[nome] = pd.to_numeric(valores).round(2)
+                yield chunk.astype(object).where(chunk.notna(), None)
+        elif formato == "csv":
+            leitor = pd.read_csv(arquivo, sep=sep, encoding=encoding, dtype=str,
+                                 keep_default_na=False, chunksize=chunk_size)
+            for chunk in leitor:
+                chunk.columns = [str(c).strip().lower() for c in chunk.columns]
+                yield chunk
+        else:
+            raise ValueError(f"Formato de importação não suportado: {formato}")
+    
+    @staticmethod
+    def bulk_upsert(arquivo, formato=None, chunk_size=10000, sep=",", encoding="utf-8"):
+        """
+        Importa produtos em massa, inserindo novos e atualizando existentes pelo código
+        
+        O arquivo é lido em blocos e copiado com COPY para uma tabela temporária;
+        a validação e a mesclagem com `INSERT ... ON CONFLICT (codigo) DO UPDATE`
+        acontecem no servidor, em uma única transação. As colunas reconhecidas são
+        as da tabela de produtos (`codigo`, `nome` e `preco` obrigatórias) e
+        `categoria`, com o nome da categoria como alternativa a `categoria_id`.
+        Colunas ausentes no arquivo não são alteradas nos produtos existentes.
+        Quando o mesmo código aparece mais de uma vez, vale a última linha.
+        
+        Args:
+            arquivo (str or file): Caminho ou arquivo aberto (ex.: upload do Streamlit)
+            formato (str, optional): "csv" ou "parquet"; None deduz pela extensão. Defaults to None.
+            chunk_size (int, optional): Linhas lidas e copiadas por bloco. Defaults to 10000.
+            sep (str, optional): Separador do CSV. Defaults to ",".
+            encoding (str, optional): Codificação do CSV. Defaults to "utf-8".
+            
+        Returns:
+            dict: Linhas lidas, inseridas, atualizadas, inalteradas, DataFrame das
+                rejeitadas (linha, código e motivo), tempo e linhas por segundo
+        """
+        if formato is None:
+            nome_arquivo = arquivo if isinstance(arquivo, str) else getattr(arquivo, "name", "")
+            formato = "parquet" if str(nome_arquivo).lower().endswith(".parquet") else "csv"
+        formato = formato.lower()
+        
+        inicio = time.perf_counter()
+        linhas = 0
+        presentes = None
+        
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                CREATE TEMP TABLE importacao_produtos (
+                    linha INT PRIMARY KEY,
+                    codigo TEXT, barcode TEXT, nome TEXT, descricao TEXT, preco TEXT,
+                    estoque TEXT, categoria_id TEXT, categoria TEXT, imagem_url TEXT,
+                    cat_id INT,
+                    motivo TEXT
+                ) ON COMMIT DROP
+                """)
+                
+                for chunk in Produto._ler_importacao(arquivo, formato, chunk_size, sep, encoding):
+                    if presentes is None:
+                        presentes = [c for c in IMPORT_COLUMNS if c in chunk.columns]
+                        faltando = [c for c in ("codigo", "nome", "preco") if c not in presentes]
+                        if faltando:
+                            raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(faltando)}")
+                    
+                    bloco = chunk[presentes].copy()
+                    bloco.insert(0, "linha", range(linhas + 1, linhas + len(bloco) + 1))
+                    linhas += len(bloco)
+                    
+                    buffer = io.StringIO()
+                    bloco.to_csv(buffer, header=False, index=False)
+                    buffer.seek(0)
+                    cur.copy_expert(
+                        f"COPY importacao_produtos (linha, {', '.join(presentes)}) FROM STDIN WITH (FORMAT csv)",
+                        buffer
+                    )
+                
+                if presentes is None:
+                    raise ValueError("Arquivo de importação vazio")
+                
+                # Validação: só o primeiro problema de cada linha é informado
+                cur.execute(r"""
+                UPDATE importacao_produtos SET motivo = CASE
+                    WHEN NULLIF(trim(codigo), '') IS NULL THEN 'código vazio'
+                    WHEN length(trim(codigo)) > 50 THEN 'código com mais de 50 caracteres'
+                    WHEN NULLIF(trim(nome), '') IS NULL THEN 'nome vazio'
+                    WHEN length(trim(nome)) > 200 THEN 'nome com mais de 200 caracteres'
+                    WHEN NULLIF(trim(preco), '') IS NULL THEN 'preço vazio'
+                    WHEN trim(preco) !~ '^\d{1,8}([.,]\d{1,2})?$' THEN 'preço inválido'
+                    WHEN trim(estoque) !~ '^(-?\d{1,9}(\.0*)?)?$' THEN 'estoque inválido'
+                    WHEN length(trim(barcode)) > 100 THEN 'código de barras com mais de 100 caracteres'
+                    WHEN trim(categoria_id) !~ '^\d{0,9}$' THEN 'categoria_id inválido'
+                END
+                """)
+                cur.execute("""
+                UPDATE importacao_produtos AS s
+                SET cat_id = c.id
+                FROM categorias c
+                WHERE s.motivo IS NULL
+                  AND (trim(s.categoria_id) = c.id::text
+                       OR (NULLIF(trim(s.categoria_id), '') IS NULL
+                           AND lower(trim(s.categoria)) = lower(c.nome)))
+                """)
+                cur.execute("""
+                UPDATE importacao_produtos
+                SET motivo = 'categoria inexistente'
+                WHERE motivo IS NULL AND cat_id IS NULL
+                  AND COALESCE(NULLIF(trim(categoria_id), ''), NULLIF(trim(categoria), '')) IS NOT NULL
+                """)
+                cur.execute("""
+                UPDATE importacao_produtos AS s
+                SET motivo = 'código repetido mais adiante no arquivo'
+                FROM (
+                    SELECT linha, row_number() OVER (PARTITION BY trim(codigo) ORDER BY linha DESC) AS ordem
+                    FROM importacao_produtos
+                    WHERE motivo IS NULL
+                ) AS d
+                WHERE s.linha = d.linha AND d.ordem > 1
+                """)
+                
+                # Colunas ausentes no arquivo mantêm o valor atual dos produtos existentes
+                valores = {
+                    "codigo": "trim(codigo)",
+                    "nome": "trim(nome)",
+                    "descricao": "NULLIF(descricao, '')",
+                    "preco": "replace(trim(preco), ',', '.')::numeric",
+                    "estoque": "COALESCE(NULLIF(trim(estoque), '')::numeric::int, 0)",
+                    "categoria_id": "cat_id",
+                    "barcode": "NULLIF(trim(barcode), '')",
+                    "imagem_url": "NULLIF(trim(imagem_url), '')",
+                }
+                atualizadas = [c for c in valores if c != "codigo" and
+                               (c in presentes or (c == "categoria_id" and "categoria" in presentes))]
+                destino = ", ".join(valores)
+                origem = ", ".join(valores.values())
+                atribuicoes = ", ".join(f"{c} = EXCLUDED.{c}" for c in atualizadas)
+                atuais = ", ".join(f"produtos.{c}" for c in atualizadas)
+                novos = ", ".join(f"EXCLUDED.{c}" for c in atualizadas)
+                
+                cur.execute(f"""
+                WITH mesclados AS (
+                    INSERT INTO produtos ({destino})
+                    SELECT {origem}
+                    FROM importacao_produtos
+                    WHERE motivo IS NULL
+                    ORDER BY linha
+                    ON CONFLICT (codigo) DO UPDATE SET {atribuicoes}
+                    WHERE ({atuais}) IS DISTINCT FROM ({novos})
+                    RETURNING (xmax = 0) AS inserido
+                )
+                SELECT count(*) FILTER (WHERE inserido), count(*) FILTER (WHERE NOT inserido)
+                FROM mesclados
+                """)
+                inseridos, atualizados = cur.fetchone()
+                
+                cur.execute("""
+                SELECT linha, COALESCE(trim(codigo), '') AS codigo, motivo FROM importacao_produtos
+                WHERE motivo IS NOT NULL
+                ORDER BY linha
+                """)
+                rejeitados = pd.DataFrame(cur.fetchall(), columns=["linha", "codigo", "motivo"])
+            
+            conn.commit()
+        
+        if inseridos or atualizados:
+            get_catalog().refresh()
+            get_report_cache().invalidate()
+        
+        segundos = time.perf_counter() - inicio
+        return {
+            "linhas": linhas,
+            "inseridos": inseridos,
+            "atualizados": atualizados,
+            "inalterados": linhas - inseridos - atualizados - len(rejeitados),
+            "rejeitados": rejeitados,
+            "segundos": segundos,
+            "linhas_por_segundo": linhas / segundos if segundos > 0 else 0.0,
+        }
+    
+    
+    @staticmethod
+    def _aplicar_ajustes(preencher, dry_run):
+        """
+        Aplica em uma transação os ajustes gravados por `preencher` na tabela temporária
+        
+        Args:
+            preencher (callable): Recebe o cursor e insere as linhas em `ajustes_lote`
+            dry_run (bool): Desfaz a transação, retornando apenas a prévia
+            
+        Returns:
+            pd.DataFrame: Produtos alterados com valores antes e depois
+        """
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                CREATE TEMP TABLE ajustes_lote (
+                    produto_id INT,
+                    codigo TEXT,
+                    preco NUMERIC(10, 2),
+                    preco_percentual NUMERIC,
+                    estoque INT,
+                    estoque_delta INT,
+                    preco_antes NUMERIC(10, 2),
+                    estoque_antes INT
+                ) ON COMMIT DROP
+                """)
+                preencher(cur)
+                
+                cur.execute("""
+                UPDATE ajustes_lote AS a SET produto_id = p.id
+                FROM produtos p
+                WHERE a.produto_id IS NULL AND p.codigo = a.codigo
+                """)
+                cur.execute("""
+                SELECT COALESCE(a.codigo, a.produto_id::text)
+                FROM ajustes_lote a
+                WHERE NOT EXISTS (SELECT 1 FROM produtos p WHERE p.id = a.produto_id)
+                LIMIT 10
+                """)
+                nao_encontrados = [row[0] for row in cur.fetchall()]
+                if nao_encontrados:
+                    raise ValueError(f"Produtos não encontrados: {', '.join(map(str, nao_encontrados))}")
+                
+                cur.execute("""
+                SELECT produto_id FROM ajustes_lote
+                GROUP BY produto_id HAVING count(*) > 1
+                LIMIT 10
+                """)
+                repetidos = [row[0] for row in cur.fetchall()]
+                if repetidos:
+                    raise ValueError(f"Produtos com mais de um ajuste: {', '.join(map(str, repetidos))}")
+                
+                # Bloqueia os produtos em ordem de ID (a mesma da baixa de estoque
+                # das vendas, evitando deadlocks) e guarda os valores anteriores
+                cur.execute("""
+                UPDATE ajustes_lote AS a
+                SET preco_antes = b.preco, estoque_antes = b.estoque
+                FROM (
+                    SELECT p.id, p.preco, p.estoque
+                    FROM produtos p
+                    WHERE p.id IN (SELECT produto_id FROM ajustes_lote)
+                    ORDER BY p.id
+                    FOR UPDATE
+                ) AS b
+                WHERE a.produto_id = b.id
+                """)
+                
+                # Os novos valores partem da linha atual do produto, não de uma
+                # leitura anterior: vendas confirmadas antes do bloqueio não se perdem
+                cur.execute("""
+                UPDATE produtos AS p
+                SET preco = round(COALESCE(a.preco, p.preco) * (1 + COALESCE(a.preco_percentual, 0) / 100), 2),
+                    estoque = COALESCE(a.estoque, p.estoque) + COALESCE(a.estoque_delta, 0)
+                FROM ajustes_lote a
+                WHERE p.id = a.produto_id
+                  AND (p.preco, p.estoque) IS DISTINCT FROM (
+                      round(COALESCE(a.preco, p.preco) * (1 + COALESCE(a.preco_percentual, 0) / 100), 2),
+                      COALESCE(a.estoque, p.estoque) + COALESCE(a.estoque_delta, 0)
+                  )
+                RETURNING p.id, p.codigo, p.nome, a.preco_antes, p.preco AS preco_depois,
+                          a.estoque_antes, p.estoque AS estoque_depois
+                """)
+                colunas = [desc[0] for desc in cur.description]
+                diff = pd.DataFrame(cur.fetchall(), columns=colunas).sort_values("nome", ignore_index=True)
+            
+            invalidos = diff[(diff["preco_depois"] <= 0) | (diff["estoque_depois"] < 0)]
+            if not invalidos.empty:
+                raise ValueError(
+                    "Ajuste resultaria em preço ou estoque inválido: "
+                    f"{', '.join(invalidos['codigo'].astype(str).head(10))}"
+                )
+            
+            if dry_run:
+                conn.rollback()
+            else:
+                conn.commit()
+        
+        if not dry_run and not diff.empty:
+            get_catalog().refresh()
+            get_report_cache().invalidate()
+        return diff
+    
+    @staticmethod
+    def ajustar_em_lote(ajustes, dry_run=False):
+        """
+        Aplica ajustes de preço e estoque a vários produtos em uma única transação
+        
+        Cada linha identifica o produto por `produto_id` ou `codigo` e pode ter:
+        `preco` (novo preço), `preco_percentual` (ex.: 10 para +10%, aplicado
+        sobre o novo preço, se informado), `estoque` (novo estoque) e
+        `estoque_delta` (somado ao estoque). Valores vazios não alteram o campo.
+        
+        Args:
+            ajustes (pd.DataFrame or list): Linhas de ajuste (ex.: planilha enviada)
+            dry_run (bool, optional): Apenas calcular a prévia, sem gravar. Defaults to False.
+            
+        Returns:
+            pd.DataFrame: Produtos alterados com preço e estoque antes e depois
         """
+        df = pd.DataFrame(ajustes)
+        df.columns = [str(c).strip().lower() for c in df.columns]
+        if "produto_id" not in df.columns and "codigo" not in df.columns:
+            raise ValueError("Informe a coluna produto_id ou codigo")
+        
+        colunas = ["produto_id", "codigo", "preco", "preco_percentual", "estoque", "estoque_delta"]
+        df = df.reindex(columns=colunas).astype(object)
+        df = df.where(df.notna(), None)
+        df["codigo"] = [str(c).strip() if c is not None else None for c in df["codigo"]]
+        linhas = df.values.tolist()
+        
+        def preencher(cur):
+            execute_values(cur, """
+            INSERT INTO ajustes_lote (produto_id, codigo, preco, preco_percentual, estoque, estoque_delta)
+            VALUES %s
+            """, linhas, template="(%s::int, %s, %s::numeric, %s::numeric, %s::numeric::int, %s::numeric::int)",
+                page_size=1000)
+        
+        return Produto._aplicar_ajustes(preencher, dry_run)
+    
+    @staticmethod
+    def ajustar_precos_categoria(categoria_id, percentual, dry_run=False):
+        """
+        Reajusta por percentual o preço de todos os produtos de uma categoria
+        
+        Args:
+            categoria_id (int): ID da categoria
+            percentual (float): Percentual de reajuste (ex.: -5 para 5% de desconto)
+            dry_run (bool, optional): Apenas calcular a prévia, sem gravar. Defaults to False.
+            
+        Returns:
+            pd.DataFrame: Produtos alterados com preço antes e depois
+        """
+        def preencher(cur):
+            cur.execute("""
+            INSERT INTO ajustes_lote (produto_id, preco_percentual)
+            SELECT id, %s FROM produtos WHERE categoria_id = %s
+            """, (percentual, categoria_id))
+        
+        return Produto._aplicar_ajustes(preencher, dry_run)
+    
+    @staticmethod
+    def _calcular_ranking(data_inicio, data_fim):
+        """Agrega as vendas do período por produto e classifica o catálogo na curva ABC"""
         query = """
-        UPDATE produtos 
-        SET estoque = estoque - %s, updated_at = CURRENT_TIMESTAMP
-        WHERE id = %s
+        SELECT p.id, p.codigo, p.nome, COALESCE(c.nome, 'Sem categoria'),
+               COALESCE(r.quantidade, 0), COALESCE(r.receita_centavos, 0), COALESCE(r.vendas, 0)
+        FROM produtos p
+        LEFT JOIN categorias c ON p.categoria_id = c.id
+        LEFT JOIN (
+            SELECT produto_id, sum(quantidade) AS quantidade,
+                   (sum(receita) * 100)::bigint AS receita_centavos, sum(vendas) AS vendas
+            FROM produto_vendas_diarias
+            WHERE dia >= %s AND dia <= %s
+            GROUP BY produto_id
+        ) r ON r.produto_id = p.id
         """
-        params = (quantidade, produto_id)
-        execute_query(query, params)
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(query, (data_inicio, data_fim))
+                rows = cur.fetchall()
+        
+        n = len(rows)
+        ids, codigos, nomes, categorias, quantidades, receitas, vendas = zip(*rows) if rows else ((),) * 7
+        ids = np.fromiter(ids, dtype=np.int32, count=n)
+        receita = np.fromiter(receitas, dtype=np.int64, count=n)
+        
+        # Maior receita primeiro (empate pelo ID); a participação acumulada antes
+        # de cada produto decide a classe, de forma que o produto que cruza o limite
+        # ainda entra na classe anterior
+        ordem = np.lexsort((ids, -receita))
+        receita = receita[ordem]
+        acumulado = np.cumsum(receita)
+        total = int(acumulado[-1]) if n else 0
+        if total:
+            participacao = receita / total
+            anterior = (acumulado - receita) / total
+        else:
+            participacao = np.zeros(n)
+            anterior = np.ones(n)
+        
+        limite_a, limite_b = REPORT_CONFIG["abc_limits"]
+        classe = np.where(anterior < limite_a, "A", np.where(anterior < limite_b, "B", "C"))
+        
+        return pd.DataFrame({
+            "produto_id": ids[ordem],
+            "codigo": np.array(codigos, dtype=object)[ordem],
+            "nome": np.array(nomes, dtype=object)[ordem],
+            "categoria_nome": np.array(categorias, dtype=object)[ordem],
+            "quantidade": np.fromiter(quantidades, dtype=np.int64, count=n)[ordem],
+            "vendas": np.fromiter(vendas, dtype=np.int64, count=n)[ordem],
+            "receita": receita / 100,
+            "participacao": participacao * 100,
+            "participacao_acumulada": (acumulado / total * 100) if total else np.zeros(n),
+            "classe": classe,
+        })
+    
+    @staticmethod
+    def ranking_vendas(data_inicio, data_fim):
+        """
+        Retorna o desempenho de vendas de cada produto do catálogo no período, com a curva ABC
+        
+        Uma única consulta agrega `produto_vendas_diarias` por produto (o custo
+        depende de dias x produtos vendidos, não da quantidade de itens); a
+        ordenação, as somas acumuladas e as classes são calculadas com NumPy.
+        Produtos sem vendas no período entram com zero, na classe C. O
+        resultado fica no cache de relatórios, por período, até a próxima
+        alteração dos dados.
+        
+        Args:
+            data_inicio (date): Primeiro dia
+            data_fim (date): Último dia
+            
+        Returns:
+            pd.DataFrame: Um produto por linha, da maior para a menor receita, com
+                produto_id, codigo, nome, categoria_nome, quantidade, vendas,
+                receita (reais), participacao e participacao_acumulada (% da
+                receita) e classe ("A", "B" ou "C")
+        """
+        return get_report_cache().get("ranking_vendas", Produto._calcular_ranking, data_inicio, data_fim)
 
 
 class Venda:
     """Classe para operações com vendas"""
     
     @staticmethod
-    def registrar(items, total, forma_pagamento, observacoes=""):
+    def _gravar_no_cursor(cur, venda_id, items, total, forma_pagamento, observacoes="", data_venda=None):
+        """
+        Grava uma venda na transação do cursor, reservando o estoque
+        
+        A gravação é idempotente: se a venda já existir, nada é alterado.
+        
+        Args:
+            cur: Cursor da transação
+            venda_id (str): ID da venda
+            items (list): Itens com `produto_id`, `quantidade` e `preco_unitario`
+            total (float): Valor total da venda
+            forma_pagamento (str): Forma de pagamento
+            observacoes (str, optional): Observações. Defaults to "".
+            data_venda (datetime or str, optional): Momento da venda, de preferência com fuso horário
+                (convertido para o fuso da sessão do banco); None usa o do banco. Defaults to None.
+            
+        Returns:
+            dict: (estoque, versão da linha) resultantes por ID do produto ou None
+                se a venda já existia
+            
+        Raises:
+            EstoqueInsuficienteError: Algum produto não tem estoque para a venda
+        """
+        # Somar as quantidades por produto (linhas repetidas)
+        baixas = {}
+        for item in items:
+            produto_id = int(item['produto_id'])
+            baixas[produto_id] = baixas.get(produto_id, 0) + int(item['quantidade'])
+        
+        # Inserir registro de venda (reenvio da mesma venda não duplica)
+        cur.execute("""
+        INSERT INTO vendas (venda_id, data_venda, total, forma_pagamento, observacoes) 
+        VALUES (%s, COALESCE(%s::timestamptz, CURRENT_TIMESTAMP), %s, %s, %s)
+        ON CONFLICT (venda_id) DO NOTHING
+        RETURNING data_venda::date
+        """, (venda_id, data_venda, total, forma_pagamento, observacoes))
+        inserida = cur.fetchone()
+        if inserida is None:
+            return None
+        
+        # Reservar o estoque antes de gravar os itens
+        niveis = _reservar_estoque(cur, baixas)
+        
+        # Inserir todos os itens da venda em um único INSERT
+        itens = []
+        for item in items:
+            quantidade = int(item['quantidade'])
+            preco_unitario = Decimal(str(item['preco_unitario']))
+            itens.append((venda_id, int(item['produto_id']), quantidade, preco_unitario, quantidade * preco_unitario))
+        
+        execute_values(cur, """
+        INSERT INTO venda_itens (venda_id, produto_id, quantidade, preco_unitario, subtotal) 
+        VALUES %s
+        """, itens, page_size=len(itens) or 1)
+        
+        _acumular_totais_diarios(cur, inserida[0], forma_pagamento, total, itens)
+        return niveis
+    
+    @staticmethod
+    def _enviar_lote(entradas):
+        """
+        Grava no banco um lote de vendas do diário local, em uma única transação
+        
+        Cada venda fica em um savepoint próprio: uma venda recusada (estoque
+        insuficiente, dados inválidos ou qualquer erro do banco nessa venda)
+        não impede a gravação das demais, e o estoque descontado dela no
+        catálogo em memória é devolvido. Falhas de conexão propagam e o lote
+        inteiro é reenviado depois.
+        
+        Args:
+            entradas (list): Pares (venda_id, dados da venda)
+            
+        Returns:
+            dict: Motivo da recusa por ID da venda
+        """
+        recusadas = {}
+        devolucoes = {}
+        with connection() as conn:
+            with conn.cursor() as cur:
+                for venda_id, dados in entradas:
+                    cur.execute("SAVEPOINT venda")
+                    try:
+                        Venda._gravar_no_cursor(
+                            cur, venda_id, dados['items'], dados['total'], dados['forma_pagamento'],
+                            dados.get('observacoes', ""), dados.get('data_venda')
+                        )
+                    except (EstoqueInsuficienteError, psycopg2.Error, KeyError, ValueError, TypeError,
+                            InvalidOperation) as e:
+                        # Conexão perdida não é culpa da venda: o lote inteiro é reenviado
+                        if conn.closed or isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+                            raise
+                        cur.execute("ROLLBACK TO SAVEPOINT venda")
+                        recusadas[venda_id] = str(e) or type(e).__name__
+                        for produto_id, quantidade in Venda._baixas_do_diario(dados).items():
+                            devolucoes[produto_id] = devolucoes.get(produto_id, 0) - quantidade
+                    cur.execute("RELEASE SAVEPOINT venda")
+            conn.commit()
+        
+        # O estoque em memória foi descontado quando a venda entrou no diário
+        if devolucoes:
+            get_catalog().apply_stock_changes(devolucoes)
+        get_report_cache().invalidate()
+        return recusadas
+    
+    @staticmethod
+    def _baixas_do_diario(dados):
+        """Quantidade descontada por produto de uma venda do diário, ignorando itens inválidos"""
+        baixas = {}
+        for item in dados.get('items') or []:
+            try:
+                produto_id = int(item['produto_id'])
+                quantidade = int(item['quantidade'])
+            except (KeyError, ValueError, TypeError):
+                continue
+            baixas[produto_id] = baixas.get(produto_id, 0) + quantidade
+        return baixas
+    
+    @staticmethod
+    def _verificar_estoque_local(baixas):
+        """Confere a venda contra o estoque em memória, sem acessar o banco de dados"""
+        catalog = get_catalog()
+        faltas = []
+        for produto_id, quantidade in sorted(baixas.items()):
+            record = catalog.peek(produto_id)
+            if record is not None and record.estoque < quantidade:
+                faltas.append({
+                    "produto_id": produto_id,
+                    "nome": record.nome,
+                    "solicitado": quantidade,
+                    "disponivel": record.estoque,
+                })
+        if faltas:
+            raise EstoqueInsuficienteError(faltas)
+    
+    @staticmethod
+    def novo_id():
+        """
+        Gera o ID de uma nova venda, criado quando o carrinho é aberto
+        
+        Returns:
+            str: ID único da venda (UUIDv7, ordenado no tempo)
+        """
+        return str(uuid7())
+    
+    @staticmethod
+    def registrar(items, total, forma_pagamento, observacoes="", venda_id=None):
         """
         Registra uma nova venda
         
+        Com o diário local habilitado (`JOURNAL_CONFIG`), a venda é gravada
+        em disco e confirmada na hora, conferida contra o estoque em memória;
+        o envio ao banco acontece em segundo plano. Sem o diário, a venda é
+        gravada diretamente no banco, em um commit compartilhado com vendas
+        simultâneas se `GROUP_COMMIT_CONFIG` estiver habilitado.
+        
+        O registro é idempotente pelo ID da venda: repetir a chamada com o
+        mesmo `venda_id` (nova tentativa, clique duplo) retorna o mesmo ID
+        sem gravar a venda nem baixar o estoque outra vez.
+        
         Args:
             items (list): Lista de itens da venda
             total (float): Valor total da venda
             forma_pagamento (str): Forma de pagamento
             observacoes (str, optional): Observações. Defaults to "".
+            venda_id (str, optional): ID gerado por `novo_id` ao abrir o carrinho;
+                None gera um novo. Defaults to None.
             
         Returns:
             str: ID da venda criada ou None em caso de erro
+            
+        Raises:
+            EstoqueInsuficienteError: Algum produto não tem estoque para a venda;
+                nada é gravado
         """
-        conn = None
-        cur = None
         try:
-            from database import get_db_connection
-            conn = get_db_connection()
-            cur = conn.cursor()
-            
-            # Gerar ID único para a venda
-            venda_id = str(uuid.uuid4())
+            if venda_id is None:
+                venda_id = Venda.novo_id()
             
-            # Inserir registro de venda
-            cur.execute("""
-            INSERT INTO vendas (venda_id, total, forma_pagamento, observacoes) 
-            VALUES (%s, %s, %s, %s) RETURNING id
-            """, (venda_id, total, forma_pagamento, observacoes))
-            
-            # Inserir itens da venda
-            for item in items:
-                produto_id = item['produto_id']
-                quantidade = item['quantidade']
-                preco_unitario = item['preco_unitario']
-                subtotal = quantidade * preco_unitario
+            journal = _get_sale_journal()
+            if journal is not None:
+                if journal.contains(venda_id):
+                    return venda_id
                 
-                cur.execute("""
-                INSERT INTO venda_itens (venda_id, produto_id, quantidade, preco_unitario, subtotal) 
-                VALUES (%s, %s, %s, %s, %s)
-                """, (venda_id, produto_id, quantidade, preco_unitario, subtotal))
+                baixas = {}
+                for item in items:
+                    produto_id = int(item['produto_id'])
+                    baixas[produto_id] = baixas.get(produto_id, 0) + int(item['quantidade'])
+                Venda._verificar_estoque_local(baixas)
                 
-                # Atualizar estoque
-                cur.execute("""
-                UPDATE produtos SET estoque = estoque - %s WHERE id = %s
-                """, (quantidade, produto_id))
+                gravada = journal.append(venda_id, {
+                    "items": [
+                        {
+                            "produto_id": int(item['produto_id']),
+                            "quantidade": int(item['quantidade']),
+                            "preco_unitario": item['preco_unitario'],
+                        }
+                        for item in items
+                    ],
+                    "total": total,
+                    "forma_pagamento": forma_pagamento,
+                    "observacoes": observacoes,
+                    # Em UTC com fuso explícito: o banco converte para o fuso da sessão
+                    "data_venda": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                })
+                if not gravada:
+                    return venda_id
+                # Baixa provisória até a venda chegar ao banco
+                get_catalog().apply_stock_changes(baixas)
+            else:
+                coordenador = get_group_commit()
+                if coordenador is not None:
+                    # Vendas simultâneas de vários caixas compartilham um commit
+                    niveis = coordenador.submit(
+                        lambda cur: Venda._gravar_no_cursor(cur, venda_id, items, total, forma_pagamento, observacoes)
+                    )
+                else:
+                    with connection() as conn:
+                        with conn.cursor() as cur:
+                            niveis = Venda._gravar_no_cursor(cur, venda_id, items, total, forma_pagamento, observacoes)
+                        conn.commit()
+                if niveis is None:
+                    return venda_id
+                # Estoque confirmado pelo banco, sem descontar de novo o que o listener já trouxe
+                get_catalog().apply_stock_levels(niveis)
             
-            conn.commit()
+            get_report_cache().invalidate()
             return venda_id
-        except Exception as e:
-            if conn:
-                conn.rollback()
+        except EstoqueInsuficienteError:
+            raise
+        except Exception:
             return None
-        finally:
-            if cur:
-                cur.close()
-            if conn:
-                conn.close()
     
     @staticmethod
-    def get_all(data_inicio=None, data_fim=None):
+    def status_sincronizacao():
         """
-        Retorna todas as vendas
+        Retorna a situação do envio das vendas do diário local
         
-        Args:
-            data_inicio (datetime, optional): Data inicial para filtro. Defaults to None.
-            data_fim (datetime, optional): Data final para filtro. Defaults to None.
-            
         Returns:
-            pd.DataFrame: DataFrame com todas as vendas
+            dict: Vendas pendentes, enviadas e recusadas, último erro e a lista
+                das recusadas (ou None se o diário estiver desabilitado)
+        """
+        journal = _get_sale_journal()
+        if journal is None:
+            return None
+        status = journal.stats()
+        status["recusadas"] = journal.failed()
+        return status
+    
+    @staticmethod
+    def reenviar(venda_id):
+        """
+        Devolve ao envio uma venda recusada do diário local (ex.: após repor o estoque)
+        
+        A recusa devolveu ao catálogo em memória o estoque da venda; a baixa
+        provisória é refeita antes de a venda voltar à fila.
+        
+        Args:
+            venda_id (str): ID da venda
+        """
+        journal = _get_sale_journal()
+        if journal is None:
+            return
+        baixas = next(
+            (Venda._baixas_do_diario(venda["dados"]) for venda in journal.failed() if venda["venda_id"] == venda_id),
+            None
+        )
+        if baixas is None:
+            return
+        
+        catalog = get_catalog()
+        catalog.apply_stock_changes(baixas)
+        if not journal.retry(venda_id):
+            # Já reenviada ou descartada por outra sessão
+            catalog.apply_stock_changes({produto_id: -quantidade for produto_id, quantidade in baixas.items()})
+    
+    @staticmethod
+    def descartar(venda_id):
+        """
+        Remove do diário local uma venda recusada que não será mais enviada
+        
+        Args:
+            venda_id (str): ID da venda
         """
-        query = "SELECT * FROM vendas WHERE 1=1"
+        journal = _get_sale_journal()
+        if journal is not None:
+            journal.discard(venda_id)
+    
+    @staticmethod
+    def _filtro_periodo(data_inicio=None, data_fim=None):
+        """Monta a cláusula WHERE de vendas filtrada por período"""
+        where = " WHERE 1=1"
         params = []
         
         if data_inicio:
-            query += " AND data_venda >= %s"
+            where += " AND data_venda >= %s"
             params.append(data_inicio)
         
         if data_fim:
-            query += " AND data_venda <= %s"
+            where += " AND data_venda <= %s"
             params.append(data_fim)
         
-        query += " ORDER BY data_venda DESC"
+        return where, params
+    
+    @staticmethod
+    def _query_periodo(data_inicio=None, data_fim=None):
+        """Monta a consulta de vendas filtrada por período"""
+        where, params = Venda._filtro_periodo(data_inicio, data_fim)
+        return "SELECT * FROM vendas" + where + " ORDER BY data_venda DESC", params
+    
+    @staticmethod
+    def resumo(data_inicio=None, data_fim=None, granularity="day"):
+        """
+        Retorna os totais de vendas do período agregados no banco de dados
+        
+        Uma única consulta com GROUPING SETS calcula o total geral, os totais
+        por período e por forma de pagamento; apenas as linhas agregadas são
+        transferidas, qualquer que seja a quantidade de vendas. Períodos de
+        dias inteiros são lidos de `vendas_diarias`.
+        
+        Args:
+            data_inicio (datetime, optional): Data inicial para filtro. Defaults to None.
+            data_fim (datetime, optional): Data final para filtro. Defaults to None.
+            granularity (str, optional): Agrupamento no tempo: "hour", "day",
+                "week" ou "month". Defaults to "day".
+            
+        Returns:
+            dict: `quantidade` e `total` do período, `por_periodo` (DataFrame com
+                periodo, quantidade, total) e `por_pagamento` (DataFrame com
+                forma_pagamento, quantidade, total)
+        
+        Raises:
+            ValueError: Granularidade desconhecida
+        """
+        if granularity not in GRANULARIDADES_RESUMO:
+            raise ValueError(f"Granularidade inválida: {granularity}")
+        
+        # Períodos de dias inteiros são lidos dos totais diários, sem percorrer as vendas
+        dias_inteiros = (
+            granularity != "hour"
+            and (data_inicio is None or data_inicio.time() == datetime.time.min)
+            and (data_fim is None or data_fim.time() == datetime.time.max)
+        )
+        if dias_inteiros:
+            where = " WHERE true"
+            params = []
+            if data_inicio is not None:
+                where += " AND dia >= %s"
+                params.append(data_inicio.date())
+            if data_fim is not None:
+                where += " AND dia <= %s"
+                params.append(data_fim.date())
+            tabela, periodo, quantidade, total = "vendas_diarias", "dia::timestamp", "sum(vendas)", "sum(receita)"
+        else:
+            where, params = Venda._filtro_periodo(data_inicio, data_fim)
+            tabela, periodo, quantidade, total = "vendas", "data_venda", "count(*)", "sum(total)"
+        
+        # O agrupamento vai literal na consulta para que a expressão do SELECT e a do GROUP BY coincidam
+        periodo = f"date_trunc('{granularity}', {periodo})"
+        query = f"""
+        SELECT GROUPING({periodo}) AS sem_periodo,
+               GROUPING(forma_pagamento) AS sem_pagamento,
+               {periodo} AS periodo,
+               forma_pagamento,
+               COALESCE({quantidade}, 0) AS quantidade,
+               COALESCE({total}, 0) AS total
+        FROM {tabela}{where}
+        GROUP BY GROUPING SETS ((), ({periodo}), (forma_pagamento))
+        """
+        df = query_to_dataframe(query, params)
         
+        geral = df[(df["sem_periodo"] == 1) & (df["sem_pagamento"] == 1)].iloc[0]
+        por_periodo = df[df["sem_periodo"] == 0].sort_values("periodo")
+        por_pagamento = df[df["sem_pagamento"] == 0].sort_values("total", ascending=False)
+        
+        return {
+            "quantidade": int(geral["quantidade"]),
+            "total": Decimal(str(geral["total"])),
+            "por_periodo": por_periodo[["periodo", "quantidade", "total"]].reset_index(drop=True),
+            "por_pagamento": por_pagamento[["forma_pagamento", "quantidade", "total"]].reset_index(drop=True),
+        }
+    
+    @staticmethod
+    def reconstruir_totais_diarios(data_inicio=None, data_fim=None):
+        """
+        Recalcula os totais diários a partir das vendas gravadas
+        
+        Os dias do intervalo são apagados e recalculados em uma transação.
+        As tabelas de totais ficam bloqueadas para escrita durante o cálculo:
+        vendas registradas ao mesmo tempo esperam e são somadas depois, sem
+        contagem em dobro.
+        
+        Args:
+            data_inicio (date, optional): Primeiro dia; None desde o início. Defaults to None.
+            data_fim (date, optional): Último dia; None até hoje. Defaults to None.
+            
+        Returns:
+            dict: Linhas gravadas em `vendas_diarias` e `produto_vendas_diarias`
+        """
+        filtro_dia = " AND dia >= %(inicio)s" if data_inicio else ""
+        filtro_dia += " AND dia <= %(fim)s" if data_fim else ""
+        filtro_venda = " AND v.data_venda >= %(inicio)s" if data_inicio else ""
+        filtro_venda += " AND v.data_venda < %(fim)s::date + 1" if data_fim else ""
+        params = {"inicio": data_inicio, "fim": data_fim}
+        
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("LOCK TABLE vendas_diarias, produto_vendas_diarias IN EXCLUSIVE MODE")
+                cur.execute("DELETE FROM vendas_diarias WHERE true" + filtro_dia, params)
+                cur.execute("DELETE FROM produto_vendas_diarias WHERE true" + filtro_dia, params)
+                
+                cur.execute("""
+                INSERT INTO vendas_diarias (dia, forma_pagamento, vendas, itens, receita)
+                SELECT v.data_venda::date, COALESCE(v.forma_pagamento, ''), count(*),
+                       COALESCE(sum(i.itens), 0), sum(v.total)
+                FROM vendas v
+                LEFT JOIN (
+                    SELECT venda_id, sum(quantidade) AS itens FROM venda_itens GROUP BY venda_id
+                ) i ON i.venda_id = v.venda_id
+                WHERE true""" + filtro_venda + """
+                GROUP BY 1, 2
+                """, params)
+                vendas_diarias = cur.rowcount
+                
+                cur.execute("""
+                INSERT INTO produto_vendas_diarias (dia, produto_id, vendas, quantidade, receita)
+                SELECT v.data_venda::date, vi.produto_id, count(DISTINCT v.venda_id),
+                       sum(vi.quantidade), sum(vi.subtotal)
+                FROM venda_itens vi
+                JOIN vendas v ON v.venda_id = vi.venda_id
+                WHERE true""" + filtro_venda + """
+                GROUP BY 1, 2
+                """, params)
+                produto_vendas_diarias = cur.rowcount
+            conn.commit()
+        get_report_cache().invalidate()
+        
+        return {"vendas_diarias": vendas_diarias, "produto_vendas_diarias": produto_vendas_diarias}
+    
+    @staticmethod
+    def get_page(data_inicio=None, data_fim=None, limit=50, offset=0):
+        """
+        Retorna uma página das vendas do período, da mais recente para a mais antiga
+        
+        Args:
+            data_inicio (datetime, optional): Data inicial para filtro. Defaults to None.
+            data_fim (datetime, optional): Data final para filtro. Defaults to None.
+            limit (int, optional): Quantidade máxima de vendas. Defaults to 50.
+            offset (int, optional): Quantidade de vendas a pular. Defaults to 0.
+            
+        Returns:
+            pd.DataFrame: Página de vendas
+        """
+        where, params = Venda._filtro_periodo(data_inicio, data_fim)
+        query = "SELECT * FROM vendas" + where + " ORDER BY data_venda DESC, id DESC LIMIT %s OFFSET %s"
+        return query_to_dataframe(query, params + [limit, offset])
+    
+    @staticmethod
+    def get_all(data_inicio=None, data_fim=None):
+        """
+        Retorna todas as vendas
+        
+        Args:
+            data_inicio (datetime, optional): Data inicial para filtro. Defaults to None.
+            data_fim (datetime, optional): Data final para filtro. Defaults to None.
+            
+        Returns:
+            pd.DataFrame: DataFrame com todas as vendas
+        """
+        query, params = Venda._query_periodo(data_inicio, data_fim)
         return query_to_dataframe(query, params)
     
+    @staticmethod
+    def iter_all(data_inicio=None, data_fim=None, chunk_size=5000):
+        """
+        Percorre as vendas do período em blocos, com memória limitada
+        
+        Args:
+            data_inicio (datetime, optional): Data inicial para filtro. Defaults to None.
+            data_fim (datetime, optional): Data final para filtro. Defaults to None.
+            chunk_size (int, optional): Vendas por bloco. Defaults to 5000.
+            
+        Yields:
+            pd.DataFrame: Bloco de vendas
+        """
+        query, params = Venda._query_periodo(data_inicio, data_fim)
+        return stream_query(query, params, chunk_size=chunk_size)
+    
+    @staticmethod
+    def get_by_id(venda_id):
+        """
+        Retorna uma venda pelo ID
+        
+        Args:
+            venda_id (str): ID da venda
+            
+        Returns:
+            pd.Series: Venda encontrada ou None
+        """
+        df = query_to_dataframe("SELECT * FROM vendas WHERE venda_id = %s", [venda_id])
+        return df.iloc[0] if not df.empty else None
+    
     @staticmethod
     def get_detalhes(venda_id):
         """
@@ -319,4 +1596,182 @@ class Venda:
         JOIN produtos p ON vi.produto_id = p.id
         WHERE vi.venda_id = %s
         """
-        return query_to_dataframe(query, [venda_id])
\ No newline at end of file
+        return query_to_dataframe(query, [venda_id])
+
+
+class CartLine:
+    """Linha do carrinho: um produto, com preço em centavos"""
+    
+    __slots__ = ("produto_id", "nome", "preco_centavos", "quantidade")
+    
+    def __init__(self, produto_id, nome, preco_centavos, quantidade):
+        self.produto_id = produto_id
+        self.nome = nome
+        self.preco_centavos = preco_centavos
+        self.quantidade = quantidade
+    
+    @property
+    def subtotal_centavos(self):
+        return self.preco_centavos * self.quantidade
+
+
+class Cart:
+    """
+    Carrinho de compras do PDV
+    
+    As linhas ficam em um dict indexado pelo ID do produto, na ordem em que
+    foram incluídas: ler o mesmo produto duas vezes soma a quantidade na
+    linha existente, sem mudar sua posição. O total é
+    mantido em centavos inteiros e atualizado apenas pela diferença de
+    cada alteração. O ID da venda é gerado quando o carrinho é aberto.
+    """
+    
+    def __init__(self, venda_id=None):
+        """
+        Args:
+            venda_id (str, optional): ID da venda; None gera um novo. Defaults to None.
+        """
+        self.venda_id = venda_id or Venda.novo_id()
+        self.total_centavos = 0
+        self.versao = 0
+        self._linhas = OrderedDict()
+    
+    @staticmethod
+    def _centavos(preco):
+        return int((Decimal(str(preco)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+    
+    def __len__(self):
+        return len(self._linhas)
+    
+    def __iter__(self):
+        return iter(self._linhas.values())
+    
+    def __contains__(self, produto_id):
+        return int(produto_id) in self._linhas
+    
+    @property
+    def total(self):
+        """Decimal: Total do carrinho em reais"""
+        return Decimal(self.total_centavos).scaleb(-2)
+    
+    def add(self, produto_id, nome, preco, quantidade=1):
+        """
+        Adiciona um produto, somando à linha existente se já estiver no carrinho
+        
+        Args:
+            produto_id (int): ID do produto
+            nome (str): Nome do produto
+            preco (Decimal or float): Preço unitário
+            quantidade (int, optional): Quantidade. Defaults to 1.
+        """
+        produto_id = int(produto_id)
+        quantidade = int(quantidade)
+        linha = self._linhas.get(produto_id)
+        if linha is None:
+            linha = CartLine(produto_id, nome, self._centavos(preco), 0)
+            self._linhas[produto_id] = linha
+        linha.quantidade += quantidade
+        self.total_centavos += linha.preco_centavos * quantidade
+        self.versao += 1
+    
+    def set_quantidade(self, produto_id, quantidade):
+        """
+        Altera a quantidade de um produto; zero ou menos remove a linha
+        
+        Args:
+            produto_id (int): ID do produto
+            quantidade (int): Nova quantidade
+        """
+        linha = self._linhas.get(int(produto_id))
+        if linha is None:
+            return
+        quantidade = int(quantidade)
+        if quantidade <= 0:
+            self.remove(produto_id)
+            return
+        self.total_centavos += linha.preco_centavos * (quantidade - linha.quantidade)
+        linha.quantidade = quantidade
+        self.versao += 1
+    
+    def remove(self, produto_id):
+        """
+        Remove um produto do carrinho
+        
+        Args:
+            produto_id (int): ID do produto
+        """
+        linha = self._linhas.pop(int(produto_id), None)
+        if linha is not None:
+            self.total_centavos -= linha.subtotal_centavos
+            self.versao += 1
+    
+    def clear(self):
+        """Esvazia o carrinho, mantendo o ID da venda"""
+        self._linhas.clear()
+        self.total_centavos = 0
+        self.versao += 1
+    
+    def aplicar_edicoes(self, edicoes):
+        """
+        Aplica as alterações feitas em `st.data_editor` sobre `to_dataframe()`
+        
+        Apenas as linhas editadas ou excluídas são tocadas; as posições se
+        referem à ordem das linhas no momento em que a tabela foi exibida.
+        
+        Args:
+            edicoes (dict): Estado do editor, com `edited_rows` e `deleted_rows`
+        """
+        ids = list(self._linhas)
+        for posicao, campos in edicoes.get("edited_rows", {}).items():
+            if "quantidade" in campos and campos["quantidade"] is not None:
+                self.set_quantidade(ids[int(posicao)], campos["quantidade"])
+        for posicao in edicoes.get("deleted_rows", []):
+            self.remove(ids[int(posicao)])
+    
+    def items(self):
+        """
+        Retorna as linhas no formato esperado por `Venda.registrar`
+        
+        Returns:
+            list: Um dict por produto com `produto_id`, `quantidade` e `preco_unitario`
+        """
+        return [
+            {
+                "produto_id": linha.produto_id,
+                "quantidade": linha.quantidade,
+                "preco_unitario": Decimal(linha.preco_centavos).scaleb(-2),
+            }
+            for linha in self._linhas.values()
+        ]
+    
+    def to_dataframe(self):
+        """
+        Retorna as linhas do carrinho para exibição
+        
+        Returns:
+            pd.DataFrame: Produto, preço unitário, quantidade e subtotal por linha
+        """
+        return pd.DataFrame(
+            [
+                (linha.produto_id, linha.nome, linha.preco_centavos / 100,
+                 linha.quantidade, linha.subtotal_centavos / 100)
+                for linha in self._linhas.values()
+            ],
+            columns=["produto_id", "nome", "preco_unitario", "quantidade", "subtotal"]
+        )
+    
+    def registrar(self, forma_pagamento, observacoes=""):
+        """
+        Registra a venda do carrinho, com o ID gerado na abertura
+        
+        Args:
+            forma_pagamento (str): Forma de pagamento
+            observacoes (str, optional): Observações. Defaults to "".
+            
+        Returns:
+            str: ID da venda ou None em caso de erro
+            
+        Raises:
+            EstoqueInsuficienteError: Algum produto não tem estoque para a venda
+        """
+        return Venda.registrar(self.items(), self.total, forma_pagamento, observacoes, venda_id=self.venda_id)
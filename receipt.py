@@ -0,0 +1,289 @@
+"""
+Geração de recibos de venda em HTML e para impressoras térmicas (ESC/POS)
+"""
+
+import os
+import html
+import datetime
+import functools
+from decimal import Decimal, ROUND_HALF_UP
+
+from config import RECEIPT_CONFIG
+
+
+def _centavos(valor):
+    return int((Decimal(str(valor)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+def _reais(centavos):
+    return "%d.%02d" % divmod(centavos, 100)
+
+# Nomes de produtos se repetem entre recibos: o escape de cada um é feito uma vez
+_escape = functools.lru_cache(maxsize=4096)(html.escape)
+
+
+class Receipt:
+    """
+    Dados de um recibo, com valores em centavos
+    
+    Attributes:
+        linhas (list): Tuplas (nome, código, quantidade, preço unitário em centavos)
+    """
+    
+    __slots__ = ("venda_id", "data", "forma_pagamento", "cliente", "linhas", "total_centavos")
+    
+    def __init__(self, venda_id, linhas, forma_pagamento, cliente=None, data=None, total=None):
+        """
+        Args:
+            venda_id (str): ID da venda
+            linhas (iterable): Tuplas (nome, código, quantidade, preço unitário)
+            forma_pagamento (str): Forma de pagamento
+            cliente (str, optional): Nome do cliente. Defaults to None.
+            data (datetime, optional): Momento da venda; None usa o atual. Defaults to None.
+            total (Decimal, optional): Total da venda; None soma as linhas. Defaults to None.
+        """
+        self.venda_id = venda_id
+        self.linhas = [(nome, codigo, int(qtd), _centavos(preco)) for nome, codigo, qtd, preco in linhas]
+        self.forma_pagamento = forma_pagamento
+        self.cliente = cliente
+        self.data = data or datetime.datetime.now()
+        self.total_centavos = (
+            _centavos(total) if total is not None
+            else sum(qtd * preco for _, _, qtd, preco in self.linhas)
+        )
+    
+    @classmethod
+    def from_cart(cls, cart, forma_pagamento, cliente=None):
+        """
+        Monta o recibo de um carrinho do PDV
+        
+        Args:
+            cart (Cart): Carrinho da venda
+            forma_pagamento (str): Forma de pagamento
+            cliente (str, optional): Nome do cliente. Defaults to None.
+        
+        Returns:
+            Receipt: Recibo da venda do carrinho
+        """
+        recibo = cls(cart.venda_id, [], forma_pagamento, cliente)
+        recibo.linhas = [(l.nome, "", l.quantidade, l.preco_centavos) for l in cart]
+        recibo.total_centavos = cart.total_centavos
+        return recibo
+    
+    @classmethod
+    def from_sale(cls, venda_id):
+        """
+        Monta o recibo de uma venda já gravada no banco, para reimpressão
+        
+        Vendas não mudam depois de gravadas; os recibos lidos ficam em cache.
+        
+        Args:
+            venda_id (str): ID da venda
+        
+        Returns:
+            Receipt: Recibo da venda ou None se a venda não existir
+        """
+        try:
+            return _receipt_from_sale(venda_id)
+        except KeyError:
+            return None
+
+
+@functools.lru_cache(maxsize=256)
+def _receipt_from_sale(venda_id):
+    # Importação tardia: os apps independentes usam este módulo sem o banco do PDV
+    from models import Venda
+    
+    venda = Venda.get_by_id(venda_id)
+    if venda is None:
+        # Exceção em vez de None para que vendas ainda não gravadas não fiquem em cache
+        raise KeyError(venda_id)
+    itens = Venda.get_detalhes(venda_id)
+    return Receipt(
+        venda_id,
+        zip(itens["produto_nome"], itens["produto_codigo"], itens["quantidade"], itens["preco_unitario"]),
+        venda["forma_pagamento"],
+        data=venda["data_venda"],
+        total=venda["total"]
+    )
+
+
+# Modelos compilados uma única vez; cada recibo só preenche os campos
+_HTML_INICIO = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<title>Recibo #{venda_id}</title>
+<style>
+body {{ font-family: Arial; margin: 0; padding: 20px; }}
+.receipt {{ max-width: 800px; margin: 0 auto; border: 1px solid #ddd; padding: 20px; }}
+.header {{ text-align: center; margin-bottom: 20px; border-bottom: 2px solid #333; }}
+table {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}
+th, td {{ border: 1px solid #ddd; padding: 10px; text-align: left; }}
+.total {{ text-align: right; font-weight: bold; margin-top: 20px; }}
+.footer {{ text-align: center; margin-top: 30px; font-size: 12px; color: #777; }}
+</style>
+</head>
+<body>
+<div class="receipt">
+<div class="header">
+<h1>{loja}</h1>
+<h2>Recibo de Venda #{venda_id}</h2>
+<p>Data: {data}</p>
+<p>Cliente: {cliente}</p>
+<p>Forma de Pagamento: {forma_pagamento}</p>
+</div>
+<table>
+<thead>
+<tr><th>Produto</th><th>Código</th><th>Qtde</th><th>Preço Unit.</th><th>Subtotal</th></tr>
+</thead>
+<tbody>
+""".format
+_HTML_LINHA = "<tr><td>%s</td><td>%s</td><td>%d</td><td>R$ %d.%02d</td><td>R$ %d.%02d</td></tr>\n"
+_HTML_FIM = """</tbody>
+</table>
+<div class="total"><p>Total: R$ {total}</p></div>
+<div class="footer">
+<p>{rodape}</p>
+<p>{loja}</p>
+</div>
+</div>
+</body>
+</html>
+""".format
+
+def render_html(recibo, loja=None, rodape=None):
+    """
+    Gera o recibo em HTML
+    
+    Args:
+        recibo (Receipt): Dados do recibo
+        loja (str, optional): Nome no cabeçalho; None usa `RECEIPT_CONFIG`. Defaults to None.
+        rodape (str, optional): Mensagem do rodapé; None usa `RECEIPT_CONFIG`. Defaults to None.
+    
+    Returns:
+        str: Página HTML do recibo
+    """
+    escape = _escape
+    loja = escape(loja or RECEIPT_CONFIG["store_name"])
+    
+    partes = [_HTML_INICIO(
+        venda_id=escape(str(recibo.venda_id)),
+        loja=loja,
+        data=recibo.data.strftime("%d/%m/%Y %H:%M:%S"),
+        cliente=escape(recibo.cliente or "Cliente não identificado"),
+        forma_pagamento=escape(str(recibo.forma_pagamento)),
+    )]
+    partes.extend(
+        _HTML_LINHA % ((escape(str(nome)), escape(str(codigo or "N/A")), qtd)
+                       + divmod(preco, 100) + divmod(preco * qtd, 100))
+        for nome, codigo, qtd, preco in recibo.linhas
+    )
+    partes.append(_HTML_FIM(
+        total=_reais(recibo.total_centavos),
+        rodape=escape(rodape or RECEIPT_CONFIG["footer"]),
+        loja=loja,
+    ))
+    return "".join(partes)
+
+
+# Comandos ESC/POS
+_ESC_INICIAR = b"\x1b@"
+_ESC_CODEPAGE = b"\x1bt"
+_CODEPAGES = {"cp437": 0, "cp850": 2, "cp860": 3, "cp858": 19}
+_ESC_CENTRO = b"\x1ba\x01"
+_ESC_ESQUERDA = b"\x1ba\x00"
+_ESC_NEGRITO = b"\x1bE\x01"
+_ESC_NORMAL = b"\x1bE\x00"
+_ESC_ALTURA_DUPLA = b"\x1d!\x01"
+_ESC_TAMANHO_NORMAL = b"\x1d!\x00"
+_ESC_CORTAR = b"\x1dV\x42\x00"
+
+def render_escpos(recibo, colunas=None, encoding=None, loja=None, rodape=None):
+    """
+    Gera o recibo em bytes ESC/POS para impressoras térmicas
+    
+    Args:
+        recibo (Receipt): Dados do recibo
+        colunas (int, optional): Caracteres por linha; None usa `RECEIPT_CONFIG`. Defaults to None.
+        encoding (str, optional): Página de código; None usa `RECEIPT_CONFIG`. Defaults to None.
+        loja (str, optional): Nome no cabeçalho; None usa `RECEIPT_CONFIG`. Defaults to None.
+        rodape (str, optional): Mensagem do rodapé; None usa `RECEIPT_CONFIG`. Defaults to None.
+    
+    Returns:
+        bytes: Comandos prontos para enviar à impressora
+    """
+    colunas = colunas or RECEIPT_CONFIG["columns"]
+    encoding = encoding or RECEIPT_CONFIG["encoding"]
+    separador = "-" * colunas
+    
+    def codificar(*linhas):
+        return "\n".join(linhas).encode(encoding, errors="replace") + b"\n"
+    
+    partes = [
+        _ESC_INICIAR, _ESC_CODEPAGE + bytes([_CODEPAGES.get(encoding, 0)]),
+        _ESC_CENTRO, _ESC_NEGRITO, _ESC_ALTURA_DUPLA,
+        codificar(loja or RECEIPT_CONFIG["store_name"]),
+        _ESC_TAMANHO_NORMAL, _ESC_NORMAL, _ESC_ESQUERDA,
+        codificar(
+            recibo.data.strftime("%d/%m/%Y %H:%M:%S"),
+            f"Venda {recibo.venda_id}",
+            f"Pagamento: {recibo.forma_pagamento}",
+            *([f"Cliente: {recibo.cliente}"] if recibo.cliente else []),
+            separador
+        ),
+    ]
+    
+    # Nomes passam pela página de código (em cache); valores são sempre ASCII
+    for nome, _, qtd, preco in recibo.linhas:
+        valores = "%d x %d.%02d" % ((qtd,) + divmod(preco, 100))
+        subtotal = _reais(preco * qtd)
+        partes.append(_linha_escpos(str(nome)[:colunas], encoding))
+        partes.append((valores + subtotal.rjust(colunas - len(valores)) + "\n").encode("ascii"))
+    
+    total = f"TOTAL R$ {_reais(recibo.total_centavos)}"
+    partes += [
+        codificar(separador),
+        _ESC_NEGRITO, codificar(total.rjust(colunas)), _ESC_NORMAL,
+        _ESC_CENTRO, codificar("", rodape or RECEIPT_CONFIG["footer"], "", ""),
+        _ESC_CORTAR,
+    ]
+    return b"".join(partes)
+
+
+@functools.lru_cache(maxsize=4096)
+def _linha_escpos(texto, encoding):
+    return texto.encode(encoding, errors="replace") + b"\n"
+
+
+def print_escpos(recibo, destino=None):
+    """
+    Envia o recibo para a impressora térmica
+    
+    Args:
+        recibo (Receipt): Dados do recibo
+        destino (str, optional): Dispositivo da impressora ou diretório de spool;
+            None usa `RECEIPT_CONFIG["printer"]`. Defaults to None.
+    
+    Returns:
+        str: Caminho em que os bytes foram gravados
+    
+    Raises:
+        ValueError: Nenhuma impressora configurada
+    """
+    destino = destino or RECEIPT_CONFIG["printer"]
+    if not destino:
+        raise ValueError("Nenhuma impressora de recibos configurada")
+    
+    dados = render_escpos(recibo)
+    if os.path.isdir(destino):
+        # Spool: arquivo completo aparece de uma vez para quem consome o diretório
+        caminho = os.path.join(destino, f"recibo_{recibo.venda_id}.bin")
+        temporario = f"{caminho}.tmp"
+        with open(temporario, "wb") as f:
+            f.write(dados)
+        os.replace(temporario, caminho)
+        return caminho
+    
+    with open(destino, "wb") as f:
+        f.write(dados)
+    return destino
@@ -0,0 +1,294 @@
+"""
+Cópias colunares (Parquet) das vendas para análises fora do banco do caixa
+"""
+
+import os
+import shutil
+import datetime
+import threading
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from database import connection, stream_query
+from config import SNAPSHOT_CONFIG
+
+# Tabelas exportadas: consulta (a última coluna é o dia da venda) e esquema das demais colunas
+_TABELAS = {
+    "vendas": (
+        """
+        SELECT v.venda_id::text, v.data_venda, v.total, v.forma_pagamento, v.status, v.observacoes,
+               v.data_venda::date AS dia
+        FROM vendas v
+        WHERE true{filtro}
+        ORDER BY v.data_venda
+        """,
+        pa.schema([
+            ("venda_id", pa.string()),
+            ("data_venda", pa.timestamp("us")),
+            ("total", pa.decimal128(10, 2)),
+            ("forma_pagamento", pa.string()),
+            ("status", pa.string()),
+            ("observacoes", pa.string()),
+        ]),
+    ),
+    "venda_itens": (
+        """
+        SELECT vi.venda_id::text, vi.produto_id, vi.quantidade, vi.preco_unitario, vi.subtotal,
+               v.data_venda::date AS dia
+        FROM venda_itens vi
+        JOIN vendas v ON v.venda_id = vi.venda_id
+        WHERE true{filtro}
+        ORDER BY v.data_venda
+        """,
+        pa.schema([
+            ("venda_id", pa.string()),
+            ("produto_id", pa.int32()),
+            ("quantidade", pa.int32()),
+            ("preco_unitario", pa.decimal128(10, 2)),
+            ("subtotal", pa.decimal128(10, 2)),
+        ]),
+    ),
+}
+
+# Diretórios "dia=AAAA-MM-DD" viram a coluna `dia` (date) na leitura
+_PARTICIONAMENTO = ds.partitioning(pa.schema([("dia", pa.date32())]), flavor="hive")
+
+
+class SalesSnapshots:
+    """
+    Cópia das vendas em arquivos Parquet particionados por dia
+    
+    Cada tabela fica em `<diretório>/<tabela>/dia=AAAA-MM-DD/part-0.parquet`.
+    A exportação acrescenta os dias completos ainda não exportados (o último
+    dia exportado fica em `ultimo_dia.txt`) e refaz os dias já exportados que
+    receberam vendas depois, como as enviadas com atraso pelo diário local
+    (a marca d'água de transações fica em `ultimo_xid.txt`). A leitura usa
+    `pyarrow.dataset`, que abre só as partições do período e lê só as
+    colunas pedidas, sem acessar o PostgreSQL.
+    """
+    
+    def __init__(self, directory, chunk_size=50000):
+        """
+        Args:
+            directory (str): Diretório das cópias
+            chunk_size (int, optional): Registros lidos do banco por bloco. Defaults to 50000.
+        """
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+    
+    def _marcador(self, nome="ultimo_dia.txt"):
+        return os.path.join(self.directory, nome)
+    
+    def _ler_marcador(self, nome, converter):
+        try:
+            with open(self._marcador(nome)) as f:
+                return converter(f.read().strip())
+        except (OSError, ValueError):
+            return None
+    
+    def _gravar_marcador(self, nome, valor):
+        temporario = f"{self._marcador(nome)}.tmp"
+        with open(temporario, "w") as f:
+            f.write(str(valor))
+        os.replace(temporario, self._marcador(nome))
+    
+    def ultimo_dia(self):
+        """
+        Retorna o último dia exportado
+        
+        Returns:
+            datetime.date: Último dia completo exportado ou None se nada foi exportado
+        """
+        return self._ler_marcador("ultimo_dia.txt", datetime.date.fromisoformat)
+    
+    def _dias_alterados(self, xid, ultimo):
+        """Dias já exportados com vendas gravadas ou alteradas a partir da transação `xid`"""
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                SELECT DISTINCT data_venda::date
+                FROM vendas
+                WHERE alterado_xid >= %s AND data_venda < %s
+                ORDER BY 1
+                """, (xid, ultimo + datetime.timedelta(days=1)))
+                return [row[0] for row in cur.fetchall()]
+    
+    def _marca_dagua(self):
+        """Menor transação em andamento: as anteriores já estão visíveis para a exportação"""
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+                return cur.fetchone()[0]
+    
+    def _gravar_dia(self, tabela, dia, linhas):
+        """Grava (ou substitui) a partição de um dia de forma atômica"""
+        schema = _TABELAS[tabela][1]
+        colunas = list(zip(*linhas))
+        table = pa.Table.from_arrays(
+            [pa.array(valores, type=campo.type) for valores, campo in zip(colunas, schema)],
+            schema=schema
+        )
+        
+        diretorio = os.path.join(self.directory, tabela, f"dia={dia.isoformat()}")
+        os.makedirs(diretorio, exist_ok=True)
+        caminho = os.path.join(diretorio, "part-0.parquet")
+        temporario = f"{caminho}.tmp"
+        pq.write_table(table, temporario, compression="zstd")
+        os.replace(temporario, caminho)
+    
+    def _remover_dias_vazios(self, tabela, desde, ate, gravados):
+        """Apaga as partições do intervalo de dias que não têm mais vendas"""
+        caminho = os.path.join(self.directory, tabela)
+        if not os.path.isdir(caminho):
+            return
+        for nome in os.listdir(caminho):
+            if not nome.startswith("dia="):
+                continue
+            try:
+                dia = datetime.date.fromisoformat(nome[len("dia="):])
+            except ValueError:
+                continue
+            if (desde is None or dia >= desde) and dia <= ate and dia not in gravados:
+                shutil.rmtree(os.path.join(caminho, nome), ignore_errors=True)
+    
+    def _exportar_tabela(self, tabela, desde, ate):
+        """Exporta (ou refaz) os dias do intervalo de uma tabela; retorna a quantidade de registros"""
+        query, _ = _TABELAS[tabela]
+        filtro = " AND v.data_venda < %(fim)s"
+        if desde is not None:
+            filtro += " AND v.data_venda >= %(inicio)s"
+        params = {"inicio": desde, "fim": ate + datetime.timedelta(days=1)}
+        
+        total = 0
+        gravados = set()
+        dia_atual, linhas = None, []
+        for bloco in stream_query(query.format(filtro=filtro), params, chunk_size=self.chunk_size, as_dataframe=False):
+            for linha in bloco:
+                dia = linha[-1]
+                if dia != dia_atual:
+                    if linhas:
+                        self._gravar_dia(tabela, dia_atual, linhas)
+                        gravados.add(dia_atual)
+                    dia_atual, linhas = dia, []
+                linhas.append(linha[:-1])
+            total += len(bloco)
+        if linhas:
+            self._gravar_dia(tabela, dia_atual, linhas)
+            gravados.add(dia_atual)
+        
+        # Dias refeitos que ficaram sem vendas não podem manter a cópia antiga
+        self._remover_dias_vazios(tabela, desde, ate, gravados)
+        return total
+    
+    def export(self, desde=None, ate=None):
+        """
+        Acrescenta às cópias os dias completos ainda não exportados
+        
+        Dias já exportados que receberam vendas depois da exportação anterior
+        (ex.: vendas do diário local enviadas com atraso) são refeitos, e os
+        que ficaram sem vendas têm a partição apagada. Dias já exportados
+        também podem ser refeitos passando `desde`; as partições do intervalo
+        são substituídas.
+        
+        Args:
+            desde (date, optional): Primeiro dia; None continua após o último exportado. Defaults to None.
+            ate (date, optional): Último dia; None usa ontem (hoje ainda recebe vendas). Defaults to None.
+        
+        Returns:
+            dict: Intervalo exportado (`desde`, `ate`), dias anteriores refeitos
+                (`refeitos`) e registros gravados por tabela
+        """
+        ate = ate or datetime.date.today() - datetime.timedelta(days=1)
+        
+        with self._lock:
+            # Lida antes das vendas: o que for gravado durante a exportação fica para a próxima
+            marca = self._marca_dagua()
+            ultimo = self.ultimo_dia()
+            if desde is None:
+                desde = ultimo + datetime.timedelta(days=1) if ultimo else None
+            
+            # Dias já exportados, fora do intervalo atual, que mudaram desde a exportação anterior
+            xid = self._ler_marcador("ultimo_xid.txt", int)
+            refeitos = []
+            if xid is not None and ultimo is not None:
+                refeitos = [
+                    dia for dia in self._dias_alterados(xid, min(ultimo, ate))
+                    if desde is None or dia < desde
+                ]
+            
+            resultado = {"desde": desde, "ate": ate, "refeitos": refeitos}
+            resultado.update({tabela: 0 for tabela in _TABELAS})
+            for tabela in _TABELAS:
+                for dia in refeitos:
+                    resultado[tabela] += self._exportar_tabela(tabela, dia, dia)
+                if desde is None or desde <= ate:
+                    resultado[tabela] += self._exportar_tabela(tabela, desde, ate)
+            
+            # Os marcadores só avançam depois que todas as tabelas foram gravadas
+            if desde is None or desde <= ate:
+                if ultimo is None or ate > ultimo:
+                    self._gravar_marcador("ultimo_dia.txt", ate.isoformat())
+            self._gravar_marcador("ultimo_xid.txt", marca)
+        return resultado
+    
+    def read(self, tabela, colunas=None, inicio=None, fim=None, filtro=None):
+        """
+        Lê uma tabela das cópias, apenas com as partições e colunas necessárias
+        
+        Valores monetários são convertidos para float na leitura.
+        
+        Args:
+            tabela (str): "vendas" ou "venda_itens"
+            colunas (list, optional): Colunas a ler (inclusive "dia"); None lê todas. Defaults to None.
+            inicio (date, optional): Primeiro dia. Defaults to None.
+            fim (date, optional): Último dia. Defaults to None.
+            filtro (pyarrow.compute.Expression, optional): Filtro adicional aplicado
+                na leitura, ex.: `ds.field("forma_pagamento") == "PIX"`. Defaults to None.
+        
+        Returns:
+            pd.DataFrame: Registros lidos (vazio se nada foi exportado)
+        """
+        schema = _TABELAS[tabela][1].append(pa.field("dia", pa.date32()))
+        caminho = os.path.join(self.directory, tabela)
+        if not os.path.isdir(caminho):
+            table = schema.empty_table()
+            return table.select(colunas).to_pandas() if colunas else table.to_pandas()
+        
+        expressao = filtro
+        if inicio is not None:
+            condicao = ds.field("dia") >= inicio
+            expressao = condicao if expressao is None else expressao & condicao
+        if fim is not None:
+            condicao = ds.field("dia") <= fim
+            expressao = condicao if expressao is None else expressao & condicao
+        
+        dataset = ds.dataset(caminho, format="parquet", partitioning=_PARTICIONAMENTO)
+        table = dataset.to_table(columns=colunas, filter=expressao)
+        
+        for i, campo in enumerate(table.schema):
+            if pa.types.is_decimal(campo.type):
+                table = table.set_column(i, campo.name, pc.cast(table.column(i), pa.float64()))
+        return table.to_pandas()
+
+
+_snapshots = None
+_snapshots_lock = threading.Lock()
+
+def get_snapshots():
+    """
+    Retorna as cópias Parquet das vendas do processo, criando-as na primeira chamada
+    
+    Returns:
+        SalesSnapshots: Cópias compartilhadas pelo processo
+    """
+    global _snapshots
+    if _snapshots is None:
+        with _snapshots_lock:
+            if _snapshots is None:
+                _snapshots = SalesSnapshots(**SNAPSHOT_CONFIG)
+    return _snapshots
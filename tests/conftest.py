@@ -0,0 +1,118 @@
+"""
+Configuração dos testes
+
+Testes que precisam do PostgreSQL usam a fixture `db` e só rodam com a
+variável PDV_TEST_DATABASE definida (DSN do libpq, ex.:
+"host=127.0.0.1 dbname=pdv_teste user=postgres"); sem ela são ignorados,
+para nunca gravar no banco configurado em `config.DB_CONFIG`.
+
+Benchmarks usam a fixture `bench` e também exigem PDV_BENCH=1; rode com
+`-s` para ver os resultados, ex.:
+PDV_TEST_DATABASE=... PDV_BENCH=1 python -m pytest -s tests/test_benchmark_venda_id.py
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+
+@pytest.fixture(scope="session")
+def db():
+    """Aponta a aplicação para o banco de testes e aplica as migrações"""
+    dsn = os.environ.get("PDV_TEST_DATABASE")
+    if not dsn:
+        pytest.skip("PDV_TEST_DATABASE não definida")
+    
+    import psycopg2
+    from psycopg2.extensions import parse_dsn
+    
+    parametros = parse_dsn(dsn)
+    config.DB_CONFIG.update({
+        "host": parametros.get("host", "localhost"),
+        "database": parametros.get("dbname", "pdv"),
+        "user": parametros.get("user", "postgres"),
+        "password": parametros.get("password", ""),
+        "port": int(parametros.get("port", 5432)),
+        "sslmode": parametros.get("sslmode", "prefer"),
+    })
+    config.LISTENER_CONFIG["enabled"] = False
+    try:
+        psycopg2.connect(**config.DB_CONFIG).close()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"Banco de testes indisponível: {e}")
+    
+    from database import connection
+    from migrations import run_migrations
+    
+    with connection() as conn:
+        run_migrations(conn)
+    return config.DB_CONFIG
+
+
+@pytest.fixture(scope="session")
+def bench(db):
+    """Banco de testes para benchmarks, habilitados apenas com PDV_BENCH=1"""
+    if os.environ.get("PDV_BENCH") != "1":
+        pytest.skip("Benchmark: defina PDV_BENCH=1")
+    return db
+
+
+def _apagar_produtos(ids):
+    """Apaga produtos de teste, as vendas que os incluíram e refaz os totais desses dias"""
+    from database import connection
+    from models import Venda
+    
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+            SELECT DISTINCT v.venda_id::text, v.data_venda::date
+            FROM venda_itens vi
+            JOIN vendas v ON v.venda_id = vi.venda_id
+            WHERE vi.produto_id = ANY(%s)
+            """, (ids,))
+            vendas = cur.fetchall()
+            venda_ids = [venda_id for venda_id, _ in vendas]
+            cur.execute("DELETE FROM venda_itens WHERE venda_id = ANY(%s::uuid[])", (venda_ids,))
+            cur.execute("DELETE FROM vendas WHERE venda_id = ANY(%s::uuid[])", (venda_ids,))
+            cur.execute("DELETE FROM produtos WHERE id = ANY(%s)", (ids,))
+        conn.commit()
+    
+    dias = [dia for _, dia in vendas]
+    if dias:
+        Venda.reconstruir_totais_diarios(min(dias), max(dias))
+
+
+@pytest.fixture
+def criar_produtos(db):
+    """
+    Cria produtos de teste; ao final do teste eles são apagados junto com
+    as vendas que os incluíram
+    """
+    import uuid
+    from database import connection
+    
+    criados = []
+    
+    def criar(quantidade, estoque, preco=10):
+        prefixo = f"T{uuid.uuid4().hex[:8]}"
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                INSERT INTO produtos (codigo, nome, preco, estoque)
+                SELECT %s || '-' || n, 'Teste ' || n, %s, %s
+                FROM generate_series(1, %s) AS n
+                RETURNING id
+                """, (prefixo, preco, estoque, quantidade))
+                ids = sorted(row[0] for row in cur.fetchall())
+            conn.commit()
+        criados.extend(ids)
+        return ids
+    
+    yield criar
+    if criados:
+        _apagar_produtos(criados)
@@ -0,0 +1,99 @@
+"""
+Benchmark da latência do checkout por tamanho da cesta
+
+Compara a gravação atual (`Venda._gravar_no_cursor`: um INSERT de itens e
+um UPDATE de estoque por venda) com a gravação anterior, um INSERT e um
+UPDATE por linha do carrinho. A gravação anterior não bloqueava nem
+conferia o estoque e não acumulava os totais diários; a atual faz mais
+trabalho no servidor em um número fixo de idas ao banco. Além da latência
+medida, conta as idas e estima a latência com um servidor remoto,
+somando PDV_BENCH_RTT_MS (padrão: 20 ms) por ida.
+"""
+
+import os
+import time
+import statistics
+
+import psycopg2.extensions
+import pytest
+
+from database import connection
+from models import Venda
+
+TAMANHOS = (1, 5, 10, 20, 40)
+VENDAS = int(os.environ.get("PDV_BENCH_VENDAS", 200))
+RTT_MS = float(os.environ.get("PDV_BENCH_RTT_MS", 20.0))
+
+
+class ContadorCursor(psycopg2.extensions.cursor):
+    """Cursor que conta os comandos enviados ao banco"""
+    
+    idas = 0
+    
+    def execute(self, query, vars=None):
+        self.idas += 1
+        return super().execute(query, vars)
+
+
+def _por_linha(cur, venda_id, items, total):
+    """Gravação anterior: um INSERT e um UPDATE por linha do carrinho"""
+    cur.execute("""
+    INSERT INTO vendas (venda_id, total, forma_pagamento, observacoes)
+    VALUES (%s, %s, %s, %s) RETURNING id
+    """, (venda_id, total, "PIX", ""))
+    for item in items:
+        cur.execute("""
+        INSERT INTO venda_itens (venda_id, produto_id, quantidade, preco_unitario, subtotal)
+        VALUES (%s, %s, %s, %s, %s)
+        """, (venda_id, item['produto_id'], item['quantidade'], item['preco_unitario'],
+              item['quantidade'] * item['preco_unitario']))
+        cur.execute("UPDATE produtos SET estoque = estoque - %s WHERE id = %s",
+                    (item['quantidade'], item['produto_id']))
+
+
+def _em_lote(cur, venda_id, items, total):
+    Venda._gravar_no_cursor(cur, venda_id, items, total, "PIX")
+
+
+VARIACOES = {"por_linha": _por_linha, "em_lote": _em_lote}
+
+
+@pytest.fixture
+def produtos(bench, criar_produtos):
+    return criar_produtos(max(TAMANHOS), estoque=1_000_000_000)
+
+
+def _medir(gravar, items):
+    """Latências (ms) e idas ao banco por venda, com o commit incluído"""
+    total = sum(item['quantidade'] * item['preco_unitario'] for item in items)
+    latencias, idas = [], 0
+    for _ in range(VENDAS):
+        with connection() as conn:
+            with conn.cursor(cursor_factory=ContadorCursor) as cur:
+                t0 = time.perf_counter()
+                gravar(cur, Venda.novo_id(), items, total)
+                conn.commit()
+                latencias.append((time.perf_counter() - t0) * 1000)
+                idas = cur.idas + 1
+    return latencias, idas
+
+
+def test_benchmark_latencia_do_checkout(produtos):
+    resultados = {}
+    for tamanho in TAMANHOS:
+        items = [{"produto_id": pid, "quantidade": 1, "preco_unitario": 10} for pid in produtos[:tamanho]]
+        for nome, gravar in VARIACOES.items():
+            resultados[tamanho, nome] = _medir(gravar, items)
+    
+    print(f"\nLatência do checkout: {VENDAS} vendas por tamanho; remoto estimado com {RTT_MS:g} ms por ida")
+    print(f"{'itens':>5} {'gravação':<10} {'idas':>5} {'mediana':>10} {'p95':>10} {'remoto':>10}")
+    for (tamanho, nome), (latencias, idas) in resultados.items():
+        mediana = statistics.median(latencias)
+        print(f"{tamanho:>5} {nome:<10} {idas:>5} {mediana:>7.2f} ms "
+              f"{statistics.quantiles(latencias, n=20)[-1]:>7.2f} ms {mediana + idas * RTT_MS:>7.1f} ms")
+    
+    # A gravação em lote não depende do tamanho da cesta em idas ao banco
+    idas_em_lote = {resultados[tamanho, "em_lote"][1] for tamanho in TAMANHOS}
+    assert len(idas_em_lote) == 1
+    for tamanho in TAMANHOS[1:]:
+        assert resultados[tamanho, "em_lote"][1] < resultados[tamanho, "por_linha"][1]
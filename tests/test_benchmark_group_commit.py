@@ -0,0 +1,84 @@
+"""
+Benchmark do agrupamento de commits com 10, 50 e 200 caixas simultâneos
+
+Cada caixa (uma thread) registra PDV_BENCH_VENDAS_POR_CAIXA vendas de 3
+produtos por `Venda.registrar`, gravando direto no banco (sem o diário
+local), uma vez com um commit por venda e outra com `GROUP_COMMIT_CONFIG`
+habilitado. Informa a vazão e as latências p50/p99: medidas por venda
+no modo direto e as de `get_group_commit().stats()` no modo agrupado.
+"""
+
+import os
+import time
+import random
+import threading
+import statistics
+
+import pytest
+
+import config
+import database
+from database import get_group_commit
+from models import Venda
+
+CAIXAS = (10, 50, 200)
+VENDAS_POR_CAIXA = int(os.environ.get("PDV_BENCH_VENDAS_POR_CAIXA", 20))
+PRODUTOS = 200
+
+
+@pytest.fixture
+def produtos(bench, criar_produtos, monkeypatch):
+    monkeypatch.setitem(config.JOURNAL_CONFIG, "enabled", False)
+    return criar_produtos(PRODUTOS, estoque=1_000_000_000)
+
+
+def _rodar(produtos, caixas):
+    """Registra as vendas dos caixas em paralelo; retorna os segundos e as latências (ms)"""
+    latencias = []
+    trava = threading.Lock()
+    inicio = threading.Barrier(caixas + 1)
+    
+    def caixa():
+        inicio.wait()
+        for _ in range(VENDAS_POR_CAIXA):
+            items = [
+                {"produto_id": pid, "quantidade": 1, "preco_unitario": 10}
+                for pid in random.sample(produtos, 3)
+            ]
+            t0 = time.perf_counter()
+            assert Venda.registrar(items, 30, "PIX") is not None
+            with trava:
+                latencias.append((time.perf_counter() - t0) * 1000)
+    
+    threads = [threading.Thread(target=caixa) for _ in range(caixas)]
+    for thread in threads:
+        thread.start()
+    inicio.wait()
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - t0, latencias
+
+
+def test_benchmark_group_commit(produtos, monkeypatch):
+    linhas = []
+    for caixas in CAIXAS:
+        monkeypatch.setitem(config.GROUP_COMMIT_CONFIG, "enabled", False)
+        segundos, latencias = _rodar(produtos, caixas)
+        percentis = statistics.quantiles(latencias, n=100)
+        linhas.append((caixas, "direto", len(latencias) / segundos, percentis[49], percentis[98], 1.0))
+        
+        # Coordenador novo para que as estatísticas sejam só deste nível
+        monkeypatch.setitem(config.GROUP_COMMIT_CONFIG, "enabled", True)
+        monkeypatch.setattr(database, "_group_commit", None)
+        segundos, latencias = _rodar(produtos, caixas)
+        stats = get_group_commit().stats()
+        assert stats["failed"] == 0 and stats["commit_errors"] == 0
+        linhas.append((caixas, "agrupado", len(latencias) / segundos, stats["p50_ms"], stats["p99_ms"],
+                       stats["avg_batch"]))
+    
+    print(f"\nGroup commit: {VENDAS_POR_CAIXA} vendas por caixa, janela de "
+          f"{config.GROUP_COMMIT_CONFIG['window_ms']:g} ms, até {config.GROUP_COMMIT_CONFIG['max_batch']} por lote")
+    print(f"{'caixas':>6} {'gravação':<9} {'vendas/s':>9} {'p50':>10} {'p99':>10} {'lote médio':>11}")
+    for caixas, modo, vazao, p50, p99, lote in linhas:
+        print(f"{caixas:>6} {modo:<9} {vazao:>9.0f} {p50:>7.2f} ms {p99:>7.2f} ms {lote:>11.1f}")
@@ -0,0 +1,44 @@
+"""
+Benchmark da geração de recibos com 200 linhas
+
+Mede a mediana de PDV_BENCH_RECIBOS renderizações (padrão: 1000) de
+`render_html` e `render_escpos`, que devem ficar abaixo de 1 ms.
+"""
+
+import os
+import time
+import statistics
+
+import pytest
+
+from receipt import Receipt, render_escpos, render_html
+
+RECIBOS = int(os.environ.get("PDV_BENCH_RECIBOS", 1000))
+LINHAS = 200
+LIMITE_MS = 1.0
+
+
+@pytest.fixture
+def recibo(bench):
+    return Receipt(
+        "0190a1b2-c3d4-7e5f-8a9b-0c1d2e3f4a5b",
+        [(f"Produto {n} – pão de açúcar", f"789{n:010d}", n % 5 + 1, f"{n % 97}.{n % 100:02d}")
+         for n in range(LINHAS)],
+        "Cartão de Crédito",
+        cliente="Cliente <teste>",
+    )
+
+
+@pytest.mark.parametrize("render", [render_html, render_escpos], ids=["html", "escpos"])
+def test_benchmark_recibo(recibo, render):
+    render(recibo)
+    latencias = []
+    for _ in range(RECIBOS):
+        t0 = time.perf_counter()
+        render(recibo)
+        latencias.append((time.perf_counter() - t0) * 1000)
+    
+    mediana = statistics.median(latencias)
+    print(f"\n{render.__name__}: {LINHAS} linhas, mediana {mediana:.3f} ms, "
+          f"p99 {statistics.quantiles(latencias, n=100)[98]:.3f} ms")
+    assert mediana < LIMITE_MS
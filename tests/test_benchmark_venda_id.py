@@ -0,0 +1,178 @@
+"""
+Benchmark das chaves de venda: VARCHAR com uuid4 aleatório x uuid nativo com UUIDv7
+
+Monta as duas variações de `vendas`/`venda_itens` em um esquema próprio,
+com PDV_BENCH_ITENS itens (padrão: 10 milhões, 4 por venda), e mede a
+vazão de inserção, o tamanho dos índices da chave e a latência da
+consulta de `Venda.get_detalhes`. O esquema é apagado ao final.
+"""
+
+import os
+import time
+import random
+import statistics
+
+import pytest
+
+from database import connection
+
+ITENS = int(os.environ.get("PDV_BENCH_ITENS", 10_000_000))
+ITENS_POR_VENDA = 4
+VENDAS_POR_LOTE = 250_000
+CONSULTAS = 2000
+ESQUEMA = "bench_venda_id"
+
+# Tipo da coluna e expressão que gera a chave da venda de número `n`
+VARIACOES = {
+    "varchar_uuid4": ("VARCHAR(50)", "gen_random_uuid()::text"),
+    "uuid_v7": ("uuid", f"{ESQUEMA}.uuid7(%(base_ms)s + n)"),
+}
+
+
+@pytest.fixture
+def esquema(bench):
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {ESQUEMA} CASCADE")
+            cur.execute(f"CREATE SCHEMA {ESQUEMA}")
+            # UUIDv7: 48 bits de milissegundos seguidos de bits aleatórios (versão 7)
+            cur.execute(f"""
+            CREATE FUNCTION {ESQUEMA}.uuid7(ms BIGINT) RETURNS uuid AS $$
+                SELECT encode(set_bit(set_bit(overlay(uuid_send(gen_random_uuid())
+                    PLACING substring(int8send(ms) FROM 3) FROM 1 FOR 6), 52, 1), 53, 1), 'hex')::uuid
+            $$ LANGUAGE sql VOLATILE
+            """)
+        conn.commit()
+    yield ESQUEMA
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {ESQUEMA} CASCADE")
+        conn.commit()
+
+
+def _criar_tabelas(cur, nome, tipo):
+    cur.execute(f"""
+    CREATE TABLE {ESQUEMA}.vendas_{nome} (
+        id SERIAL PRIMARY KEY,
+        venda_id {tipo} UNIQUE,
+        data_venda TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        total DECIMAL(10, 2) NOT NULL,
+        forma_pagamento VARCHAR(50)
+    )
+    """)
+    cur.execute(f"""
+    CREATE TABLE {ESQUEMA}.venda_itens_{nome} (
+        id SERIAL PRIMARY KEY,
+        venda_id {tipo} REFERENCES {ESQUEMA}.vendas_{nome}(venda_id),
+        produto_id INTEGER,
+        quantidade INTEGER NOT NULL,
+        preco_unitario DECIMAL(10, 2) NOT NULL,
+        subtotal DECIMAL(10, 2) NOT NULL
+    )
+    """)
+    cur.execute(f"""
+    CREATE INDEX idx_venda_itens_{nome}_venda_id ON {ESQUEMA}.venda_itens_{nome} (venda_id)
+    INCLUDE (produto_id, quantidade, preco_unitario, subtotal)
+    """)
+
+
+def _inserir(nome, expressao, produtos):
+    """Insere as vendas e itens em lotes; retorna os segundos gastos"""
+    vendas = ITENS // ITENS_POR_VENDA
+    base_ms = int(time.time() * 1000)
+    decorrido = 0.0
+    for inicio in range(1, vendas + 1, VENDAS_POR_LOTE):
+        fim = min(inicio + VENDAS_POR_LOTE - 1, vendas)
+        with connection() as conn:
+            with conn.cursor() as cur:
+                t0 = time.perf_counter()
+                cur.execute(f"""
+                INSERT INTO {ESQUEMA}.vendas_{nome} (venda_id, total, forma_pagamento)
+                SELECT {expressao}, 40, 'PIX' FROM generate_series(%(inicio)s, %(fim)s) AS n
+                """, {"inicio": inicio, "fim": fim, "base_ms": base_ms})
+                cur.execute(f"""
+                INSERT INTO {ESQUEMA}.venda_itens_{nome} (venda_id, produto_id, quantidade, preco_unitario, subtotal)
+                SELECT v.venda_id, (%(produtos)s::int[])[(v.id * 7 + k) %% cardinality(%(produtos)s::int[]) + 1],
+                       1, 10, 10
+                FROM {ESQUEMA}.vendas_{nome} v, generate_series(1, %(por_venda)s) AS k
+                WHERE v.id BETWEEN %(inicio)s AND %(fim)s
+                """, {"inicio": inicio, "fim": fim, "produtos": produtos, "por_venda": ITENS_POR_VENDA})
+                conn.commit()
+                decorrido += time.perf_counter() - t0
+    return decorrido
+
+
+def _medir_detalhes(nome):
+    """Latências (ms) da consulta de `Venda.get_detalhes` para vendas sorteadas"""
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"ANALYZE {ESQUEMA}.vendas_{nome}")
+            cur.execute(f"ANALYZE {ESQUEMA}.venda_itens_{nome}")
+            cur.execute(
+                f"SELECT venda_id FROM {ESQUEMA}.vendas_{nome} WHERE id = ANY(%s)",
+                (random.sample(range(1, ITENS // ITENS_POR_VENDA + 1), CONSULTAS),)
+            )
+            ids = [row[0] for row in cur.fetchall()]
+            
+            latencias = []
+            for venda_id in ids:
+                t0 = time.perf_counter()
+                cur.execute(f"""
+                SELECT vi.*, p.nome as produto_nome, p.codigo as produto_codigo
+                FROM {ESQUEMA}.venda_itens_{nome} vi
+                JOIN produtos p ON vi.produto_id = p.id
+                WHERE vi.venda_id = %s
+                """, (venda_id,))
+                assert len(cur.fetchall()) == ITENS_POR_VENDA
+                latencias.append((time.perf_counter() - t0) * 1000)
+        conn.rollback()
+    return latencias
+
+
+def _tamanhos(nome):
+    """Tamanho em bytes dos índices da chave da venda"""
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+            SELECT pg_relation_size('{ESQUEMA}.vendas_{nome}_venda_id_key'),
+                   pg_relation_size('{ESQUEMA}.idx_venda_itens_{nome}_venda_id'),
+                   pg_total_relation_size('{ESQUEMA}.venda_itens_{nome}')
+            """)
+            return cur.fetchone()
+
+
+def test_benchmark_chave_da_venda(esquema):
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM produtos ORDER BY id LIMIT 1000")
+            produtos = [row[0] for row in cur.fetchall()]
+            if not produtos:
+                pytest.skip("Nenhum produto no banco de testes")
+            for nome, (tipo, _) in VARIACOES.items():
+                _criar_tabelas(cur, nome, tipo)
+        conn.commit()
+    
+    resultados = {}
+    for nome, (_, expressao) in VARIACOES.items():
+        segundos = _inserir(nome, expressao, produtos)
+        latencias = _medir_detalhes(nome)
+        resultados[nome] = {
+            "itens_por_segundo": ITENS / segundos,
+            "tamanhos": _tamanhos(nome),
+            "mediana_ms": statistics.median(latencias),
+            "p95_ms": statistics.quantiles(latencias, n=20)[-1],
+        }
+    
+    mb = 1024 * 1024
+    print(f"\nChave da venda: {ITENS} itens, {ITENS // ITENS_POR_VENDA} vendas")
+    print(f"{'variação':<15} {'itens/s':>10} {'índice vendas':>14} {'índice itens':>13} "
+          f"{'venda_itens':>12} {'mediana':>9} {'p95':>9}")
+    for nome, r in resultados.items():
+        indice_vendas, indice_itens, tabela_itens = r["tamanhos"]
+        print(f"{nome:<15} {r['itens_por_segundo']:>10.0f} {indice_vendas / mb:>11.1f} MB "
+              f"{indice_itens / mb:>10.1f} MB {tabela_itens / mb:>9.1f} MB "
+              f"{r['mediana_ms']:>6.3f} ms {r['p95_ms']:>6.3f} ms")
+    
+    # uuid nativo ocupa 16 bytes contra 37 da string: índices menores
+    assert resultados["uuid_v7"]["tamanhos"][0] < resultados["varchar_uuid4"]["tamanhos"][0]
+    assert resultados["uuid_v7"]["tamanhos"][1] < resultados["varchar_uuid4"]["tamanhos"][1]
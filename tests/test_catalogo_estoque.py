@@ -0,0 +1,58 @@
+"""
+Testes do estoque do catálogo em memória após vendas gravadas no banco
+
+A notificação do listener (ou uma atualização incremental) pode trazer a
+linha do produto antes ou depois de `Venda.registrar` aplicar a venda no
+índice; nos dois casos o estoque em memória deve ser o do banco.
+"""
+
+import pytest
+
+import config
+from catalog import get_catalog
+from database import connection
+from models import Venda
+
+
+@pytest.fixture
+def direto(db, monkeypatch):
+    monkeypatch.setitem(config.JOURNAL_CONFIG, "enabled", False)
+    monkeypatch.setitem(config.GROUP_COMMIT_CONFIG, "enabled", False)
+    catalog = get_catalog()
+    catalog.load()
+    return catalog
+
+
+def _estoque_no_banco(produto_id):
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT estoque FROM produtos WHERE id = %s", (produto_id,))
+            return cur.fetchone()[0]
+
+
+def _vender(produto_id, quantidade):
+    assert Venda.registrar([{"produto_id": produto_id, "quantidade": quantidade, "preco_unitario": 10}],
+                           10 * quantidade, "PIX") is not None
+
+
+def test_notificacao_antes_da_venda_no_indice(direto, criar_produtos, monkeypatch):
+    produto_id = criar_produtos(1, estoque=50)[0]
+    direto._on_produtos_alterados([f"U:{produto_id}"])
+    aplicar = direto.apply_stock_levels
+    
+    def listener_primeiro(niveis):
+        direto._on_produtos_alterados([f"U:{produto_id}"])
+        aplicar(niveis)
+    
+    monkeypatch.setattr(direto, "apply_stock_levels", listener_primeiro)
+    _vender(produto_id, 3)
+    assert direto.peek(produto_id).estoque == _estoque_no_banco(produto_id) == 47
+
+
+def test_notificacao_depois_da_venda_no_indice(direto, criar_produtos):
+    produto_id = criar_produtos(1, estoque=50)[0]
+    direto._on_produtos_alterados([f"U:{produto_id}"])
+    _vender(produto_id, 3)
+    direto._on_produtos_alterados([f"U:{produto_id}"])
+    direto.refresh()
+    assert direto.peek(produto_id).estoque == _estoque_no_banco(produto_id) == 47
@@ -0,0 +1,114 @@
+"""
+Testes de concorrência da baixa de estoque (`Venda.registrar`) com ajustes em lote
+"""
+
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import config
+from database import connection
+from models import EstoqueInsuficienteError, Produto, Venda
+
+ESTOQUE = 20
+VENDAS = 60
+REPOSICOES = 5
+
+
+@pytest.fixture
+def produtos(db, criar_produtos, monkeypatch):
+    """Dois produtos com estoque limitado; vendas gravadas direto no banco"""
+    monkeypatch.setitem(config.JOURNAL_CONFIG, "enabled", False)
+    monkeypatch.setitem(config.GROUP_COMMIT_CONFIG, "enabled", False)
+    return criar_produtos(2, estoque=ESTOQUE)
+
+
+def _estoques(ids):
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, estoque FROM produtos WHERE id = ANY(%s)", (ids,))
+            return dict(cur.fetchall())
+
+
+def test_vendas_concorrentes_com_ajustes_em_lote(produtos):
+    inicio = threading.Barrier(VENDAS + 1)
+    
+    def vender():
+        # Itens em ordem aleatória: o bloqueio por ID evita deadlocks mesmo assim
+        itens = [{"produto_id": pid, "quantidade": 1, "preco_unitario": 10} for pid in produtos]
+        random.shuffle(itens)
+        inicio.wait()
+        try:
+            venda_id = Venda.registrar(itens, 20, "PIX")
+        except EstoqueInsuficienteError:
+            return "recusada"
+        return "gravada" if venda_id else "erro"
+    
+    vendas_concluidas = threading.Event()
+    
+    def ajustar():
+        # Reajustes de preço com reposições de estoque enquanto as vendas acontecem;
+        # o estoque novo parte da linha atual, sem desfazer as vendas concorrentes
+        inicio.wait()
+        reposicoes = 0
+        while not vendas_concluidas.is_set():
+            delta = 1 if reposicoes < REPOSICOES else 0
+            Produto.ajustar_em_lote([
+                {"produto_id": pid, "preco_percentual": 1, "estoque_delta": delta} for pid in produtos
+            ])
+            reposicoes += delta
+        return reposicoes
+    
+    with ThreadPoolExecutor(max_workers=VENDAS + 1) as executor:
+        ajuste = executor.submit(ajustar)
+        try:
+            resultados = list(executor.map(lambda _: vender(), range(VENDAS)))
+        finally:
+            vendas_concluidas.set()
+        reposicoes = ajuste.result()
+    
+    gravadas = resultados.count("gravada")
+    recusadas = resultados.count("recusada")
+    estoques = _estoques(produtos)
+    
+    # Nenhuma venda falhou por deadlock ou outro erro do banco
+    assert resultados.count("erro") == 0
+    assert gravadas + recusadas == VENDAS
+    for pid in produtos:
+        assert estoques[pid] >= 0
+        # Nenhuma baixa se perdeu: vendido + restante = estoque inicial + reposições
+        assert gravadas + estoques[pid] == ESTOQUE + reposicoes
+    assert recusadas == VENDAS - gravadas
+    
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT produto_id, sum(quantidade) FROM venda_itens WHERE produto_id = ANY(%s) GROUP BY produto_id",
+                (produtos,)
+            )
+            vendidos = dict(cur.fetchall())
+    assert vendidos == {pid: gravadas for pid in produtos}
+
+
+def test_vendas_concorrentes_recusam_o_excedente(produtos):
+    inicio = threading.Barrier(VENDAS)
+    
+    def vender():
+        inicio.wait()
+        try:
+            venda_id = Venda.registrar(
+                [{"produto_id": produtos[0], "quantidade": 1, "preco_unitario": 10}], 10, "Dinheiro"
+            )
+        except EstoqueInsuficienteError:
+            return "recusada"
+        return "gravada" if venda_id else "erro"
+    
+    with ThreadPoolExecutor(max_workers=VENDAS) as executor:
+        resultados = list(executor.map(lambda _: vender(), range(VENDAS)))
+    
+    assert resultados.count("erro") == 0
+    assert resultados.count("gravada") == ESTOQUE
+    assert resultados.count("recusada") == VENDAS - ESTOQUE
+    assert _estoques(produtos)[produtos[0]] == 0
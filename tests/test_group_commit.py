@@ -0,0 +1,121 @@
+"""
+Testes do agrupamento de commits de vendas (`GroupCommitCoordinator`)
+"""
+
+import time
+import threading
+
+import psycopg2
+import pytest
+
+import config
+import database
+from database import GroupCommitCoordinator, connection, get_group_commit
+from models import EstoqueInsuficienteError, Venda
+
+
+@pytest.fixture
+def agrupado(db, monkeypatch):
+    """Vendas gravadas direto no banco por um coordenador novo, com janela longa"""
+    monkeypatch.setitem(config.JOURNAL_CONFIG, "enabled", False)
+    monkeypatch.setitem(config.GROUP_COMMIT_CONFIG, "enabled", True)
+    monkeypatch.setitem(config.GROUP_COMMIT_CONFIG, "window_ms", 500.0)
+    monkeypatch.setattr(database, "_group_commit", None)
+    return get_group_commit
+
+
+def _estoques(ids):
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, estoque FROM produtos WHERE id = ANY(%s)", (ids,))
+            return dict(cur.fetchall())
+
+
+def _vendas_gravadas(venda_ids):
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT venda_id::text FROM vendas WHERE venda_id = ANY(%s::uuid[])", (venda_ids,))
+            return {row[0] for row in cur.fetchall()}
+
+
+def test_venda_que_falha_no_lote_volta_ao_savepoint(agrupado, criar_produtos):
+    escasso, farto = criar_produtos(1, estoque=1)[0], criar_produtos(1, estoque=100)[0]
+    vendas = {
+        # Falha ao converter o preço, depois de gravar a venda e baixar o estoque
+        "invalida": [{"produto_id": farto, "quantidade": 1, "preco_unitario": "abc"}],
+        "sem_estoque": [{"produto_id": escasso, "quantidade": 5, "preco_unitario": 10}],
+        "ok_1": [{"produto_id": farto, "quantidade": 2, "preco_unitario": 10}],
+        "ok_2": [{"produto_id": farto, "quantidade": 3, "preco_unitario": 10}],
+    }
+    ids = {nome: Venda.novo_id() for nome in vendas}
+    resultados = {}
+    inicio = threading.Barrier(len(vendas))
+    
+    def vender(nome):
+        inicio.wait()
+        try:
+            resultados[nome] = Venda.registrar(vendas[nome], 10, "PIX", venda_id=ids[nome])
+        except EstoqueInsuficienteError as e:
+            resultados[nome] = e
+    
+    threads = [threading.Thread(target=vender, args=(nome,)) for nome in vendas]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    stats = agrupado().stats()
+    assert stats["batches"] == 1
+    assert stats["failed"] == 2
+    
+    assert resultados["invalida"] is None
+    assert isinstance(resultados["sem_estoque"], EstoqueInsuficienteError)
+    assert resultados["ok_1"] == ids["ok_1"] and resultados["ok_2"] == ids["ok_2"]
+    
+    # Só as vendas válidas ficaram; a baixa da venda inválida foi desfeita
+    assert _vendas_gravadas(list(ids.values())) == {ids["ok_1"], ids["ok_2"]}
+    assert _estoques([escasso, farto]) == {escasso: 1, farto: 95}
+
+
+def test_lote_desfeito_por_deadlock_e_refeito(db, criar_produtos):
+    primeiro, segundo = criar_produtos(2, estoque=10)
+    coordenador = GroupCommitCoordinator(window_ms=300.0, max_batch=2)
+    
+    def baixar(produto_id):
+        def work(cur):
+            cur.execute("UPDATE produtos SET estoque = estoque - 1 WHERE id = %s", (produto_id,))
+            return produto_id
+        return work
+    
+    # Outra transação segura o segundo produto e depois pede o primeiro,
+    # já bloqueado pelo lote: um dos dois lados sofre deadlock
+    externa = psycopg2.connect(**config.DB_CONFIG)
+    try:
+        with externa.cursor() as cur:
+            cur.execute("UPDATE produtos SET estoque = estoque + 100 WHERE id = %s", (segundo,))
+            resultados = {}
+            threads = [
+                threading.Thread(target=lambda pid=pid: resultados.setdefault(pid, coordenador.submit(baixar(pid))))
+                for pid in (primeiro, segundo)
+            ]
+            # O primeiro produto chega antes ao lote e é bloqueado primeiro
+            for thread in threads:
+                thread.start()
+                time.sleep(0.1)
+            time.sleep(0.7)
+            try:
+                cur.execute("UPDATE produtos SET estoque = estoque + 100 WHERE id = %s", (primeiro,))
+                externa.commit()
+                reposto = 100
+            except psycopg2.extensions.TransactionRollbackError:
+                externa.rollback()
+                reposto = 0
+    finally:
+        externa.close()
+    for thread in threads:
+        thread.join(timeout=10)
+    
+    # As duas gravações do lote terminam bem, com ou sem nova tentativa
+    assert resultados == {primeiro: primeiro, segundo: segundo}
+    assert coordenador.stats()["commit_errors"] == 0
+    assert _estoques([primeiro, segundo]) == {primeiro: 9 + reposto, segundo: 9 + reposto}
@@ -0,0 +1,65 @@
+"""
+Testes da importação de produtos em massa (`Produto.bulk_upsert`)
+"""
+
+import uuid
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from models import Produto
+
+
+def _parquet_inteiros_nulos(caminho, prefixo):
+    """Parquet com estoque e categoria_id inteiros anuláveis e preço em float"""
+    table = pa.table({
+        "codigo": [f"{prefixo}-1", f"{prefixo}-2", f"{prefixo}-3"],
+        "nome": ["Arroz", "Feijão", "Café"],
+        "preco": pa.array([12.3 + 1e-12, 7.1, 0.1 + 0.2], type=pa.float64()),
+        "estoque": pa.array([5, None, 12], type=pa.int64()),
+        "categoria_id": pa.array([None, None, None], type=pa.int32()),
+    })
+    pq.write_table(table, caminho)
+
+
+def test_parquet_inteiros_anulaveis_chegam_como_inteiros(tmp_path):
+    caminho = tmp_path / "produtos.parquet"
+    _parquet_inteiros_nulos(caminho, "T")
+    
+    chunk = next(Produto._ler_importacao(str(caminho), "parquet", 1000, ",", "utf-8"))
+    
+    assert list(chunk["estoque"]) == [5, None, 12]
+    assert list(chunk["categoria_id"]) == [None, None, None]
+    assert list(chunk["preco"]) == [12.3, 7.1, 0.3]
+    # O texto copiado para o banco passa nas expressões de validação
+    assert chunk[["preco", "estoque"]].to_csv(header=False, index=False).splitlines() == [
+        "12.3,5", "7.1,", "0.3,12"
+    ]
+
+
+def test_bulk_upsert_parquet_inteiros_anulaveis(db, tmp_path):
+    prefixo = f"T{uuid.uuid4().hex[:8]}"
+    caminho = tmp_path / "produtos.parquet"
+    _parquet_inteiros_nulos(caminho, prefixo)
+    
+    resultado = Produto.bulk_upsert(str(caminho))
+    
+    assert resultado["rejeitados"].empty
+    assert resultado["inseridos"] == 3
+    
+    from database import connection
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT codigo, preco, estoque, categoria_id FROM produtos WHERE codigo LIKE %s ORDER BY codigo",
+                (f"{prefixo}-%",)
+            )
+            produtos = cur.fetchall()
+            cur.execute("DELETE FROM produtos WHERE codigo LIKE %s", (f"{prefixo}-%",))
+        conn.commit()
+    assert produtos == [
+        (f"{prefixo}-1", Decimal("12.30"), 5, None),
+        (f"{prefixo}-2", Decimal("7.10"), 0, None),
+        (f"{prefixo}-3", Decimal("0.30"), 12, None),
+    ]
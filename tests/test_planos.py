@@ -0,0 +1,31 @@
+"""
+Testes dos planos das consultas críticas (`migrations.HOT_QUERIES`)
+"""
+
+from database import connection
+from migrations import HOT_QUERIES, check_query_plans
+
+
+def test_consultas_criticas_nao_usam_seq_scan(db):
+    with connection() as conn:
+        resultado = check_query_plans(conn)
+    
+    assert {nome for nome, _, _ in resultado} == set(HOT_QUERIES)
+    seq_scans = {nome: tabelas for nome, tabelas, _ in resultado if tabelas}
+    assert seq_scans == {}
+
+
+def test_indice_removido_aparece_como_seq_scan(db):
+    # O índice é apagado só na transação da verificação, desfeita ao final
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DROP INDEX idx_produtos_barcode")
+        resultado = check_query_plans(conn)
+    
+    seq_scans = {nome: tabelas for nome, tabelas, _ in resultado if tabelas}
+    assert seq_scans == {"leitura_codigo_barras": ["produtos"]}
+    
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('idx_produtos_barcode')")
+            assert cur.fetchone()[0] is not None
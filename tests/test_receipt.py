@@ -0,0 +1,48 @@
+"""
+Testes da geração de recibos (`receipt.py`)
+"""
+
+import datetime
+
+from receipt import Receipt, render_escpos, render_html
+
+
+def _recibo():
+    return Receipt(
+        "0190a1b2-c3d4-7e5f-8a9b-0c1d2e3f4a5b",
+        [("Pão de açúcar", "789", 2, "3.50"), ("Café <forte>", None, 1, 12)],
+        "PIX",
+        cliente="João",
+        data=datetime.datetime(2026, 10, 17, 9, 30),
+    )
+
+
+def test_escpos_inicia_codifica_e_corta():
+    dados = render_escpos(_recibo(), colunas=32, encoding="cp860", loja="Loja", rodape="Obrigado")
+    
+    # Inicializa a impressora e seleciona a página de código 860 (ESC t 3)
+    assert dados.startswith(b"\x1b@\x1bt\x03")
+    # Corte parcial com avanço (GS V 66 0) como último comando
+    assert dados.endswith(b"\x1dV\x42\x00")
+    
+    assert "Pão de açúcar\n".encode("cp860") in dados
+    assert "Cliente: João".encode("cp860") in dados
+    assert b"2 x 3.50" in dados and b"TOTAL R$ 19.00" in dados
+    # Linhas de valores preenchem exatamente a largura do papel
+    linha = next(l for l in dados.split(b"\n") if l.startswith(b"2 x 3.50"))
+    assert len(linha) == 32 and linha.endswith(b"7.00")
+
+
+def test_escpos_substitui_caracteres_fora_da_pagina_de_codigo():
+    recibo = Receipt("1", [("Chá 🍵", "", 1, 5)], "Dinheiro")
+    dados = render_escpos(recibo, encoding="cp437")
+    assert dados.startswith(b"\x1b@\x1bt\x00")
+    assert "Chá ?\n".encode("cp437") in dados
+
+
+def test_html_escapa_campos():
+    pagina = render_html(_recibo(), loja="Loja & Cia")
+    assert "Café &lt;forte&gt;" in pagina
+    assert "<h1>Loja &amp; Cia</h1>" in pagina
+    assert "<td>N/A</td>" in pagina
+    assert "Total: R$ 19.00" in pagina
@@ -0,0 +1,294 @@
+"""
+Cache em disco de miniaturas das imagens de produtos
+"""
+
+import io
+import os
+import time
+import hashlib
+import logging
+import threading
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from database import get_listener, connection
+from config import THUMBNAIL_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class ThumbnailCache:
+    """
+    Cache de miniaturas endereçado por conteúdo, com limite de tamanho
+    
+    Cada imagem remota é baixada uma única vez, reduzida para o tamanho de
+    exibição e gravada em `blobs/<sha256 do conteúdo>`; o arquivo em
+    `urls/<sha256 da URL e do tamanho>` aponta para o blob, de forma que
+    produtos com a mesma imagem compartilham a miniatura. Quando o total
+    dos blobs passa de `max_bytes`, os menos usados recentemente são
+    removidos.
+    """
+    
+    def __init__(self, directory, size=(100, 100), max_bytes=50 * 1024 * 1024,
+                 fetch_timeout=5.0, max_source_bytes=10 * 1024 * 1024,
+                 retry_after=300.0, workers=2):
+        """
+        Args:
+            directory (str): Diretório do cache
+            size (tuple, optional): Tamanho máximo (largura, altura) da miniatura. Defaults to (100, 100).
+            max_bytes (int, optional): Orçamento total em disco. Defaults to 50 MB.
+            fetch_timeout (float, optional): Tempo limite do download em segundos. Defaults to 5.0.
+            max_source_bytes (int, optional): Tamanho máximo da imagem original. Defaults to 10 MB.
+            retry_after (float, optional): Espera antes de tentar de novo uma URL que falhou. Defaults to 300.0.
+            workers (int, optional): Threads de download em segundo plano. Defaults to 2.
+        """
+        self.size = tuple(size)
+        self.max_bytes = max_bytes
+        self.fetch_timeout = fetch_timeout
+        self.max_source_bytes = max_source_bytes
+        self.retry_after = retry_after
+        
+        self._blob_dir = os.path.join(directory, "blobs")
+        self._url_dir = os.path.join(directory, "urls")
+        os.makedirs(self._blob_dir, exist_ok=True)
+        os.makedirs(self._url_dir, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._blobs = OrderedDict()      # digest -> tamanho, do menos para o mais recente
+        self._total_bytes = 0
+        self._failed = {}                # url -> instante da falha
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdv-thumbnails")
+        
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "fetches": 0,
+            "fetch_errors": 0,
+            "evictions": 0,
+        }
+        
+        self._scan()
+    
+    def _scan(self):
+        """Reconstrói a ordem LRU a partir dos arquivos já gravados"""
+        entradas = []
+        for nome in os.listdir(self._blob_dir):
+            caminho = os.path.join(self._blob_dir, nome)
+            if nome.endswith(".tmp"):
+                continue
+            try:
+                info = os.stat(caminho)
+            except OSError:
+                continue
+            entradas.append((info.st_mtime, nome, info.st_size))
+        
+        for _, digest, tamanho in sorted(entradas):
+            self._blobs[digest] = tamanho
+            self._total_bytes += tamanho
+    
+    def _url_key(self, url):
+        return hashlib.sha256(f"{url}|{self.size[0]}x{self.size[1]}".encode("utf-8")).hexdigest()
+    
+    def _cached_digest(self, url):
+        """Retorna o blob da miniatura da URL, se ainda estiver no cache"""
+        try:
+            with open(os.path.join(self._url_dir, self._url_key(url))) as f:
+                digest = f.read().strip()
+        except OSError:
+            return None
+        with self._lock:
+            return digest if digest in self._blobs else None
+    
+    def _read_cached(self, url):
+        digest = self._cached_digest(url)
+        if digest is None:
+            return None
+        
+        caminho = os.path.join(self._blob_dir, digest)
+        with self._lock:
+            if digest not in self._blobs:
+                return None
+            self._blobs.move_to_end(digest)
+        try:
+            with open(caminho, "rb") as f:
+                data = f.read()
+            os.utime(caminho)
+        except OSError:
+            return None
+        return data
+    
+    def _render(self, source):
+        with Image.open(io.BytesIO(source)) as img:
+            img.thumbnail(self.size)
+            buffer = io.BytesIO()
+            if img.mode in ("RGBA", "LA", "P"):
+                img.save(buffer, format="PNG", optimize=True)
+            else:
+                img.convert("RGB").save(buffer, format="JPEG", quality=85, optimize=True)
+        return buffer.getvalue()
+    
+    def _store(self, url, data):
+        digest = hashlib.sha256(data).hexdigest()
+        caminho = os.path.join(self._blob_dir, digest)
+        
+        if not os.path.exists(caminho):
+            temporario = f"{caminho}.{threading.get_ident()}.tmp"
+            with open(temporario, "wb") as f:
+                f.write(data)
+            os.replace(temporario, caminho)
+        
+        temporario = os.path.join(self._url_dir, f"{self._url_key(url)}.{threading.get_ident()}.tmp")
+        with open(temporario, "w") as f:
+            f.write(digest)
+        os.replace(temporario, os.path.join(self._url_dir, self._url_key(url)))
+        
+        with self._lock:
+            if digest not in self._blobs:
+                self._blobs[digest] = len(data)
+                self._total_bytes += len(data)
+            self._blobs.move_to_end(digest)
+            self._evict_locked()
+    
+    def _evict_locked(self):
+        # Nunca remove o blob mais recente, mesmo se sozinho exceder o orçamento
+        while self._total_bytes > self.max_bytes and len(self._blobs) > 1:
+            digest, tamanho = self._blobs.popitem(last=False)
+            self._total_bytes -= tamanho
+            self._stats["evictions"] += 1
+            try:
+                os.remove(os.path.join(self._blob_dir, digest))
+            except OSError:
+                pass
+    
+    def _fetch(self, url):
+        try:
+            with self._lock:
+                falhou_em = self._failed.get(url)
+            if falhou_em is not None and time.monotonic() - falhou_em < self.retry_after:
+                return None
+            
+            request = urllib.request.Request(url, headers={"User-Agent": "ORION-PDV"})
+            with urllib.request.urlopen(request, timeout=self.fetch_timeout) as response:
+                source = response.read(self.max_source_bytes + 1)
+            if len(source) > self.max_source_bytes:
+                raise ValueError(f"Imagem maior que {self.max_source_bytes} bytes")
+            
+            data = self._render(source)
+            self._store(url, data)
+            with self._lock:
+                self._stats["fetches"] += 1
+                self._failed.pop(url, None)
+            return data
+        except Exception:
+            logger.warning("Falha ao gerar miniatura de %s", url, exc_info=True)
+            with self._lock:
+                self._stats["fetch_errors"] += 1
+                self._failed[url] = time.monotonic()
+            return None
+        finally:
+            with self._lock:
+                self._pending.discard(url)
+    
+    @staticmethod
+    def _is_remote(url):
+        return isinstance(url, str) and url.startswith(("http://", "https://"))
+    
+    def get(self, url, wait=False):
+        """
+        Retorna a miniatura de uma imagem
+        
+        Args:
+            url (str): URL da imagem original
+            wait (bool, optional): Baixar na hora se não estiver em cache; caso
+                contrário o download é agendado em segundo plano. Defaults to False.
+        
+        Returns:
+            bytes: Miniatura codificada (PNG ou JPEG) ou None se ainda não disponível
+        """
+        if not self._is_remote(url):
+            return None
+        
+        data = self._read_cached(url)
+        with self._lock:
+            self._stats["hits" if data is not None else "misses"] += 1
+        if data is not None:
+            return data
+        
+        if wait:
+            return self._fetch(url)
+        self.prefetch([url])
+        return None
+    
+    def prefetch(self, urls):
+        """
+        Agenda em segundo plano o download das imagens que ainda não estão em cache
+        
+        Args:
+            urls (iterable): URLs das imagens
+        """
+        for url in urls:
+            if not self._is_remote(url):
+                continue
+            with self._lock:
+                if url in self._pending:
+                    continue
+                self._pending.add(url)
+            if self._cached_digest(url) is not None:
+                with self._lock:
+                    self._pending.discard(url)
+                continue
+            self._executor.submit(self._fetch, url)
+    
+    def stats(self):
+        """
+        Retorna as estatísticas do cache
+        
+        Returns:
+            dict: Acertos, faltas, downloads, erros, remoções e uso do orçamento
+        """
+        with self._lock:
+            result = dict(self._stats)
+            result["entries"] = len(self._blobs)
+            result["bytes"] = self._total_bytes
+            result["max_bytes"] = self.max_bytes
+            result["pending"] = len(self._pending)
+        return result
+    
+    def _on_imagem_alterada(self, payloads):
+        # Gerar antecipadamente as miniaturas de produtos inseridos ou com nova imagem
+        ids = [int(p.partition(":")[2]) for p in payloads]
+        if not ids:
+            return
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT imagem_url FROM produtos WHERE id = ANY(%s) AND imagem_url IS NOT NULL",
+                    (ids,)
+                )
+                urls = [row[0] for row in cur.fetchall()]
+        self.prefetch(urls)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_thumbnail_cache():
+    """
+    Retorna o cache de miniaturas do processo, criando-o na primeira chamada
+    
+    Returns:
+        ThumbnailCache: Cache compartilhado por todas as sessões do Streamlit
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ThumbnailCache(**THUMBNAIL_CONFIG)
+                listener = get_listener()
+                if listener is not None:
+                    listener.subscribe("produtos_imagem_alterada", _cache._on_imagem_alterada)
+    return _cache
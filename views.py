@@ -8,9 +8,127 @@ import pandas as pd
 import streamlit as st
 from streamlit_webrtc import webrtc_streamer
 
-from models import Categoria, Produto, Venda
+from models import Cart, Categoria, Produto, Venda, EstoqueInsuficienteError, get_report_cache
 from barcode_scanner import BarcodeVideoProcessor
-from config import PAYMENT_CONFIG, STOCK_CONFIG
+from catalog import get_catalog
+from thumbnails import get_thumbnail_cache
+from snapshots import get_snapshots
+from receipt import Receipt, render_html, print_escpos
+from config import PAYMENT_CONFIG, PDV_CONFIG, RECEIPT_CONFIG, REPORT_CONFIG, SEARCH_CONFIG, STOCK_CONFIG
+
+def _pagina_busca(pesquisa, key):
+    """
+    Busca uma página de produtos no servidor conforme a página escolhida
+    
+    Args:
+        pesquisa (str): Termo de busca
+        key (str): Chave do seletor de página
+        
+    Returns:
+        tuple: (DataFrame da página, se existe próxima página)
+    """
+    page_size = SEARCH_CONFIG["page_size"]
+    pagina = st.number_input("Página", min_value=1, step=1, key=key)
+    
+    # Um produto a mais indica se existe próxima página, sem contar o total
+    df_produtos = Produto.search(pesquisa, limit=page_size + 1, offset=(pagina - 1) * page_size)
+    tem_mais = len(df_produtos) > page_size
+    return df_produtos.head(page_size), tem_mais
+
+def _grade_produtos_pdv(pesquisa):
+    """
+    Exibe a página atual da grade de produtos do PDV
+    
+    Apenas os produtos da página são buscados e renderizados, com chaves
+    de widget estáveis (pelo ID do produto), de forma que o custo de cada
+    execução do script não depende do tamanho do catálogo.
+    
+    Args:
+        pesquisa (str): Termo de busca
+    """
+    inicio = time.perf_counter()
+    page_size = PDV_CONFIG["grid_page_size"]
+    
+    # Voltar para a primeira página quando o termo de busca muda
+    if st.session_state.get('pesquisa_pdv_anterior') != pesquisa:
+        st.session_state.pesquisa_pdv_anterior = pesquisa
+        st.session_state.pagina_pdv = 0
+    pagina = st.session_state.get('pagina_pdv', 0)
+    
+    # Um produto a mais indica se existe próxima página
+    df_produtos = Produto.search(pesquisa, limit=page_size + 1, offset=pagina * page_size)
+    tem_mais = len(df_produtos) > page_size
+    thumbnails = get_thumbnail_cache()
+    
+    for row in df_produtos.head(page_size).itertuples(index=False):
+        with st.container():
+            col_img, col_info = st.columns([1, 3])
+            
+            with col_img:
+                if row.imagem_url:
+                    # Miniatura local; enquanto não fica pronta, usa a imagem original
+                    miniatura = thumbnails.get(row.imagem_url)
+                    st.image(miniatura if miniatura is not None else row.imagem_url, width=50)
+                else:
+                    st.markdown("📦")
+            
+            with col_info:
+                st.markdown(
+                    f"**{row.nome}**  \n"
+                    f"Código: {row.codigo} | R$ {float(row.preco):.2f}  \n"
+                    f"Estoque: {int(row.estoque)}"
+                )
+                
+                # Botão para adicionar ao carrinho
+                if st.button("Adicionar", key=f"add_pdv_{row.id}"):
+                    st.session_state.cart.add(row.id, row.nome, row.preco)
+                    st.success(f"Produto '{row.nome}' adicionado ao carrinho!")
+                    st.experimental_rerun()
+    
+    # Navegação entre páginas
+    col_ant, col_pag, col_prox = st.columns([1, 1, 1])
+    with col_ant:
+        if st.button("◀", key="pdv_pagina_anterior", disabled=pagina == 0, use_container_width=True):
+            st.session_state.pagina_pdv = pagina - 1
+            st.experimental_rerun()
+    with col_pag:
+        st.markdown(f"Página {pagina + 1}")
+    with col_prox:
+        if st.button("▶", key="pdv_proxima_pagina", disabled=not tem_mais, use_container_width=True):
+            st.session_state.pagina_pdv = pagina + 1
+            st.experimental_rerun()
+    
+    # Tempo de renderização da grade (busca + widgets) nesta execução
+    tempo_ms = (time.perf_counter() - inicio) * 1000
+    st.session_state.grade_pdv_ms_max = max(tempo_ms, st.session_state.get('grade_pdv_ms_max', 0.0))
+    st.caption(f"Grade renderizada em {tempo_ms:.0f} ms (máx. {st.session_state.grade_pdv_ms_max:.0f} ms)")
+
+def _acoes_recibo(recibo, key):
+    """
+    Exibe os botões para baixar e imprimir um recibo
+    
+    Args:
+        recibo (Receipt): Recibo da venda
+        key (str): Prefixo das chaves dos widgets
+    """
+    col_baixar, col_imprimir = st.columns(2)
+    with col_baixar:
+        st.download_button(
+            "Baixar Recibo",
+            render_html(recibo),
+            file_name=f"recibo_{recibo.venda_id}.html",
+            mime="text/html",
+            key=f"{key}_baixar",
+            use_container_width=True
+        )
+    with col_imprimir:
+        if st.button("Imprimir Recibo", key=f"{key}_imprimir", use_container_width=True,
+                     disabled=not RECEIPT_CONFIG["printer"]):
+            try:
+                print_escpos(recibo)
+                st.success("Recibo enviado para a impressora.")
+            except OSError as e:
+                st.error(f"Erro ao imprimir recibo: {e}")
 
 def mostrar_pdv():
     """Interface principal do PDV (Ponto de Venda)"""
@@ -51,14 +169,7 @@ def mostrar_pdv():
                 
                 # Adicionar ao carrinho
                 if st.button("Adicionar ao Carrinho", key="add_to_cart"):
-                    item = {
-                        'produto_id': int(produto['id']),
-                        'nome': produto['nome'],
-                        'preco_unitario': float(produto['preco']),
-                        'quantidade': 1,
-                        'subtotal': float(produto['preco'])
-                    }
-                    st.session_state.cart.append(item)
+                    st.session_state.cart.add(produto['id'], produto['nome'], produto['preco'])
                     st.success(f"Produto '{produto['nome']}' adicionado ao carrinho!")
                     st.session_state.barcode_detected = False
                     st.session_state.last_barcode = None
@@ -72,13 +183,18 @@ def mostrar_pdv():
         # Carrinho de compras
         st.subheader("Carrinho de Compras")
         
-        if not st.session_state.cart:
+        cart = st.session_state.cart
+        
+        if not cart:
             st.info("Seu carrinho está vazio.")
         else:
-            # Tabela do carrinho
-            cart_df = pd.DataFrame(st.session_state.cart)
-            edited_df = st.data_editor(
-                cart_df,
+            # Tabela do carrinho; a chave muda a cada alteração, de forma que o
+            # editor só traz as edições feitas sobre a versão exibida
+            editor_key = f"carrinho_{cart.versao}"
+            st.data_editor(
+                cart.to_dataframe(),
+                key=editor_key,
+                on_change=lambda: cart.aplicar_edicoes(st.session_state[editor_key]),
                 column_config={
                     "produto_id": None,  # Ocultar coluna
                     "nome": "Produto",
@@ -92,28 +208,19 @@ def mostrar_pdv():
                         "Subtotal", format="R$ %.2f", disabled=True
                     ),
                 },
+                disabled=["nome", "preco_unitario", "subtotal"],
                 hide_index=True,
                 use_container_width=True,
                 num_rows="dynamic"
             )
             
-            # Atualizar quantidades e subtotais
-            updated_cart = []
-            for i, row in edited_df.iterrows():
-                item = row.to_dict()
-                item['subtotal'] = item['quantidade'] * item['preco_unitario']
-                updated_cart.append(item)
-            
-            st.session_state.cart = updated_cart
-            
             # Botões para limpar carrinho
             if st.button("Limpar Carrinho", key="clear_cart", use_container_width=True):
-                st.session_state.cart = []
+                cart.clear()
                 st.experimental_rerun()
             
             # Total
-            total = sum(item['subtotal'] for item in st.session_state.cart)
-            st.markdown(f"### Total: R$ {total:.2f}")
+            st.markdown(f"### Total: R$ {cart.total:.2f}")
             
             # Finalizar compra
             st.subheader("Finalizar Compra")
@@ -125,22 +232,51 @@ def mostrar_pdv():
             observacoes = st.text_area("Observações", height=100)
             
             if st.button("Finalizar Venda", use_container_width=True):
-                if st.session_state.cart:
-                    venda_id = Venda.registrar(
-                        st.session_state.cart, 
-                        total, 
-                        forma_pagamento, 
-                        observacoes
-                    )
-                    
-                    if venda_id:
-                        st.success(f"Venda registrada com sucesso! ID: {venda_id}")
-                        st.session_state.cart = []
-                        st.balloons()
+                if cart:
+                    try:
+                        # O ID criado com o carrinho torna reenvios e cliques duplos inofensivos
+                        venda_id = cart.registrar(forma_pagamento, observacoes)
+                    except EstoqueInsuficienteError as e:
+                        linhas = "\n".join(
+                            f"- {falta['nome'] or falta['produto_id']}: solicitado {falta['solicitado']}, "
+                            f"disponível {falta['disponivel']}"
+                            for falta in e.faltas
+                        )
+                        st.error(f"Estoque insuficiente. Ajuste o carrinho:\n{linhas}")
                     else:
-                        st.error("Erro ao registrar venda. Verifique o estoque dos produtos.")
+                        if venda_id:
+                            st.success(f"Venda registrada com sucesso! ID: {venda_id}")
+                            st.session_state.ultimo_recibo = Receipt.from_cart(cart, forma_pagamento)
+                            st.session_state.cart = Cart()
+                            st.balloons()
+                        else:
+                            st.error("Erro ao registrar venda. Tente novamente.")
                 else:
                     st.error("Não é possível finalizar uma venda sem produtos.")
+        
+        # Recibo da última venda (continua disponível após o carrinho ser esvaziado)
+        if st.session_state.get('ultimo_recibo') is not None:
+            _acoes_recibo(st.session_state.ultimo_recibo, key="ultimo_recibo")
+        
+        # Vendas do diário local ainda não gravadas no banco
+        sincronizacao = Venda.status_sincronizacao()
+        if sincronizacao and (sincronizacao["pendentes"] or sincronizacao["recusadas"]):
+            with st.expander(
+                f"Sincronização: {sincronizacao['pendentes']} pendentes, "
+                f"{len(sincronizacao['recusadas'])} recusadas"
+            ):
+                if sincronizacao["ultimo_erro"]:
+                    st.warning(f"Banco de dados indisponível; as vendas serão reenviadas. ({sincronizacao['ultimo_erro']})")
+                
+                for recusada in sincronizacao["recusadas"]:
+                    st.error(f"Venda {recusada['venda_id']}: {recusada['erro']}")
+                    col_reenviar, col_descartar = st.columns(2)
+                    if col_reenviar.button("Reenviar", key=f"reenviar_{recusada['venda_id']}", use_container_width=True):
+                        Venda.reenviar(recusada['venda_id'])
+                        st.experimental_rerun()
+                    if col_descartar.button("Descartar", key=f"descartar_{recusada['venda_id']}", use_container_width=True):
+                        Venda.descartar(recusada['venda_id'])
+                        st.experimental_rerun()
     
     with col2:
         # Lista de produtos
@@ -149,68 +285,24 @@ def mostrar_pdv():
         # Pesquisa
         pesquisa = st.text_input("Pesquisar produto:", key="search_pdv")
         
-        # Obter produtos
-        df_produtos = Produto.get_all()
-        
-        # Filtrar por pesquisa
-        if pesquisa:
-            df_produtos = df_produtos[
-                df_produtos['nome'].str.contains(pesquisa, case=False) | 
-                df_produtos['codigo'].str.contains(pesquisa, case=False)
-            ]
-        
-        # Exibir produtos
-        for i, row in df_produtos.iterrows():
-            with st.container():
-                col_img, col_info = st.columns([1, 3])
-                
-                with col_img:
-                    if row['imagem_url']:
-                        st.image(row['imagem_url'], width=50)
-                    else:
-                        st.markdown("📦")
-                
-                with col_info:
-                    st.markdown(f"**{row['nome']}**")
-                    st.markdown(f"Código: {row['codigo']} | R$ {float(row['preco']):.2f}")
-                    st.markdown(f"Estoque: {int(row['estoque'])}")
-                    
-                    # Botão para adicionar ao carrinho
-                    if st.button(f"Adicionar", key=f"add_pdv_{row['id']}"):
-                        item = {
-                            'produto_id': int(row['id']),
-                            'nome': row['nome'],
-                            'preco_unitario': float(row['preco']),
-                            'quantidade': 1,
-                            'subtotal': float(row['preco'])
-                        }
-                        st.session_state.cart.append(item)
-                        st.success(f"Produto '{row['nome']}' adicionado ao carrinho!")
-                        st.experimental_rerun()
-                
-                st.markdown("---")
+        # Grade paginada: apenas a página visível é buscada e renderizada
+        _grade_produtos_pdv(pesquisa)
 
 def mostrar_produtos():
     """Interface de gerenciamento de produtos"""
     st.title("📦 Gerenciamento de Produtos")
     
-    # Tabs para listar e adicionar produtos
-    tab1, tab2 = st.tabs(["Lista de Produtos", "Adicionar/Editar Produto"])
+    # Tabs para listar, adicionar e importar produtos
+    tab1, tab2, tab3, tab4 = st.tabs([
+        "Lista de Produtos", "Adicionar/Editar Produto", "Importar Produtos", "Ajustes em Lote"
+    ])
     
     with tab1:
         # Pesquisa
         pesquisa = st.text_input("Pesquisar produto:", key="search_produtos")
         
-        # Obter produtos
-        df_produtos = Produto.get_all()
-        
-        # Filtrar por pesquisa
-        if pesquisa:
-            df_produtos = df_produtos[
-                df_produtos['nome'].str.contains(pesquisa, case=False) | 
-                df_produtos['codigo'].str.contains(pesquisa, case=False) |
-                (df_produtos['barcode'].str.contains(pesquisa, case=False) if 'barcode' in df_produtos else False)
-            ]
+        # Obter apenas a página atual da busca (a página volta a 1 quando o termo muda)
+        df_produtos, tem_mais = _pagina_busca(pesquisa, key=f"pagina_produtos_{pesquisa}")
         
         # Exibir produtos em tabela
         st.dataframe(
@@ -233,6 +325,9 @@ def mostrar_produtos():
             hide_index=True
         )
         
+        if tem_mais:
+            st.caption("Há mais produtos: avance a página para vê-los.")
+        
         # Ações para cada produto
         produto_id_para_acao = st.number_input("ID do Produto para Ação", min_value=1, step=1)
         col1, col2 = st.columns(2)
@@ -363,6 +458,114 @@ def mostrar_produtos():
             st.session_state.pop('produto_em_edicao', None)
             st.session_state.modo_edicao = False
             st.experimental_rerun()
+    
+    with tab3:
+        st.header("Importar Produtos")
+        st.write(
+            "Envie um arquivo CSV ou Parquet com as colunas `codigo`, `nome` e `preco` "
+            "(obrigatórias) e, opcionalmente, `barcode`, `descricao`, `estoque`, "
+            "`categoria_id` ou `categoria` (nome) e `imagem_url`. Produtos com código "
+            "já cadastrado são atualizados; colunas ausentes não são alteradas."
+        )
+        
+        arquivo = st.file_uploader("Arquivo de produtos", type=["csv", "parquet"], key="importar_produtos")
+        sep = st.selectbox("Separador (CSV)", options=[",", ";", "\t"], format_func=repr)
+        
+        if arquivo is not None and st.button("Importar", use_container_width=True):
+            try:
+                with st.spinner("Importando produtos..."):
+                    resultado = Produto.bulk_upsert(arquivo, sep=sep)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("Inseridos", resultado["inseridos"])
+                col2.metric("Atualizados", resultado["atualizados"])
+                col3.metric("Inalterados", resultado["inalterados"])
+                col4.metric("Rejeitados", len(resultado["rejeitados"]))
+                st.caption(
+                    f"{resultado['linhas']} linhas em {resultado['segundos']:.1f} s "
+                    f"({resultado['linhas_por_segundo']:,.0f} linhas/s)"
+                )
+                
+                if not resultado["rejeitados"].empty:
+                    st.subheader("Linhas Rejeitadas")
+                    st.dataframe(
+                        resultado["rejeitados"],
+                        column_config={
+                            "linha": "Linha",
+                            "codigo": "Código",
+                            "motivo": "Motivo",
+                        },
+                        use_container_width=True,
+                        hide_index=True
+                    )
+    
+    with tab4:
+        st.header("Ajustes em Lote")
+        
+        modo = st.radio(
+            "Tipo de ajuste",
+            options=["Percentual por categoria", "Planilha de ajustes"],
+            horizontal=True
+        )
+        
+        if modo == "Percentual por categoria":
+            df_categorias = Categoria.get_all()
+            categorias_options = dict(zip(df_categorias['id'].tolist(), df_categorias['nome'].tolist()))
+            categoria_id = st.selectbox(
+                "Categoria",
+                options=list(categorias_options.keys()),
+                format_func=lambda x: categorias_options.get(x),
+                key="ajuste_categoria"
+            )
+            percentual = st.number_input("Reajuste de preço (%)", value=0.0, step=0.5, key="ajuste_percentual")
+            ajustar = lambda dry_run: Produto.ajustar_precos_categoria(categoria_id, percentual, dry_run=dry_run)
+        else:
+            st.write(
+                "Envie um CSV com a coluna `codigo` (ou `produto_id`) e uma ou mais de "
+                "`preco`, `preco_percentual`, `estoque` e `estoque_delta`. Células vazias "
+                "não alteram o campo."
+            )
+            planilha = st.file_uploader("Planilha de ajustes", type=["csv"], key="ajuste_planilha")
+            ajustar = None
+            if planilha is not None:
+                try:
+                    planilha.seek(0)
+                    df_ajustes = pd.read_csv(planilha, sep=None, engine="python", dtype={"codigo": str})
+                    ajustar = lambda dry_run: Produto.ajustar_em_lote(df_ajustes, dry_run=dry_run)
+                except ValueError as e:
+                    st.error(f"Não foi possível ler a planilha: {e}")
+        
+        col1, col2 = st.columns(2)
+        previsualizar = col1.button("Pré-visualizar", use_container_width=True, disabled=ajustar is None)
+        aplicar = col2.button("Aplicar Ajustes", use_container_width=True, disabled=ajustar is None)
+        
+        if previsualizar or aplicar:
+            try:
+                diff = ajustar(dry_run=not aplicar)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                if aplicar:
+                    st.success(f"{len(diff)} produtos ajustados.")
+                else:
+                    st.info(f"Prévia: {len(diff)} produtos seriam alterados. Nada foi gravado.")
+                
+                st.dataframe(
+                    diff,
+                    column_config={
+                        "id": None,  # Ocultar ID interno
+                        "codigo": "Código",
+                        "nome": "Nome",
+                        "preco_antes": st.column_config.NumberColumn("Preço Atual", format="R$ %.2f"),
+                        "preco_depois": st.column_config.NumberColumn("Novo Preço", format="R$ %.2f"),
+                        "estoque_antes": "Estoque Atual",
+                        "estoque_depois": "Novo Estoque",
+                    },
+                    use_container_width=True,
+                    hide_index=True
+                )
 
 def mostrar_categorias():
     """Interface de gerenciamento de categorias"""
@@ -472,8 +675,12 @@ def mostrar_relatorios():
     """Interface de relatórios do sistema"""
     st.title("📊 Relatórios")
     
+    # Consultas em cache até a próxima alteração dos dados: interações com
+    # filtros e gráficos que repetem uma consulta não voltam ao banco
+    cache = get_report_cache()
+    
     # Tabs para diferentes relatórios
-    tab1, tab2, tab3 = st.tabs(["Vendas", "Produtos", "Estoque"])
+    tab1, tab2, tab3, tab4 = st.tabs(["Vendas", "Produtos", "Estoque", "Análises"])
     
     with tab1:
         st.header("Relatório de Vendas")
@@ -489,98 +696,129 @@ def mostrar_relatorios():
         data_inicio_dt = datetime.datetime.combine(data_inicio, datetime.time.min)
         data_fim_dt = datetime.datetime.combine(data_fim, datetime.time.max)
         
-        # Obter vendas filtradas
-        df_vendas = Venda.get_all(data_inicio_dt, data_fim_dt)
+        granularidade = st.selectbox(
+            "Agrupar por",
+            options=["day", "week", "month", "hour"],
+            format_func={"hour": "Hora", "day": "Dia", "week": "Semana", "month": "Mês"}.get,
+            key="relatorio_granularidade"
+        )
         
-        if df_vendas.empty:
+        # Totais agregados no banco: só as linhas do resumo são transferidas
+        resumo = cache.get("resumo_vendas", Venda.resumo, data_inicio_dt, data_fim_dt, granularidade)
+        
+        if resumo["quantidade"] == 0:
             st.info("Nenhuma venda encontrada para o período selecionado.")
         else:
-            # Resumo de vendas
-            total_vendas = len(df_vendas)
-            valor_total = df_vendas['total'].sum()
-            
             col1, col2 = st.columns(2)
             with col1:
-                st.metric("Total de Vendas", total_vendas)
+                st.metric("Total de Vendas", resumo["quantidade"])
             with col2:
-                st.metric("Valor Total", f"R$ {valor_total:.2f}")
-            
-            # Tabela de vendas
-            st.subheader("Histórico de Vendas")
-            df_vendas_formatado = df_vendas.copy()
-            df_vendas_formatado['data_venda'] = pd.to_datetime(df_vendas_formatado['data_venda']).dt.strftime('%d/%m/%Y %H:%M')
-            
-            st.dataframe(
-                df_vendas_formatado,
-                column_config={
-                    "id": None,  # Ocultar ID interno
-                    "venda_id": "ID da Venda",
-                    "data_venda": "Data/Hora",
-                    "total": st.column_config.NumberColumn("Total", format="R$ %.2f"),
-                    "forma_pagamento": "Forma de Pagamento",
-                    "status": "Status",
-                    "observacoes": "Observações"
-                },
-                use_container_width=True,
-                hide_index=True
-            )
+                st.metric("Valor Total", f"R$ {resumo['total']:.2f}")
             
-            # Gráfico de vendas por dia
-            df_vendas['data'] = pd.to_datetime(df_vendas['data_venda']).dt.date
-            vendas_por_dia = df_vendas.groupby('data')['total'].sum().reset_index()
-            vendas_por_dia_chart = pd.DataFrame({
-                'data': vendas_por_dia['data'].astype(str),
-                'total': vendas_por_dia['total']
+            # Gráfico de vendas por período
+            vendas_por_periodo = resumo["por_periodo"]
+            formato_periodo = "%Y-%m-%d %H:00" if granularidade == "hour" else "%Y-%m-%d"
+            vendas_por_periodo_chart = pd.DataFrame({
+                'periodo': pd.to_datetime(vendas_por_periodo['periodo']).dt.strftime(formato_periodo),
+                'total': vendas_por_periodo['total']
             })
             
-            st.subheader("Vendas por Dia")
-            st.bar_chart(vendas_por_dia_chart, x='data', y='total')
+            st.subheader("Vendas por Período")
+            st.bar_chart(vendas_por_periodo_chart, x='periodo', y='total')
             
             # Gráfico de vendas por forma de pagamento
-            vendas_por_pagamento = df_vendas.groupby('forma_pagamento')['total'].sum().reset_index()
-            
             st.subheader("Vendas por Forma de Pagamento")
-            st.bar_chart(vendas_por_pagamento, x='forma_pagamento', y='total')
-            
-            # Detalhes de venda
-            st.subheader("Detalhes de Venda")
-            venda_selecionada = st.selectbox(
-                "Selecione uma venda para ver detalhes:",
-                options=df_vendas['venda_id'].tolist(),
-                format_func=lambda x: f"Venda {x} - {df_vendas[df_vendas['venda_id']==x]['data_venda'].iloc[0]}"
-            )
+            st.bar_chart(resumo["por_pagamento"], x='forma_pagamento', y='total')
+            
+            # Exportação lida em blocos pelo cursor do servidor; o botão de
+            # download do Streamlit recebe o CSV completo em memória
+            if st.button("Preparar Exportação CSV", key="exportar_vendas"):
+                partes = []
+                for i, bloco in enumerate(Venda.iter_all(data_inicio_dt, data_fim_dt)):
+                    partes.append(bloco.to_csv(index=False, header=(i == 0)))
+                st.download_button(
+                    "Baixar CSV",
+                    "".join(partes),
+                    file_name=f"vendas_{data_inicio:%Y%m%d}_{data_fim:%Y%m%d}.csv",
+                    mime="text/csv"
+                )
             
-            if venda_selecionada:
-                detalhes_venda = Venda.get_detalhes(venda_selecionada)
+            # Histórico buscado apenas quando aberto, uma página por vez
+            if st.checkbox("Mostrar histórico de vendas", key="mostrar_historico_vendas"):
+                st.subheader("Histórico de Vendas")
+                page_size = REPORT_CONFIG["history_page_size"]
+                total_paginas = max(1, -(-resumo["quantidade"] // page_size))
+                pagina = st.number_input(
+                    f"Página (de {total_paginas})", min_value=1, max_value=total_paginas, step=1,
+                    key="pagina_historico_vendas"
+                )
+                df_vendas = cache.get(
+                    "historico_vendas", Venda.get_page, data_inicio_dt, data_fim_dt, page_size, (pagina - 1) * page_size
+                )
+                
+                df_vendas_formatado = df_vendas.copy()
+                df_vendas_formatado['data_venda'] = pd.to_datetime(df_vendas_formatado['data_venda']).dt.strftime('%d/%m/%Y %H:%M')
                 
                 st.dataframe(
-                    detalhes_venda,
+                    df_vendas_formatado,
                     column_config={
                         "id": None,  # Ocultar ID interno
-                        "venda_id": None,  # Ocultar ID da venda
-                        "produto_id": None,  # Ocultar ID do produto
-                        "produto_nome": "Produto",
-                        "produto_codigo": "Código",
-                        "quantidade": "Quantidade",
-                        "preco_unitario": st.column_config.NumberColumn("Preço Unit.", format="R$ %.2f"),
-                        "subtotal": st.column_config.NumberColumn("Subtotal", format="R$ %.2f")
+                        "venda_id": "ID da Venda",
+                        "data_venda": "Data/Hora",
+                        "total": st.column_config.NumberColumn("Total", format="R$ %.2f"),
+                        "forma_pagamento": "Forma de Pagamento",
+                        "status": "Status",
+                        "observacoes": "Observações"
                     },
                     use_container_width=True,
                     hide_index=True
                 )
+                
+                # Detalhes de venda
+                st.subheader("Detalhes de Venda")
+                datas_venda = dict(zip(df_vendas['venda_id'], df_vendas_formatado['data_venda']))
+                venda_selecionada = st.selectbox(
+                    "Selecione uma venda para ver detalhes:",
+                    options=df_vendas['venda_id'].tolist(),
+                    format_func=lambda x: f"Venda {x} - {datas_venda[x]}"
+                )
+                
+                if venda_selecionada:
+                    detalhes_venda = cache.get("detalhes_venda", Venda.get_detalhes, venda_selecionada)
+                
+                    # Reimpressão a partir dos dados gravados
+                    recibo = Receipt.from_sale(venda_selecionada)
+                    if recibo is not None:
+                        _acoes_recibo(recibo, key=f"recibo_{venda_selecionada}")
+                
+                    st.dataframe(
+                        detalhes_venda,
+                        column_config={
+                            "id": None,  # Ocultar ID interno
+                            "venda_id": None,  # Ocultar ID da venda
+                            "produto_id": None,  # Ocultar ID do produto
+                            "produto_nome": "Produto",
+                            "produto_codigo": "Código",
+                            "quantidade": "Quantidade",
+                            "preco_unitario": st.column_config.NumberColumn("Preço Unit.", format="R$ %.2f"),
+                            "subtotal": st.column_config.NumberColumn("Subtotal", format="R$ %.2f")
+                        },
+                        use_container_width=True,
+                        hide_index=True
+                    )
     
     with tab2:
         st.header("Relatório de Produtos")
         
-        # Obter produtos
-        df_produtos = Produto.get_all()
+        # Obter catálogo tipado (preços em centavos, estoque inteiro)
+        catalogo = cache.get("catalogo_tipado", Produto.get_typed)
         
-        if df_produtos.empty:
+        if catalogo.empty:
             st.info("Nenhum produto cadastrado.")
         else:
             # Resumo de produtos
-            total_produtos = len(df_produtos)
-            valor_estoque = (df_produtos['preco'] * df_produtos['estoque']).sum()
+            total_produtos = len(catalogo)
+            valor_estoque = catalogo.valor_estoque_centavos().sum() / 100
             
             col1, col2 = st.columns(2)
             with col1:
@@ -589,14 +827,14 @@ def mostrar_relatorios():
                 st.metric("Valor em Estoque", f"R$ {valor_estoque:.2f}")
             
             # Gráfico de produtos por categoria
-            produtos_por_categoria = df_produtos.groupby('categoria_nome').size().reset_index(name='count')
+            produtos_por_categoria = catalogo.por_categoria()
             
             st.subheader("Produtos por Categoria")
             st.bar_chart(produtos_por_categoria, x='categoria_nome', y='count')
             
             # Produtos mais caros
             st.subheader("Produtos mais caros")
-            df_produtos_caros = df_produtos.sort_values('preco', ascending=False).head(10)
+            df_produtos_caros = catalogo.to_dataframe(catalogo.maiores('preco_centavos', 10))
             
             st.dataframe(
                 df_produtos_caros,
@@ -606,36 +844,104 @@ def mostrar_relatorios():
                     "nome": "Nome",
                     "preco": st.column_config.NumberColumn("Preço", format="R$ %.2f"),
                     "categoria_nome": "Categoria",
-                    "barcode": None,  # Ocultar código de barras
-                    "descricao": None,  # Ocultar descrição
-                    "estoque": None,  # Ocultar estoque
-                    "categoria_id": None,  # Ocultar ID da categoria
-                    "imagem_url": None,  # Ocultar URL da imagem
-                    "created_at": None,  # Ocultar data de criação
-                    "updated_at": None  # Ocultar data de atualização
+                    "estoque": None  # Ocultar estoque
                 },
                 use_container_width=True,
                 hide_index=True
             )
+        
+        # Desempenho de vendas por produto, a partir dos totais diários
+        st.subheader("Mais Vendidos e Curva ABC")
+        col1, col2 = st.columns(2)
+        with col1:
+            ranking_inicio = st.date_input(
+                "Data Inicial", datetime.date.today() - datetime.timedelta(days=30), key="ranking_inicio"
+            )
+        with col2:
+            ranking_fim = st.date_input("Data Final", datetime.date.today(), key="ranking_fim")
+        
+        ranking = Produto.ranking_vendas(ranking_inicio, ranking_fim)
+        vendidos = ranking[ranking["quantidade"] > 0]
+        
+        if vendidos.empty:
+            st.info("Nenhum produto vendido no período selecionado.")
+        else:
+            colunas_ranking = {
+                "produto_id": None,  # Ocultar ID interno
+                "codigo": "Código",
+                "nome": "Nome",
+                "categoria_nome": "Categoria",
+                "quantidade": "Quantidade",
+                "vendas": "Vendas",
+                "receita": st.column_config.NumberColumn("Receita", format="R$ %.2f"),
+                "participacao": st.column_config.NumberColumn("% da Receita", format="%.1f%%"),
+                "participacao_acumulada": None,
+                "classe": "Classe"
+            }
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown("**Por quantidade**")
+                st.dataframe(
+                    vendidos.nlargest(10, "quantidade")[["codigo", "nome", "quantidade", "receita"]],
+                    column_config=colunas_ranking,
+                    use_container_width=True,
+                    hide_index=True
+                )
+            with col2:
+                st.markdown("**Por receita**")
+                st.dataframe(
+                    vendidos.head(10)[["codigo", "nome", "receita", "participacao"]],
+                    column_config=colunas_ranking,
+                    use_container_width=True,
+                    hide_index=True
+                )
+            
+            # Resumo das classes: quantos produtos e quanto da receita em cada uma
+            resumo_abc = ranking.groupby("classe").agg(
+                produtos=("produto_id", "size"),
+                receita=("receita", "sum")
+            ).reset_index()
+            
+            cols = st.columns(len(resumo_abc))
+            for col, linha in zip(cols, resumo_abc.itertuples(index=False)):
+                with col:
+                    st.metric(
+                        f"Classe {linha.classe}",
+                        f"{linha.produtos} produtos",
+                        f"R$ {linha.receita:.2f}",
+                        delta_color="off"
+                    )
+            
+            # Curva de Pareto: % da receita acumulada, do produto que mais vende ao que menos vende
+            st.line_chart(ranking.reset_index(drop=True)["participacao_acumulada"])
+            
+            classe = st.multiselect("Classes", ["A", "B", "C"], default=["A", "B", "C"], key="ranking_classes")
+            st.dataframe(
+                ranking[ranking["classe"].isin(classe)],
+                column_config=colunas_ranking,
+                use_container_width=True,
+                hide_index=True
+            )
     
     with tab3:
         st.header("Relatório de Estoque")
         
-        # Obter produtos
-        df_produtos = Produto.get_all()
+        # Obter catálogo tipado (preços em centavos, estoque inteiro)
+        catalogo = cache.get("catalogo_tipado", Produto.get_typed)
         
-        if df_produtos.empty:
+        if catalogo.empty:
             st.info("Nenhum produto cadastrado.")
         else:
             # Resumo de estoque
-            total_itens = df_produtos['estoque'].sum()
+            total_itens = catalogo.total_estoque()
             
             st.metric("Total de Itens em Estoque", total_itens)
             
             # Produtos com estoque baixo
             low_stock_threshold = STOCK_CONFIG["low_stock_threshold"]
             st.subheader(f"Produtos com Estoque Baixo (menos de {low_stock_threshold} unidades)")
-            df_estoque_baixo = df_produtos[df_produtos['estoque'] < low_stock_threshold].sort_values('estoque')
+            df_estoque_baixo = catalogo.to_dataframe(catalogo.abaixo_de(low_stock_threshold))
             
             if df_estoque_baixo.empty:
                 st.info("Nenhum produto com estoque baixo.")
@@ -648,13 +954,7 @@ def mostrar_relatorios():
                         "nome": "Nome",
                         "estoque": "Estoque",
                         "preco": st.column_config.NumberColumn("Preço", format="R$ %.2f"),
-                        "categoria_nome": "Categoria",
-                        "barcode": None,  # Ocultar código de barras
-                        "descricao": None,  # Ocultar descrição
-                        "categoria_id": None,  # Ocultar ID da categoria
-                        "imagem_url": None,  # Ocultar URL da imagem
-                        "created_at": None,  # Ocultar data de criação
-                        "updated_at": None  # Ocultar data de atualização
+                        "categoria_nome": "Categoria"
                     },
                     use_container_width=True,
                     hide_index=True
@@ -662,7 +962,7 @@ def mostrar_relatorios():
             
             # Produtos com maior estoque
             st.subheader("Produtos com Maior Estoque")
-            df_maior_estoque = df_produtos.sort_values('estoque', ascending=False).head(10)
+            df_maior_estoque = catalogo.to_dataframe(catalogo.maiores('estoque', 10))
             
             st.dataframe(
                 df_maior_estoque,
@@ -672,21 +972,84 @@ def mostrar_relatorios():
                     "nome": "Nome",
                     "estoque": "Estoque",
                     "preco": st.column_config.NumberColumn("Preço", format="R$ %.2f"),
-                    "categoria_nome": "Categoria",
-                    "barcode": None,  # Ocultar código de barras
-                    "descricao": None,  # Ocultar descrição
-                    "categoria_id": None,  # Ocultar ID da categoria
-                    "imagem_url": None,  # Ocultar URL da imagem
-                    "created_at": None,  # Ocultar data de criação
-                    "updated_at": None  # Ocultar data de atualização
+                    "categoria_nome": "Categoria"
                 },
                 use_container_width=True,
                 hide_index=True
             )
             
             # Gráfico de valor em estoque por categoria
-            df_produtos['valor_estoque'] = df_produtos['preco'] * df_produtos['estoque']
-            valor_por_categoria = df_produtos.groupby('categoria_nome')['valor_estoque'].sum().reset_index()
+            valor_por_categoria = catalogo.por_categoria()[['categoria_nome', 'valor_estoque']]
             
             st.subheader("Valor em Estoque por Categoria")
-            st.bar_chart(valor_por_categoria, x='categoria_nome', y='valor_estoque')
\ No newline at end of file
+            st.bar_chart(valor_por_categoria, x='categoria_nome', y='valor_estoque')
+    
+    with tab4:
+        st.header("Análises")
+        
+        # Lidas das cópias Parquet, sem consultas ao banco dos caixas
+        snapshots = get_snapshots()
+        ultimo_dia = snapshots.ultimo_dia()
+        
+        if ultimo_dia is None:
+            st.info("Nenhuma cópia das vendas exportada. Execute `python manage.py exportar-parquet`.")
+        else:
+            st.caption(f"Vendas exportadas até {ultimo_dia:%d/%m/%Y}")
+            
+            # Comparação ano a ano: só as colunas dia e total são lidas
+            st.subheader("Faturamento Mensal por Ano")
+            df_faturamento = snapshots.read("vendas", ["dia", "total"])
+            dias = pd.to_datetime(df_faturamento["dia"])
+            faturamento_mensal = df_faturamento.assign(
+                ano=dias.dt.year.astype(str),
+                mes=dias.dt.month
+            ).pivot_table(index="mes", columns="ano", values="total", aggfunc="sum")
+            st.line_chart(faturamento_mensal)
+            
+            # Pares de produtos na mesma venda, apenas nas partições do período
+            st.subheader("Produtos Comprados Juntos")
+            dias_cesta = st.slider("Últimos dias", min_value=7, max_value=365, value=90, key="analise_dias_cesta")
+            itens = snapshots.read(
+                "venda_itens", ["venda_id", "produto_id"],
+                inicio=ultimo_dia - datetime.timedelta(days=dias_cesta - 1), fim=ultimo_dia
+            ).drop_duplicates()
+            
+            pares = itens.merge(itens, on="venda_id")
+            pares = pares[pares["produto_id_x"] < pares["produto_id_y"]]
+            
+            if pares.empty:
+                st.info("Nenhuma venda com mais de um produto no período.")
+            else:
+                vendas_periodo = itens["venda_id"].nunique()
+                df_pares = (
+                    pares.groupby(["produto_id_x", "produto_id_y"]).size()
+                    .nlargest(10).rename("vendas").reset_index()
+                )
+                catalog = get_catalog()
+                
+                def nome_produto(produto_id):
+                    record = catalog.peek(int(produto_id))
+                    return record.nome if record is not None else f"Produto {produto_id}"
+                
+                df_pares["produto_a"] = df_pares["produto_id_x"].map(nome_produto)
+                df_pares["produto_b"] = df_pares["produto_id_y"].map(nome_produto)
+                df_pares["suporte"] = df_pares["vendas"] / vendas_periodo * 100
+                
+                st.dataframe(
+                    df_pares[["produto_a", "produto_b", "vendas", "suporte"]],
+                    column_config={
+                        "produto_a": "Produto",
+                        "produto_b": "Comprado com",
+                        "vendas": "Vendas",
+                        "suporte": st.column_config.NumberColumn("% das Vendas", format="%.1f%%")
+                    },
+                    use_container_width=True,
+                    hide_index=True
+                )
+    
+    estatisticas = cache.stats()
+    st.caption(
+        f"Cache de relatórios: {estatisticas['hit_rate']:.0%} de acertos "
+        f"({estatisticas['hits']} de {estatisticas['hits'] + estatisticas['misses']} consultas), "
+        f"{estatisticas['entries']} resultados em memória"
+    )
\ No newline at end of file